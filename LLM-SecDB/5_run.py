@@ -1,13 +1,17 @@
-import os, json, re, time, csv
-from typing import List, Dict, Any, Optional, Tuple
+import os, sys, json, re, csv, argparse, itertools, textwrap
+from typing import Dict, Any, Optional, Tuple
 from collections import Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import threading
 
 from tqdm import tqdm
 import pandas as pd  # kept for parity with original; not strictly required
-from openai import OpenAI
-from openai import APIError, RateLimitError, InternalServerError, BadRequestError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.ledger import ResultLog
+from latexposed.llm import TokenUsage, ask_llm, iter_input_any, parse_ground_truth_labels, parse_labels_from_xml
+from latexposed.llm_async import AdaptiveLimiter, classify_comments
+from latexposed.llm_cache import LLMCache
 
 # ========= CONFIG=========
 API_KEY        = "YOUR_API_KEY"
@@ -20,6 +24,19 @@ SLEEP_BACKOFF   = 2.0
 SHOW_COMMENTS   = True                      # True to include raw comments in CSV/JSON
 TEST_MODE_LIMIT = None                      # e.g., 10 for a quick smoke test
 MAX_WORKERS     = 50  # thread count for parallel requests
+ENGINE          = "async"                   # "async": adaptive concurrency, "threads": fixed MAX_WORKERS pool
+INITIAL_CONCURRENCY = 8                     # async engine starting point, grows until 429s or slow responses
+BATCH_SIZE      = 1                         # async engine: comments per request, pick with scripts/bench_llm_batching.py
+RESUME          = False                     # skip records already in <output>_<model>.results.jsonl (or pass --resume)
+CACHE_PATH      = "./results/llm_cache.sqlite"  # answers reused across runs and models, None to disable
+CACHE_MAX_BYTES = None                      # e.g., 500_000_000 to evict least recently used answers
+PRICE_INPUT        = None                   # USD per 1M tokens from the provider's model page, for the cost estimate
+PRICE_CACHED_INPUT = None                   # cached prompt tokens, usually a fraction of PRICE_INPUT
+PRICE_OUTPUT       = None
+
+ap = argparse.ArgumentParser(description="Run the LLM-SecDB benchmark for MODEL_NAME.")
+ap.add_argument("--resume", action="store_true", help="Continue an interrupted run from its result log.")
+RESUME = RESUME or ap.parse_args().resume
 
 # live SEM options
 COUNT_NONE_AS_HIT = True  # treat none/none as a hit in running stats, like original
@@ -33,7 +50,10 @@ os.makedirs(os.path.dirname(OUTPUT_BASENAME), exist_ok=True)
 
 print(f"[*] Model: {MODEL_NAME} is loaded")
 print(f"[*] Input: {INPUT_PATH}")
-print(f"[*] Parallel workers: {MAX_WORKERS}")
+cache = LLMCache(CACHE_PATH, CACHE_MAX_BYTES) if CACHE_PATH else None
+usage = TokenUsage()  # token counts of every response, including the cached prompt tokens
+
+print(f"[*] Engine: {ENGINE}" + (f", parallel workers: {MAX_WORKERS}" if ENGINE == "threads" else f", batch size: {BATCH_SIZE}"))
 
 # ====================== PROMPT + PARSING ======================
 
@@ -71,145 +91,6 @@ Your task is to classify ONLY what is explicitly present in the comment text. Do
 Now analyze this comment:
 """
 
-ALLOWED_LABELS = {
-    "credentials",
-    "network_identifiers",
-    "pii",
-    "conflict",
-    "peerreview",
-    "none",
-}
-
-XML_RE = re.compile(r"<xml>.*?</xml>", re.IGNORECASE | re.DOTALL)
-
-def build_prompt(comment_text: str) -> str:
-    return f"{GENERAL_PROMPT}\n---\n{comment_text}\n---"
-
-def extract_xml_answer(text: str) -> Optional[str]:
-    if not text:
-        return None
-    m = XML_RE.search(text)
-    return m.group(0).strip() if m else None
-
-def sanitize_xml(xml_text: Optional[str]) -> Optional[str]:
-    if not xml_text:
-        return None
-    xml_text = xml_text.strip()
-    if xml_text.lower().startswith("<xml>") and xml_text.lower().endswith("</xml>"):
-        return xml_text
-    # salvage if wrapper missing
-    inner = re.sub(r"^`+|`+$", "", xml_text).strip()
-    inner = re.sub(r"[^a-zA-Z0-9_,\-\s]", "", inner).strip()
-    if inner:
-        return f"<xml>{inner}</xml>"
-    return None
-
-def parse_labels_from_xml(xml_text: str) -> List[str]:
-    # from <xml>a,b</xml> -> ["a", "b"] (normalized)
-    content = xml_text.strip()[5:-6].strip()
-    if not content:
-        return []
-    parts = [p.strip().lower() for p in content.split(",")]
-    labels = []
-    for p in parts:
-        p = p.replace("network_identifiers:", "network_identifiers")
-        p = re.sub(r"[^a-z_]", "", p)
-        if not p:
-            continue
-        if p == "none":
-            return []
-        if p in ALLOWED_LABELS and p != "none":
-            labels.append(p)
-    # de-dup, preserve order
-    seen, out = set(), []
-    for l in labels:
-        if l not in seen:
-            seen.add(l)
-            out.append(l)
-    return out
-
-def parse_ground_truth_labels(rec: Dict[str, Any]) -> List[str]:
-    raw = rec.get("classification", "")
-    if not isinstance(raw, str) or not raw.strip():
-        return []
-    parts = [p.strip().lower() for p in raw.split(",")]
-    labels = []
-    for p in parts:
-        p = p.replace("network_identifiers:", "network_identifiers")
-        p = re.sub(r"[^a-z_]", "", p)
-        if p in ALLOWED_LABELS and p != "none":
-            labels.append(p)
-    seen, out = set(), []
-    for l in labels:
-        if l not in seen:
-            seen.add(l)
-            out.append(l)
-    return out
-
-def read_input_any(path: str) -> List[Dict[str, Any]]:
-    # supports JSON array, single JSON object, or NDJSON
-    with open(path, "r", encoding="utf-8") as f:
-        text = f.read().strip()
-        if not text:
-            return []
-        try:
-            data = json.loads(text)
-            if isinstance(data, list):
-                return data
-            if isinstance(data, dict):
-                return [data]
-        except json.JSONDecodeError:
-            pass
-    # NDJSON fallback
-    out = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-                out.append(obj)
-            except json.JSONDecodeError:
-                continue
-    return out
-
-# Thread-local OpenAI client (safe for multithreading with the SDK)
-_tls = threading.local()
-def get_client() -> OpenAI:
-    cli = getattr(_tls, "client", None)
-    if cli is None:
-        cli = OpenAI(base_url=BASE_URL, api_key=API_KEY)
-        _tls.client = cli
-    return cli
-
-def ask_llm(comment_text: str) -> Tuple[Optional[str], Optional[str]]:
-    prompt = build_prompt(comment_text)
-    backoff = SLEEP_BACKOFF
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            resp = get_client().chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=TEMPERATURE,
-            )
-            content = resp.choices[0].message.content if resp.choices else ""
-            xml = extract_xml_answer(content)
-            xml = sanitize_xml(xml) or sanitize_xml(content)
-            if not xml:
-                return None, "No valid <xml>...</xml> returned."
-            return xml, None
-        except (RateLimitError, InternalServerError) as e:
-            if attempt == MAX_RETRIES:
-                return None, f"{type(e).__name__}: {e}"
-            time.sleep(backoff); backoff *= 1.7
-        except (APIError, BadRequestError) as e:
-            return None, f"{type(e).__name__}: {e}"
-        except Exception as e:
-            if attempt == MAX_RETRIES:
-                return None, f"UnexpectedError: {e}"
-            time.sleep(backoff); backoff *= 1.7
-
 def classify_record(idx_and_rec: Tuple[int, Dict[str, Any]]) -> Dict[str, Any]:
     idx, rec = idx_and_rec
     comment = rec.get("comments", "")
@@ -217,7 +98,9 @@ def classify_record(idx_and_rec: Tuple[int, Dict[str, Any]]) -> Dict[str, Any]:
         xml, err = "<xml>none</xml>", "Missing or empty 'comments'."
         pred_labels = []
     else:
-        xml, err = ask_llm(comment)
+        xml, err = ask_llm(
+            comment, GENERAL_PROMPT, model=MODEL_NAME, base_url=BASE_URL, api_key=API_KEY, temperature=TEMPERATURE,
+            max_retries=MAX_RETRIES, backoff=SLEEP_BACKOFF, cache=cache, comment_sha256=rec.get("sha_256"), usage=usage)
         pred_labels = parse_labels_from_xml(xml) if xml else []
     return {
         "idx": idx,
@@ -232,15 +115,24 @@ def classify_record(idx_and_rec: Tuple[int, Dict[str, Any]]) -> Dict[str, Any]:
 # Progress bar cleanup (optional, mirrors your original pattern)
 tqdm._instances.clear()
 
-records = read_input_any(INPUT_PATH)
-if TEST_MODE_LIMIT is not None:
-    records = records[:TEST_MODE_LIMIT]
+def iter_records():
+    # Streamed from the input file (JSON array or NDJSON), so memory stays flat on large corpora
+    records = enumerate(iter_input_any(INPUT_PATH))
+    return itertools.islice(records, TEST_MODE_LIMIT) if TEST_MODE_LIMIT is not None else records
 
-if not records:
+num_records = sum(1 for _ in iter_records())
+if not num_records:
     raise SystemExit("No records found in input.")
 
+# Every result is appended to the log as soon as it completes; the final files are rebuilt from it
+model_safe = re.sub(r"[\\/]", "_", MODEL_NAME)  # e.g., "qwen/qwen-2.5-7b-instruct" -> "qwen_qwen-2.5-7b-instruct"
+base = f"{OUTPUT_BASENAME}_{model_safe}"
+result_log = ResultLog(base + ".results.jsonl", key_field="idx", resume=RESUME)
+resumed = len(result_log)
+if RESUME:
+    print(f"[*] Resuming: {resumed} of {num_records} records already in {result_log.path}")
+
 # Phase 1: parallel classification WITH live SEM postfix
-results = [None] * len(records)
 
 # shared running metrics for live postfix
 lock = threading.Lock()
@@ -249,52 +141,131 @@ sem_num_exact = 0
 sem_num_hit_incl_none = 0
 sem_pred_label_freq = Counter()  # live tally (pred only), for postfix
 
-with tqdm(total=len(records), desc="Classifying (parallel)", ncols=150, dynamic_ncols=True, leave=False) as pbar:
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-        fut_to_idx = {ex.submit(classify_record, (i, rec)): i for i, rec in enumerate(records)}
-        for fut in as_completed(fut_to_idx):
-            i = fut_to_idx[fut]
-            try:
-                r = fut.result()
-            except Exception as e:
-                r = {"idx": i, "xml": "<xml>none</xml>", "pred_labels": [], "error": f"WorkerError: {e}", "_comment_length": 0}
-            results[i] = r
-
-            # compute live metrics for this completed item
-            with lock:
-                pred_set = set(r["pred_labels"])
-                gt_set   = set(parse_ground_truth_labels(records[i]))
-
-                sem_num_done += 1
-                if pred_set == gt_set:
-                    sem_num_exact += 1
-
-                inter = pred_set & gt_set
-                hit_now = bool(inter) or (COUNT_NONE_AS_HIT and not pred_set and not gt_set)
-                if hit_now:
-                    sem_num_hit_incl_none += 1
-
-                for l in pred_set:
-                    sem_pred_label_freq[l] += 1
-
-                running_exact = (sem_num_exact / sem_num_done) * 100.0
-                running_hit   = (sem_num_hit_incl_none / sem_num_done) * 100.0
-
-                postfix = {
-                    "acc":   f"{running_exact:.3f}",
-                    "hit":   f"{running_hit:.3f}",
-                    "cred":  sem_pred_label_freq["credentials"],
-                    "netid": sem_pred_label_freq["network_identifiers"],
-                    "pii":   sem_pred_label_freq["pii"],
-                    "conf":  sem_pred_label_freq["conflict"],
-                    "prrev": sem_pred_label_freq["peerreview"],
-                    "none":  sem_pred_label_freq["none"],  # typically 0; kept for parity
-                }
-                pbar.set_postfix(postfix)
-                pbar.update(1)
-
-# Phase 2: sequential aggregation, final metrics, and file outputs (same logic as original)
-enriched: List[Dict[str, Any]] = []
+def update_live_metrics(r: Dict[str, Any], pbar) -> None:
+    global sem_num_done, sem_num_exact, sem_num_hit_incl_none
+
+    # compute live metrics for this completed item
+    with lock:
+        pred_set = set(r["pred_labels"])
+        gt_set   = set(r["gt_labels"])
+
+        sem_num_done += 1
+        if pred_set == gt_set:
+            sem_num_exact += 1
+
+        inter = pred_set & gt_set
+        hit_now = bool(inter) or (COUNT_NONE_AS_HIT and not pred_set and not gt_set)
+        if hit_now:
+            sem_num_hit_incl_none += 1
+
+        for l in pred_set:
+            sem_pred_label_freq[l] += 1
+
+        running_exact = (sem_num_exact / sem_num_done) * 100.0
+        running_hit   = (sem_num_hit_incl_none / sem_num_done) * 100.0
+
+        postfix = {
+            "acc":   f"{running_exact:.3f}",
+            "hit":   f"{running_hit:.3f}",
+            "cred":  sem_pred_label_freq["credentials"],
+            "netid": sem_pred_label_freq["network_identifiers"],
+            "pii":   sem_pred_label_freq["pii"],
+            "conf":  sem_pred_label_freq["conflict"],
+            "prrev": sem_pred_label_freq["peerreview"],
+            "none":  sem_pred_label_freq["none"],  # typically 0; kept for parity
+        }
+        if ENGINE == "async" and limiter is not None:
+            postfix["conc"] = f"{limiter.limit:.1f}"
+            postfix["429s"] = limiter.rate_limited
+        pbar.set_postfix(postfix)
+        pbar.update(1)
+
+def record_result(r: Dict[str, Any], rec: Dict[str, Any], pbar) -> None:
+    r["gt_labels"] = parse_ground_truth_labels(rec)
+    with lock:
+        result_log.write(r)
+    update_live_metrics(r, pbar)
+
+def llm_result(i: int, rec: Dict[str, Any], xml: Optional[str], err: Optional[str]) -> Dict[str, Any]:
+    comment = rec.get("comments", "")
+    pred_labels = parse_labels_from_xml(xml) if xml else []
+    return {"idx": i, "xml": xml or "", "pred_labels": list(set(pred_labels)), "error": err, "_comment_length": len(comment)}
+
+def pending_records():
+    for i, rec in iter_records():
+        if i not in result_log:
+            yield i, rec
+
+limiter = None
+with tqdm(total=num_records, desc=f"Classifying ({ENGINE})", ncols=150, dynamic_ncols=True, leave=False) as pbar:
+    # Results of the interrupted run count towards the live metrics
+    for r in result_log.records():
+        update_live_metrics(r, pbar)
+
+    if ENGINE == "async":
+        in_progress = {}  # idx -> record, only the ones awaiting an answer
+
+        def llm_items():
+            for i, rec in pending_records():
+                comment = rec.get("comments", "")
+                if isinstance(comment, str) and comment.strip():
+                    in_progress[i] = rec
+                    yield i, comment
+                else:
+                    # Empty comments are settled without a request, like in classify_record
+                    record_result(classify_record((i, rec)), rec, pbar)
+
+        def on_llm_result(i: int, xml: Optional[str], err: Optional[str]) -> None:
+            rec = in_progress.pop(i)
+            record_result(llm_result(i, rec, xml, err), rec, pbar)
+
+        limiter = AdaptiveLimiter(initial=INITIAL_CONCURRENCY, usage=usage)
+        classify_comments(
+            llm_items(), GENERAL_PROMPT,
+            model=MODEL_NAME, base_url=BASE_URL, api_key=API_KEY, temperature=TEMPERATURE,
+            max_retries=MAX_RETRIES, backoff=SLEEP_BACKOFF, limiter=limiter, cache=cache, on_result=on_llm_result,
+            batch_size=BATCH_SIZE,
+        )
+        print(f"[*] Async engine: {limiter.stats()}")
+    else:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            in_flight = {}  # future -> (idx, record), bounded instead of submitting everything up front
+
+            def finish(fut):
+                i, rec = in_flight.pop(fut)
+                try:
+                    r = fut.result()
+                except Exception as e:
+                    r = {"idx": i, "xml": "<xml>none</xml>", "pred_labels": [], "error": f"WorkerError: {e}", "_comment_length": 0}
+                record_result(r, rec, pbar)
+
+            for i, rec in pending_records():
+                if len(in_flight) >= 2 * MAX_WORKERS:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        finish(fut)
+                in_flight[ex.submit(classify_record, (i, rec))] = (i, rec)
+            for fut in as_completed(list(in_flight)):
+                finish(fut)
+
+if cache is not None:
+    print(f"[*] Cache: {cache.stats()}")
+# Cost per 1k records classified in this run, answers from the cache count as free
+print(f"[*] Tokens: {usage.stats(num_records - resumed, (PRICE_INPUT, PRICE_CACHED_INPUT, PRICE_OUTPUT))}")
+
+# Phase 2: sequential aggregation, final metrics, and file outputs, rebuilt from the result log
+# The log is in completion order: it is read back sorted by idx and walked next to the input
+results = result_log.sorted_records()
+missing = {"xml": "", "pred_labels": [], "error": "Missing result.", "_comment_length": 0}
+
+json_path = base + ".json"
+csv_path  = base + ".csv"
+
+csv_cols = ["xml", "pred_labels", "gt_labels", "error"]
+if SHOW_COMMENTS:
+    csv_cols = ["comments"] + csv_cols
+else:
+    csv_cols = ["_comment_length"] + csv_cols
 
 num_done = 0
 num_exact = 0
@@ -312,48 +283,68 @@ tp_label = Counter()
 fp_label = Counter()
 fn_label = Counter()
 
-for i, rec in enumerate(records):
-    r = results[i]
-    xml = r["xml"]
-    pred_labels = r["pred_labels"]
-    err = r["error"]
-
-    gt_labels = parse_ground_truth_labels(rec)
-    pred_set, gt_set = set(pred_labels), set(gt_labels)
-
-    num_done += 1
-    if pred_set == gt_set:
-        num_exact += 1
-
-    inter = pred_set & gt_set
-    hit_now = bool(inter) or (COUNT_NONE_AS_HIT and not pred_set and not gt_set)
-    if hit_now:
-        num_hit_incl_none += 1
-    if inter:
-        num_hit_nonempty += 1
-
-    if pred_set: num_any_pred += 1
-    if gt_set:   num_any_gt += 1
-    if pred_set and not gt_set: num_false_pos_records += 1
-    if gt_set and not pred_set: num_false_neg_records += 1
-
-    for l in gt_set:   gt_label_freq[l] += 1
-    for l in pred_set: pred_label_freq[l] += 1
-    for l in inter: tp_label[l] += 1
-    for l in pred_set - gt_set: fp_label[l] += 1
-    for l in gt_set - pred_set: fn_label[l] += 1
-
-    row = {
-        **rec,
-        "xml": xml or "",
-        "pred_labels": list(pred_set),
-        "gt_labels": list(gt_set),
-        "error": err,
-    }
-    if not SHOW_COMMENTS:
-        row["_comment_length"] = r["_comment_length"]
-        row.pop("comments", None)
-    enriched.append(row)
+# The JSON array and the CSV are written row by row instead of collected in memory
+with open(json_path, "w", encoding="utf-8") as json_file, open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
+    writer = csv.writer(csv_file)
+    writer.writerow(["index"] + csv_cols + ["exact_match"])
+    json_file.write("[")
+
+    logged = next(results, None)
+    for i, rec in iter_records():
+        while logged is not None and logged["idx"] < i:
+            logged = next(results, None)
+        r = logged if logged is not None and logged["idx"] == i else missing
+        xml = r["xml"]
+        pred_labels = r["pred_labels"]
+        err = r["error"]
+
+        gt_labels = parse_ground_truth_labels(rec)
+        pred_set, gt_set = set(pred_labels), set(gt_labels)
+
+        num_done += 1
+        if pred_set == gt_set:
+            num_exact += 1
+
+        inter = pred_set & gt_set
+        hit_now = bool(inter) or (COUNT_NONE_AS_HIT and not pred_set and not gt_set)
+        if hit_now:
+            num_hit_incl_none += 1
+        if inter:
+            num_hit_nonempty += 1
+
+        if pred_set: num_any_pred += 1
+        if gt_set:   num_any_gt += 1
+        if pred_set and not gt_set: num_false_pos_records += 1
+        if gt_set and not pred_set: num_false_neg_records += 1
+
+        for l in gt_set:   gt_label_freq[l] += 1
+        for l in pred_set: pred_label_freq[l] += 1
+        for l in inter: tp_label[l] += 1
+        for l in pred_set - gt_set: fp_label[l] += 1
+        for l in gt_set - pred_set: fn_label[l] += 1
+
+        row = {
+            **rec,
+            "xml": xml or "",
+            "pred_labels": list(pred_set),
+            "gt_labels": list(gt_set),
+            "error": err,
+        }
+        if not SHOW_COMMENTS:
+            row["_comment_length"] = r["_comment_length"]
+            row.pop("comments", None)
+
+        # Same layout as json.dump(rows, indent=2)
+        json_file.write(("," if num_done > 1 else "") + "\n" + textwrap.indent(json.dumps(row, ensure_ascii=False, indent=2), "  "))
+        exact = int(pred_set == gt_set)
+        writer.writerow([
+            i,
+            *(row.get(c, "") if not isinstance(row.get(c, ""), list) else ",".join(row.get(c, [])) for c in csv_cols),
+            exact
+        ])
+
+    json_file.write("\n]" if num_done else "]")
+result_log.close()
 
 print(f"✅ Finished.")
 print(f"Exact-match accuracy: {num_exact/num_done:.4f}")
@@ -379,32 +370,6 @@ for l in labels_all:
           f"TP={tp:4d}  FP={fp:4d}  FN={fn:4d}  P={prec:.2f} R={rec:.2f}")
 
 
-# save outputs (model name appended; replace "/" or "\" with "_")
-model_safe = re.sub(r"[\\/]", "_", MODEL_NAME)  # e.g., "qwen/qwen-2.5-7b-instruct" -> "qwen_qwen-2.5-7b-instruct"
-base = f"{OUTPUT_BASENAME}_{model_safe}"
-json_path = base + ".json"
-csv_path  = base + ".csv"
-
-with open(json_path, "w", encoding="utf-8") as f:
-    json.dump(enriched, f, ensure_ascii=False, indent=2)
-
-csv_cols = ["xml", "pred_labels", "gt_labels", "error"]
-if SHOW_COMMENTS:
-    csv_cols = ["comments"] + csv_cols
-else:
-    csv_cols = ["_comment_length"] + csv_cols
-
-with open(csv_path, "w", encoding="utf-8", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["index"] + csv_cols + ["exact_match"])
-    for idx, rec in enumerate(enriched):
-        exact = int(set(rec.get("pred_labels", [])) == set(rec.get("gt_labels", [])))
-        writer.writerow([
-            idx,
-            *(rec.get(c, "") if not isinstance(rec.get(c, ""), list) else ",".join(rec.get(c, [])) for c in csv_cols),
-            exact
-        ])
-
 print("📄 Wrote files:")
 print(" -", json_path)
 print(" -", csv_path)
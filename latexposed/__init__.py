@@ -0,0 +1 @@
+"""Reusable building blocks of the LaTeXpOsEd pipeline."""
@@ -0,0 +1,3 @@
+from latexposed.cli import main
+
+main()
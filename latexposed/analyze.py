@@ -0,0 +1,83 @@
+"""Analysis stage: aggregate the mined findings and the comment statistics."""
+
+import json
+import os
+from collections import Counter, defaultdict
+
+from latexposed.parse import list_paper_files, read_paper
+from latexposed.patterns import ip_pattern
+
+
+PAPERS_FOLDER = 'data/final'
+CUSTOM_PATTERNS_DIR = 'data/custom_patterns'
+DB_PATTERNS_DIR = 'data/db_patterns'
+URLS_TXT = 'data/extracted_urls.txt'
+IPS_TXT = 'data/extracted_ips.txt'
+
+
+def count_file_types(papers_folder: str = PAPERS_FOLDER) -> Counter:
+    """Most common file types."""
+    file_types = Counter()
+    for filename in list_paper_files(papers_folder):
+        paper = read_paper(papers_folder, filename)
+        if not paper:
+            continue
+        for file in paper:
+            ext = os.path.splitext(file)[1].lower()
+            file_types[ext] += 1
+    return file_types
+
+def comment_statistics(comments_file: str) -> dict[str, int]:
+    papers_with_source = 0
+    papers_with_no_comments = 0
+    papers_with_short_comments = 0
+
+    with open(comments_file, 'r') as f:
+        for line in f:
+            comment = json.loads(line)
+            papers_with_source += 1
+            if not comment['comments']:
+                papers_with_no_comments += 1
+            elif len(comment['comments']) < 100:
+                papers_with_short_comments += 1
+
+    return {
+        "papers_with_source": papers_with_source,
+        "papers_with_no_comments": papers_with_no_comments,
+        "papers_with_short_comments": papers_with_short_comments,
+    }
+
+def aggregate_findings(findings_file: str) -> dict:
+    """Collect the unique values found per pattern, as the notebooks save them."""
+    urls = set()
+    custom = defaultdict(set)
+    db = defaultdict(set)
+    llm_labels = Counter()
+    with open(findings_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            paper = json.loads(line)
+            urls.update(paper['urls'])
+            for key, match in paper['patterns'].items():
+                custom[key].add(match)
+            for match in paper['secrets']:
+                db[match['name']].add(match['match'])
+            if 'llm' in paper:
+                llm_labels.update(paper['llm']['pred_labels'])
+
+    # Remove example.com emails
+    custom['emails'] = {email for email in custom['emails'] if "example.com" not in email}
+    ips = {m.group() for url in urls if (m := ip_pattern.search(url))}
+    return {"urls": urls, "ips": ips, "custom_patterns": custom, "db_patterns": db, "llm_labels": llm_labels}
+
+def _write_lines(path: str, items):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(items))
+
+def save_findings(aggregated: dict):
+    _write_lines(URLS_TXT, aggregated['urls'])
+    _write_lines(IPS_TXT, aggregated['ips'])
+    for key, items in aggregated['custom_patterns'].items():
+        _write_lines(os.path.join(CUSTOM_PATTERNS_DIR, f'{key}.txt'), items)
+    for key, items in aggregated['db_patterns'].items():
+        _write_lines(os.path.join(DB_PATTERNS_DIR, f'{key}.txt'), items)
@@ -0,0 +1,116 @@
+"""
+Split a paper's merged comments into windows that fit an LLM context.
+
+`parse.merge_paper_comments` writes one cleaned comment per line, so the
+windows are cut on line boundaries and a comment is never split unless it
+alone exceeds the budget. Tokens are counted with the tiktoken encoder of
+2_parse; without tiktoken they are estimated from the UTF-8 length.
+"""
+
+import time
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from latexposed.llm import parse_labels_from_xml
+
+
+TOKEN_ENCODING = 'cl100k_base'
+# Comment tokens per request, the system prompt and the answer come on top
+CHUNK_TOKENS = 8000
+# Bytes per token when tiktoken is missing, on the low side so the estimate errs towards smaller chunks
+BYTES_PER_TOKEN = 3
+
+
+class CommentChunker:
+    """Cuts merged comments into chunks of at most `max_tokens`, and keeps statistics over every paper it saw."""
+
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, encoding: str = TOKEN_ENCODING):
+        self.max_tokens = max_tokens
+        self.encoder = tiktoken.get_encoding(encoding) if tiktoken is not None else None
+        self.papers = 0
+        self.chunked_papers = 0
+        self.chunks = 0
+        self.tokens = 0
+        self.max_paper_tokens = 0
+        self.split_comments = 0  # Comments longer than the budget, cut mid-comment
+        self.seconds = 0.0
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoder is not None:
+            return len(self.encoder.encode(text, disallowed_special=()))
+        return -(-len(text.encode('utf-8')) // BYTES_PER_TOKEN)
+
+    def _split_comment(self, comment: str) -> list[str]:
+        step = max(1, self.max_tokens - 1)  # Room for the newline
+        if self.encoder is not None:
+            tokens = self.encoder.encode(comment, disallowed_special=())
+            return [self.encoder.decode(tokens[i:i + step]) for i in range(0, len(tokens), step)]
+        size = step * BYTES_PER_TOKEN
+        return [comment[i:i + size] for i in range(0, len(comment), size)]
+
+    def split(self, merged_comments: str) -> list[str]:
+        start = time.perf_counter()
+        self.papers += 1
+        total = self.count_tokens(merged_comments)
+        self.tokens += total
+        self.max_paper_tokens = max(self.max_paper_tokens, total)
+        if total <= self.max_tokens:
+            self.chunks += 1
+            self.seconds += time.perf_counter() - start
+            return [merged_comments]
+
+        chunks, window, window_tokens = [], [], 0
+        for comment in merged_comments.split('\n'):
+            tokens = self.count_tokens(comment) + 1  # and the newline
+            if tokens > self.max_tokens:
+                self.split_comments += 1
+                pieces = self._split_comment(comment)
+            else:
+                pieces = [comment]
+            for piece in pieces:
+                piece_tokens = tokens if len(pieces) == 1 else self.count_tokens(piece) + 1
+                if window and window_tokens + piece_tokens > self.max_tokens:
+                    chunks.append('\n'.join(window))
+                    window, window_tokens = [], 0
+                window.append(piece)
+                window_tokens += piece_tokens
+        if window:
+            chunks.append('\n'.join(window))
+        self.chunked_papers += 1
+        self.chunks += len(chunks)
+        self.seconds += time.perf_counter() - start
+        return chunks
+
+    def stats(self) -> dict:
+        return {
+            'papers': self.papers,
+            'chunked_papers': self.chunked_papers,
+            'chunks': self.chunks,
+            'tokens': self.tokens,
+            'max_paper_tokens': self.max_paper_tokens,
+            'split_comments': self.split_comments,
+            'tok/s': round(self.tokens / self.seconds) if self.seconds else 0,
+        }
+
+
+def merge_chunk_answers(answers: list[tuple[Optional[str], Optional[str]]]) -> tuple[Optional[str], Optional[str]]:
+    """
+    One `(xml, error)` for a paper from the answers of its chunks: the union
+    of their labels, in first-seen order. Errors of single chunks are kept
+    next to the labels of the others, the paper only fails if every chunk did.
+    """
+    if len(answers) == 1:
+        return answers[0]
+    labels, errors = [], []
+    for n, (xml, err) in enumerate(answers, 1):
+        if err or not xml:
+            errors.append(f'chunk {n}/{len(answers)}: {err or "no answer"}')
+            continue
+        labels += [label for label in parse_labels_from_xml(xml) if label not in labels]
+    if len(errors) == len(answers):
+        return None, '; '.join(errors)
+    return f"<xml>{','.join(labels) or 'none'}</xml>", '; '.join(errors) or None
@@ -0,0 +1,357 @@
+"""
+Command line runner for the LaTeXpOsEd pipeline.
+
+Usage (from the repository root):
+  python -m latexposed scrape --target-count 1000 [--download-workers 8 --extract-workers 2]
+  python -m latexposed parse [--workers 0]
+  python -m latexposed mine [--llm-model qwen/qwen-2.5-72b-instruct | --workers 0]
+  python -m latexposed migrate-store --papers-folder data/final --store data/store
+  python -m latexposed analyze
+  python -m latexposed llm-cache stats|export FILE|import FILE|evict --max-bytes N
+  python -m latexposed run          # scrape -> parse -> mine, streamed
+
+Every stage records finished papers in a ledger under --checkpoint-dir and
+skips them when restarted. Pass --fresh to start a stage from scratch.
+"""
+
+import argparse
+import itertools
+import os
+import sys
+from typing import Optional
+
+from tqdm import tqdm
+
+from latexposed import analyze, ledger, mine, parse, scrape, store
+from latexposed.chunking import CHUNK_TOKENS, CommentChunker
+from latexposed.findings_db import FINDINGS_DB, build_findings_db
+from latexposed.llm import LLM_PROVIDER, SYSTEM_PROMPT_FILE, TokenUsage, load_system_prompt
+from latexposed.llm_cache import LLM_CACHE_DB, LLMCache
+from latexposed.pattern_profile import PatternProfile
+from latexposed.patterns import compile_search_patterns
+from latexposed.pipeline import QUEUE_SIZE, threaded
+from latexposed.regex_engine import ENGINES, RegexBudget
+from latexposed.secrets_db import DEFAULT_CONFIDENCES, SECRETS_DB, SecretsScanner
+from latexposed.triage import TriageScorer
+
+
+def _selected_archives(args) -> list[dict]:
+    if args.refresh_manifest and args.s3_mirror:
+        scrape.LocalMirrorDownloader(args.s3_mirror)('arxiv', 'src/arXiv_src_manifest.xml', args.manifest_xml)
+    elif args.refresh_manifest:
+        scrape.s3_download_requester_pays('arxiv', 'src/arXiv_src_manifest.xml', args.manifest_xml)
+    if args.refresh_manifest or not os.path.exists(args.manifest):
+        scrape.build_manifest(args.manifest_xml, args.manifest)
+    selected_files = scrape.select_archives(args.manifest, args.target_count)
+    cumulative_items = sum(int(fileinfo['num_items']) for fileinfo in selected_files)
+    print(f'Selected {len(selected_files)} files, cumulative num_items={cumulative_items}')
+    return selected_files
+
+def _scraped_papers(args, selected_files: list[dict], scrape_ledger):
+    download = scrape.LocalMirrorDownloader(args.s3_mirror) if args.s3_mirror else scrape.s3_download_requester_pays
+    # With a paper store the papers are appended to it here instead of being saved one file each
+    target_dir = None if args.store else args.target_dir
+    counters = {}
+    if args.download_workers > 1 or args.extract_workers > 1:
+        papers = scrape.iter_scraped_papers_concurrent(
+            selected_files, scrape_ledger, args.archives_dir, args.tmp_dir, target_dir, download,
+            args.download_workers, args.extract_workers, counters=counters, in_memory=not args.extract_to_tmp)
+    else:
+        papers = scrape.iter_scraped_papers(
+            selected_files, scrape_ledger, args.archives_dir, args.tmp_dir, target_dir, download,
+            in_memory=not args.extract_to_tmp)
+    if args.store:
+        with store.PaperStoreWriter(args.store) as writer:
+            for name, tex_data in papers:
+                writer.add(name, tex_data)
+                yield name, tex_data
+    else:
+        yield from papers
+    for counter in counters.values():
+        print(counter.summary())
+
+def _boilerplate(args, papers_folder: str) -> set[str]:
+    if args.build_boilerplate or not os.path.exists(args.boilerplate):
+        if not os.path.isdir(papers_folder) or not os.listdir(papers_folder):
+            print(f'No boilerplate list at {args.boilerplate}, comments are not filtered for boilerplate.')
+            return set()
+        workers = getattr(args, 'workers', 1) or os.cpu_count()
+        if workers > 1:
+            with tqdm(total=len(parse.list_paper_files(papers_folder)), desc='Counting common comments') as pbar:
+                comment_counter = parse.count_common_comments_parallel(papers_folder, workers, progress=pbar)
+        else:
+            paper_iterator = parse.PaperContentIterator(papers_folder)
+            comment_counter = parse.count_common_comments(tqdm(paper_iterator, desc='Counting common comments'))
+        parse.save_boilerplate(comment_counter, args.boilerplate)
+    return parse.load_boilerplate(args.boilerplate)
+
+def _regex_budget(args) -> Optional[RegexBudget]:
+    return RegexBudget(args.regex_timeout) if args.regex_timeout else None
+
+def _miner(args) -> mine.PaperMiner:
+    budget = _regex_budget(args)
+    scanner = SecretsScanner.from_yaml(args.secrets_db, args.confidence, args.regex_engine, budget)
+    llm_config = None
+    if args.llm_model:
+        api_key = args.api_key or os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise SystemExit("Please pass --api-key or set OPENROUTER_API_KEY / OPENAI_API_KEY env var.")
+        llm_config = {
+            "system_prompt": load_system_prompt(args.system_prompt),
+            "model": args.llm_model,
+            "base_url": args.llm_provider,
+            "api_key": api_key,
+            "cache": LLMCache(args.llm_cache) if args.llm_cache else None,
+            "usage": TokenUsage(),
+        }
+    chunker = CommentChunker(args.llm_chunk_tokens) if args.llm_model and args.llm_chunk_tokens else None
+    triage = TriageScorer(threshold=args.llm_triage_threshold) if args.llm_model and args.llm_triage_threshold is not None else None
+    profile = PatternProfile() if args.profile_patterns else None
+    return mine.PaperMiner(scanner, llm_config, chunker, triage, compile_search_patterns(args.regex_engine), budget, profile)
+
+def _print_regex_report(scanner: SecretsScanner, budget: Optional[RegexBudget]):
+    if scanner.engine != 're':
+        print(f'{scanner.fallbacks} of {len(scanner)} secrets-patterns-db patterns run on re instead of {scanner.engine}')
+    if budget is not None:
+        print('Patterns stopped by --regex-timeout:', budget.report() or 'none')
+
+def _save_pattern_profile(path: str, profile: Optional[PatternProfile]):
+    if profile is None:
+        return
+    folded = os.path.splitext(path)[0] + '.folded'
+    profile.write_csv(path)
+    profile.write_folded(folded)
+    print(f'Pattern profile written to {path} and {folded}, the most expensive patterns:')
+    for row in profile.rows(limit=5):
+        print(f"  {row['share']:6.1%} {row['total_seconds']:9.3f}s p99 {row['p99_us']:9.1f}us "
+              f"{row['matches']:7} matches  {row['source']} {row['confidence']} {row['pattern']}")
+
+def _print_llm_usage(miner: mine.PaperMiner):
+    if miner.llm_config is not None:
+        print('LLM tokens:', miner.llm_config['usage'].stats())
+    if miner.chunker is not None:
+        print('LLM chunks:', miner.chunker.stats())
+    if miner.triage is not None:
+        print('LLM triage:', miner.triage.stats())
+
+
+def cmd_scrape(args):
+    selected_files = _selected_archives(args)
+    with ledger.stage_ledger('scrape', args.checkpoint_dir, args.fresh) as scrape_ledger:
+        for _ in tqdm(_scraped_papers(args, selected_files, scrape_ledger), desc='Scraping papers'):
+            pass
+
+def cmd_parse(args):
+    boilerplate = _boilerplate(args, args.papers_folder)
+    with ledger.stage_ledger('parse', args.checkpoint_dir, args.fresh) as parse_ledger, \
+            ledger.ResumableJsonlWriter(args.output, parse_ledger) as out_file:
+        workers = args.workers or os.cpu_count()
+        if workers > 1:
+            records = parse.iter_paper_comments_parallel(args.papers_folder, boilerplate, workers, skip=parse_ledger.done)
+        else:
+            paper_iterator = parse.PaperContentIterator(args.papers_folder, skip=parse_ledger.done)
+            records = parse.iter_paper_comments(threaded(paper_iterator, args.queue_size), boilerplate, parse_ledger)
+        for record in tqdm(records, desc='Extracting comments'):
+            out_file.write(record['name'], record)
+
+def cmd_mine(args):
+    workers = args.workers or os.cpu_count()
+    if workers > 1 and args.llm_model:
+        raise SystemExit('--workers only parallelizes the pattern matching, run the LLM extraction with --workers 1.')
+    miner = _miner(args) if workers == 1 else None
+    with ledger.stage_ledger('mine', args.checkpoint_dir, args.fresh) as mine_ledger, \
+            ledger.ResumableJsonlWriter(args.output, mine_ledger) as out_file:
+        if workers > 1:
+            budget = _regex_budget(args)
+            profile = PatternProfile() if args.profile_patterns else None
+            scanner = SecretsScanner.from_yaml(args.secrets_db, args.confidence, args.regex_engine)
+            findings_iter = mine.iter_findings_parallel(
+                args.comments, workers, scanner, skip=mine_ledger.done,
+                patterns=compile_search_patterns(args.regex_engine), budget=budget, profile=profile)
+        else:
+            records = threaded(mine.iter_comment_records(args.comments, skip=mine_ledger.done), args.queue_size)
+            findings_iter = mine.iter_findings(records, miner, mine_ledger)
+        for findings in tqdm(findings_iter, desc='Mining comments'):
+            out_file.write(findings['name'], findings)
+    if miner is not None:
+        _print_regex_report(miner.scanner, miner.budget)
+        _save_pattern_profile(args.profile_patterns, miner.profile)
+        _print_llm_usage(miner)
+    else:
+        _print_regex_report(scanner, budget)
+        _save_pattern_profile(args.profile_patterns, profile)
+
+def cmd_migrate_store(args):
+    paper_count = len(parse.list_paper_files(args.papers_folder))
+    with tqdm(total=paper_count, desc='Migrating papers') as pbar:
+        added = store.migrate_papers_folder(args.papers_folder, args.store, args.papers_per_shard, progress=pbar)
+    print(f'Added {added} papers to {args.store}')
+
+def cmd_llm_cache(args):
+    if args.action in ('export', 'import') and not args.file:
+        raise SystemExit(f'{args.action} needs a JSONL file.')
+    with LLMCache(args.path) as cache:
+        if args.action == 'export':
+            print(f'Exported {cache.export_jsonl(args.file, args.model)} answers to {args.file}')
+        elif args.action == 'import':
+            print(f'Imported {cache.import_jsonl(args.file)} new answers from {args.file}')
+        elif args.action == 'evict':
+            print(f'Evicted {cache.evict(args.max_bytes)} answers')
+        print('LLM cache:', cache.stats())
+
+def cmd_analyze(args):
+    if os.path.isdir(args.papers_folder):
+        print('Most common file types:', analyze.count_file_types(args.papers_folder).most_common(20))
+    if os.path.exists(args.comments):
+        print('Comment statistics:', analyze.comment_statistics(args.comments))
+    aggregated = analyze.aggregate_findings(args.findings)
+    analyze.save_findings(aggregated)
+    print(f"urls: {len(aggregated['urls'])}")
+    print(f"ips: {len(aggregated['ips'])}")
+    for key, items in aggregated['custom_patterns'].items():
+        print(f'{key}: {len(items)}')
+    print(f"secrets-patterns-db: {sum(len(items) for items in aggregated['db_patterns'].values())} "
+          f"values over {len(aggregated['db_patterns'])} patterns")
+    if aggregated['llm_labels']:
+        print('LLM labels:', dict(aggregated['llm_labels']))
+    if args.findings_db:
+        papers = build_findings_db(args.findings, args.findings_db)
+        print(f'Findings table of {papers} papers written to {args.findings_db}')
+
+def cmd_run(args):
+    selected_files = _selected_archives(args)
+    papers_folder = args.store or args.target_dir
+    boilerplate = _boilerplate(args, papers_folder)
+    miner = _miner(args)
+    with ledger.stage_ledger('scrape', args.checkpoint_dir, args.fresh) as scrape_ledger, \
+            ledger.stage_ledger('parse', args.checkpoint_dir, args.fresh) as parse_ledger, \
+            ledger.stage_ledger('mine', args.checkpoint_dir, args.fresh) as mine_ledger, \
+            ledger.ResumableJsonlWriter(args.comments, parse_ledger) as comments_file, \
+            ledger.ResumableJsonlWriter(args.findings, mine_ledger) as findings_file:
+
+        # Papers saved by an interrupted run but not parsed yet are replayed first
+        os.makedirs(papers_folder, exist_ok=True)
+        pending_papers = parse.PaperContentIterator(papers_folder, skip=parse_ledger.done)
+        scraped = _scraped_papers(args, selected_files, scrape_ledger)
+        papers = threaded(itertools.chain(pending_papers, scraped), args.queue_size)
+
+        def parsed():
+            for record in parse.iter_paper_comments(papers, boilerplate, parse_ledger):
+                comments_file.write(record['name'], record)
+                yield record
+
+        # Likewise, comments parsed before the interruption but not mined yet
+        pending_comments = mine.iter_comment_records(args.comments, skip=mine_ledger.done) if len(parse_ledger) else iter(())
+        records = threaded(itertools.chain(pending_comments, parsed()), args.queue_size)
+        for findings in tqdm(mine.iter_findings(records, miner, mine_ledger), desc='Mining papers'):
+            findings_file.write(findings['name'], findings)
+    _print_regex_report(miner.scanner, miner.budget)
+    _save_pattern_profile(args.profile_patterns, miner.profile)
+    _print_llm_usage(miner)
+
+
+def _add_scrape_args(p):
+    p.add_argument('--manifest', default=scrape.ARXIV_MANIFEST_JSON, help='JSON manifest of the arXiv source archives.')
+    p.add_argument('--manifest-xml', default=scrape.ARXIV_MANIFEST_XML, help='XML manifest, converted if the JSON one is missing.')
+    p.add_argument('--refresh-manifest', action='store_true', help='Download the manifest from S3 again.')
+    p.add_argument('--target-count', type=int, default=scrape.TARGET_COUNT, help='Number of papers to download.')
+    p.add_argument('--archives-dir', default=scrape.ARCHIVES_DIR)
+    p.add_argument('--tmp-dir', default=scrape.TMP_DIR)
+    p.add_argument('--extract-to-tmp', action='store_true', help='Unpack the archives to --tmp-dir instead of streaming them in memory.')
+    p.add_argument('--target-dir', default=scrape.TARGET_DIR, help='One JSON of LaTeX sources per paper.')
+    p.add_argument('--store', default=None, help='Append the papers to this paper store instead of --target-dir. '
+                   'With more than one download or extract worker, every archive\'s LaTeX sources are spooled '
+                   'to a JSONL file in --tmp-dir on their way to the store, which needs room there for the '
+                   'sources of up to download-workers + 2 archives.')
+    p.add_argument('--download-workers', type=int, default=1, help='Archives downloaded concurrently.')
+    p.add_argument('--extract-workers', type=int, default=1, help='Processes extracting the downloaded archives.')
+    p.add_argument('--s3-mirror', default=None, help='Read the bucket keys from this directory instead of S3.')
+
+def _add_boilerplate_args(p):
+    p.add_argument('--boilerplate', default=parse.COMMON_COMMENTS_TXT, help='List of common comments to drop.')
+    p.add_argument('--build-boilerplate', action='store_true', help='Recount the common comments before parsing.')
+
+def _add_mine_args(p):
+    p.add_argument('--secrets-db', default=SECRETS_DB)
+    p.add_argument('--confidence', nargs='+', default=list(DEFAULT_CONFIDENCES), help='secrets-patterns-db confidence levels to scan.')
+    p.add_argument('--regex-engine', choices=ENGINES, default='re',
+                   help='re2 (google-re2) matches in linear time, patterns it cannot compile stay on re.')
+    p.add_argument('--regex-timeout', type=float, default=None,
+                   help='Seconds one pattern may spend on one paper before it is stopped and reported.')
+    p.add_argument('--profile-patterns', default=None, metavar='CSV',
+                   help='Time every pattern and write the profile to this CSV, and as folded stacks next to it.')
+    p.add_argument('--llm-model', default=None, help='Also classify comments with this model.')
+    p.add_argument('--llm-provider', default=LLM_PROVIDER, help='OpenAI compatible API base URL.')
+    p.add_argument('--api-key', default=None)
+    p.add_argument('--system-prompt', default=SYSTEM_PROMPT_FILE)
+    p.add_argument('--llm-cache', default=LLM_CACHE_DB, help='Answer cache reused across runs, empty to disable.')
+    p.add_argument('--llm-chunk-tokens', type=int, default=CHUNK_TOKENS,
+                   help='Split papers with more comment tokens into several requests, 0 to send them whole.')
+    p.add_argument('--llm-triage-threshold', type=float, default=None,
+                   help='Only send papers with at least this triage score to the LLM, see scripts/bench_triage.py.')
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog='latexposed', description='LaTeXpOsEd pipeline runner.')
+    sub = ap.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--checkpoint-dir', default=ledger.CHECKPOINT_DIR, help='Where the per-paper ledgers are kept.')
+    common.add_argument('--fresh', action='store_true', help='Ignore existing checkpoints and start over.')
+    common.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='Records buffered between stages.')
+
+    p = sub.add_parser('scrape', parents=[common], help='Download archives and save the LaTeX sources.')
+    _add_scrape_args(p)
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser('parse', parents=[common], help='Extract and clean the comments of every paper.')
+    p.add_argument('--papers-folder', default=parse.PAPERS_FOLDER, help='Folder of paper JSONs or a paper store.')
+    p.add_argument('--output', default=parse.COMMENTS_JSONL)
+    p.add_argument('--workers', type=int, default=1, help='Worker processes, 0 uses every core.')
+    _add_boilerplate_args(p)
+    p.set_defaults(func=cmd_parse)
+
+    p = sub.add_parser('mine', parents=[common], help='Pattern matching and LLM entity extraction.')
+    p.add_argument('--comments', default=parse.COMMENTS_JSONL)
+    p.add_argument('--output', default=mine.MINED_JSONL)
+    p.add_argument('--workers', type=int, default=1,
+                   help='Worker processes for the pattern matching, each mines a byte range of --comments. 0 uses every core.')
+    _add_mine_args(p)
+    p.set_defaults(func=cmd_mine)
+
+    p = sub.add_parser('migrate-store', help='Convert a folder of paper JSONs to a sharded paper store.')
+    p.add_argument('--papers-folder', default=parse.PAPERS_FOLDER)
+    p.add_argument('--store', default=store.STORE_DIR)
+    p.add_argument('--papers-per-shard', type=int, default=store.PAPERS_PER_SHARD)
+    p.set_defaults(func=cmd_migrate_store)
+
+    p = sub.add_parser('llm-cache', help='Inspect, export, import or shrink the LLM answer cache.')
+    p.add_argument('action', choices=['stats', 'export', 'import', 'evict'])
+    p.add_argument('file', nargs='?', help='JSONL file to export to or import from.')
+    p.add_argument('--path', default=LLM_CACHE_DB)
+    p.add_argument('--model', default=None, help='Only export the answers of this model.')
+    p.add_argument('--max-bytes', type=int, default=0, help='Size to evict down to.')
+    p.set_defaults(func=cmd_llm_cache)
+
+    p = sub.add_parser('analyze', help='Aggregate findings and statistics.')
+    p.add_argument('--findings', default=mine.MINED_JSONL)
+    p.add_argument('--comments', default=parse.COMMENTS_JSONL)
+    p.add_argument('--papers-folder', default=analyze.PAPERS_FOLDER)
+    p.add_argument('--findings-db', default=FINDINGS_DB, help='SQLite table of every match with its paper and offsets, empty to skip.')
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser('run', parents=[common], help='Scrape, parse and mine in one streamed run.')
+    _add_scrape_args(p)
+    _add_boilerplate_args(p)
+    _add_mine_args(p)
+    p.add_argument('--comments', default=parse.COMMENTS_JSONL)
+    p.add_argument('--findings', default=mine.MINED_JSONL)
+    p.set_defaults(func=cmd_run)
+
+    return ap
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
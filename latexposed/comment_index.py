@@ -0,0 +1,173 @@
+"""
+Indexed reader for paper_comments.jsonl.
+
+The first open scans the file once and writes a sidecar index next to it,
+`paper_comments.jsonl.idx`, with the byte offset of every paper's line:
+
+    #latexposed-comment-index \t {size} \t {mtime_ns}
+    {name} \t {offset}           # one line per paper, in file order
+
+Later opens only read the sidecar, as long as the size and modification time
+in its header still match the JSONL. That gives `len()` without reading the
+comments, random access by position or paper name, and byte-balanced ranges
+for parallel workers, which read their range by offsets without the index.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import re
+from typing import Iterator, Optional
+
+
+INDEX_SUFFIX = '.idx'
+INDEX_HEADER = '#latexposed-comment-index'
+
+# parse.py writes "name" first, so it is read from the start of the line without parsing the comments
+NAME_RE = re.compile(rb'^\{"name":\s*("(?:[^"\\]|\\.)*")')
+
+
+def _line_name(line: bytes) -> str:
+    if m := NAME_RE.match(line):
+        return json.loads(m.group(1))
+    return json.loads(line)['name']
+
+
+def build_comment_index(comments_file: str, index_file: Optional[str] = None) -> str:
+    """Scan `comments_file` and write its sidecar index. Returns the index path."""
+    index_file = index_file or comments_file + INDEX_SUFFIX
+    stat = os.stat(comments_file)
+    tmp_file = index_file + '.tmp'
+    with open(comments_file, 'rb') as f, open(tmp_file, 'w', encoding='utf-8') as out:
+        out.write(f'{INDEX_HEADER}\t{stat.st_size}\t{stat.st_mtime_ns}\n')
+        offset = 0
+        for line in f:
+            if line.strip():
+                out.write(f'{_line_name(line)}\t{offset}\n')
+            offset += len(line)
+    os.replace(tmp_file, index_file)
+    return index_file
+
+
+def iter_byte_range(comments_file: str, start: int, end: int) -> Iterator[dict]:
+    """Records of the lines in bytes `[start, end)` of `comments_file`, the offsets come from `CommentIndex.byte_shards`."""
+    with open(comments_file, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+
+class CommentIndex:
+    """
+    Random access to paper_comments.jsonl through its sidecar index, which is
+    built on first use and rebuilt whenever the JSONL changed. Iterating
+    yields `(paper index, record)` like the notebooks' old iterator.
+    `use_mmap` maps the file instead of seeking, which is cheaper for many
+    random reads.
+    """
+
+    def __init__(self, comments_file: str, use_mmap: bool = False, index_file: Optional[str] = None):
+        self.comments_file = comments_file
+        self.index_file = index_file or comments_file + INDEX_SUFFIX
+        self.names = []
+        self.offsets = []
+        if not self._load_index():
+            build_comment_index(comments_file, self.index_file)
+            self._load_index()
+        self.offsets.append(os.path.getsize(comments_file))  # End of the last line
+        self.positions = None  # name -> paper index, built on the first lookup by name
+        self.file_reader = open(comments_file, 'rb')
+        self.mmap = None
+        if use_mmap and self.offsets[-1] > 0:
+            self.mmap = mmap.mmap(self.file_reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load_index(self) -> bool:
+        if not os.path.exists(self.index_file):
+            return False
+        stat = os.stat(self.comments_file)
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            if f.readline() != f'{INDEX_HEADER}\t{stat.st_size}\t{stat.st_mtime_ns}\n':
+                return False
+            names, offsets = [], []
+            for line in f:
+                name, _, offset = line.rstrip('\n').rpartition('\t')
+                names.append(name)
+                offsets.append(int(offset))
+        self.names, self.offsets = names, offsets
+        return True
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return self.position(name) is not None
+
+    def __iter__(self) -> Iterator[tuple[int, dict]]:
+        return self.iter_range()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self, start: int, end: int) -> bytes:
+        if self.mmap is not None:
+            return self.mmap[start:end]
+        self.file_reader.seek(start)
+        return self.file_reader.read(end - start)
+
+    def __getitem__(self, index: int) -> dict:
+        """Record of the paper at `index`, in file order."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return json.loads(self._read(self.offsets[index], self.offsets[index + 1]))
+
+    def position(self, name: str) -> Optional[int]:
+        if self.positions is None:
+            # A paper written twice keeps its last copy, as in the paper store
+            self.positions = {name: i for i, name in enumerate(self.names)}
+        return self.positions.get(name)
+
+    def get(self, name: str) -> Optional[dict]:
+        """Record of a paper by name, None if it is not in the file."""
+        index = self.position(name)
+        return None if index is None else self[index]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple[int, dict]]:
+        """`(paper index, record)` for the papers in `[start, stop)`, read sequentially."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield index, self[index]
+
+    def shards(self, count: int) -> list[tuple[int, int]]:
+        """Split the papers into at most `count` contiguous `(start, stop)` ranges of about equal size in bytes."""
+        if not len(self):
+            return []
+        total = self.offsets[-1] - self.offsets[0]
+        bounds = [0]
+        for k in range(1, count):
+            cut = bisect.bisect_left(self.offsets, self.offsets[0] + total * k // count, lo=bounds[-1], hi=len(self))
+            if cut > bounds[-1]:
+                bounds.append(cut)
+        bounds.append(len(self))
+        return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+    def byte_shards(self, count: int) -> list[tuple[int, int]]:
+        """Same ranges as `shards`, as `(start, end)` byte offsets into the JSONL."""
+        return [(self.offsets[start], self.offsets[stop]) for start, stop in self.shards(count)]
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+        self.file_reader.close()
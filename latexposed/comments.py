@@ -0,0 +1,121 @@
+"""LaTeX comment extraction and cleanup, shared by the parse stage."""
+
+import re
+from typing import NamedTuple
+
+
+# Environments whose content is not LaTeX, a `%` in them is not a comment
+VERBATIM_ENVIRONMENTS = ('verbatim', 'verbatim*', 'Verbatim', 'Verbatim*', 'BVerbatim', 'LVerbatim', 'lstlisting', 'minted')
+COMMENT_ENVIRONMENT = 'comment'
+
+# Everything the tokenizer has to look at, the rest of the source is skipped in C
+SCAN_RE = re.compile(r'%|\\(?:begin|verb|lstinline)')
+# The comment environment in any case, like `\begin{Comment}`, the verbatim ones as spelled
+BEGIN_RE = re.compile(r'\\begin\s*\{(' + '|'.join(re.escape(env) for env in VERBATIM_ENVIRONMENTS) + f'|(?i:{COMMENT_ENVIRONMENT})' + r')\}')
+COMMENT_END_RE = re.compile(r'\\end\s*\{' + COMMENT_ENVIRONMENT + r'\}', re.IGNORECASE)
+VERB_RE = re.compile(r'\\(?:verb|lstinline)\*?([^a-zA-Z\s*\[{]).*?\1')
+
+
+class CommentToken(NamedTuple):
+    kind: str  # 'line' for `% ...`, 'block' for a comment environment
+    text: str  # Without the `%` or the environment markers, not stripped
+    line: int  # 1-based line of the first character
+    start: int  # Character offsets into the source
+    end: int
+    byte_start: int  # Offsets into the UTF-8 encoded source
+    byte_end: int
+
+
+def tokenize_latex_comments(latex_code: str) -> list[CommentToken]:
+    """
+    Find every comment of a LaTeX file in a single left-to-right pass.
+
+    A `%` starts a comment unless it is escaped by an odd number of
+    backslashes, or is inside an inline `\\verb`, a verbatim-like
+    environment, or a comment environment. Comment environments are
+    reported as one 'block' token.
+    """
+    tokens = []
+    line, char_pos, byte_pos = 1, 0, 0
+
+    def locate(pos: int) -> tuple[int, int]:
+        nonlocal line, char_pos, byte_pos
+        line += latex_code.count('\n', char_pos, pos)
+        byte_pos += len(latex_code[char_pos:pos].encode('utf-8'))
+        char_pos = pos
+        return line, byte_pos
+
+    pos = 0
+    while m := SCAN_RE.search(latex_code, pos):
+        i = m.start()
+        # An odd number of backslashes escapes the match, `\\%` is a line break and a comment
+        backslashes = 0
+        while i - backslashes > 0 and latex_code[i - backslashes - 1] == '\\':
+            backslashes += 1
+        if backslashes % 2:
+            pos = i + 1
+            continue
+
+        if latex_code[i] == '%':
+            end = latex_code.find('\n', i)
+            end = len(latex_code) if end == -1 else end
+            carriage_return = latex_code.find('\r', i, end)
+            end = end if carriage_return == -1 else carriage_return
+            token_line, byte_start = locate(i)
+            _, byte_end = locate(end)
+            tokens.append(CommentToken('line', latex_code[i + 1:end], token_line, i, end, byte_start, byte_end))
+            pos = end
+        elif begin := BEGIN_RE.match(latex_code, i):
+            env = begin.group(1)
+            if env.lower() == COMMENT_ENVIRONMENT:
+                end_match = COMMENT_END_RE.search(latex_code, begin.end())
+                end = end_match.start() if end_match else len(latex_code)
+                token_line, byte_start = locate(begin.end())
+                _, byte_end = locate(end)
+                tokens.append(CommentToken('block', latex_code[begin.end():end], token_line, begin.end(), end, byte_start, byte_end))
+                pos = end_match.end() if end_match else end
+            else:
+                end_marker = f'\\end{{{env}}}'
+                end = latex_code.find(end_marker, begin.end())
+                end = len(latex_code) if end == -1 else end
+                pos = min(end + len(end_marker), len(latex_code))
+        elif verb := VERB_RE.match(latex_code, i):
+            pos = verb.end()
+        else:
+            pos = m.end()
+    return tokens
+
+
+def extract_latex_comment_blocks(latex_code: str) -> list:
+    tokens = tokenize_latex_comments(latex_code)
+    return [ token.text.strip() for token in tokens if token.kind == 'block' and token.text.strip() ]
+
+def extract_latex_comment_lines(latex_code: str) -> list:
+    tokens = tokenize_latex_comments(latex_code)
+    return [ token.text.strip() for token in tokens if token.kind == 'line' ]
+
+def extract_latex_comments(latex_code: str) -> list:
+    tokens = tokenize_latex_comments(latex_code)
+    # Line comments first, then comment environments
+    comments = [token.text for token in tokens if token.kind == 'line'] + [token.text for token in tokens if token.kind == 'block']
+
+    comments = [comment.strip() for comment in comments if comment.strip()] # Remove empty comments
+    return comments
+
+
+def normalize_comments(comments: list[str]) -> list[str]:
+    """Cleanup used when counting boilerplate comments."""
+    comments = [comment.strip() for comment in comments] # Strip leading/trailing whitespace
+    comments = [re.sub(r'\s+', ' ', comment) for comment in comments] # Normalize whitespace
+    comments = [comment for comment in comments if len(comment.strip()) > 5] # Remove short comments (including empty)
+    return comments
+
+def cleanup_comments(comments: list[str]) -> list[str]:
+    comments = normalize_comments(comments)
+    comments = [re.sub(r'%{4,}', '%%%', comment) for comment in comments] # Remove long separators
+    comments = [re.sub(r'-{4,}', '---', comment) for comment in comments] # Remove long separators
+    comments = [re.sub(r'={4,}', '===', comment) for comment in comments] # Remove long separators
+    return comments
+
+def filter_boilerplate(comments: list[str], boilerplate: set[str]) -> list[str]:
+    return [comment for comment in comments if comment not in boilerplate]
@@ -0,0 +1,233 @@
+"""
+EXIF metadata of the images kept by the logical filter, read from the head of
+the file without decoding pixels.
+
+`read_exif_header` reads a JPEG's segments up to the APP1 Exif segment, or a
+PNG's chunks up to the eXIf chunk or ImageMagick's "Raw profile type exif"
+text chunk, and stops at the first scan (SOS) or image
+data (IDAT) chunk, which is all an image needs to be read for. `parse_exif`
+decodes the TIFF structure of those bytes into the tags the analysis uses, in
+the shape of PIL's `_getexif()` with tag names:
+
+    {'Make': ..., 'Model': ..., 'DateTime': ..., 'DateTimeOriginal': ...,
+     'Software': ..., 'GPSInfo': {'GPSLatitudeRef': 'N', 'GPSLatitude': (48.0, 51.0, 30.0), ...}}
+
+`probe_exif` returns None for what it cannot read (other formats such as a
+WebP named .jpg, truncated or malformed headers), `read_exif` and the logical
+filter then fall back to PIL. A PNG whose eXIf
+chunk comes after its image data, which the spec allows but is rare, reads
+as having no EXIF. scripts/bench_exif_probe.py compares both paths.
+"""
+
+import struct
+import zlib
+from typing import Optional
+
+
+JPEG_MAGIC = b'\xff\xd8'
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+# Text chunk ImageMagick stores the EXIF of a PNG in, by default
+RAW_PROFILE_KEYWORD = b'Raw profile type exif'
+# Upper bound of the bytes read before giving up on the probe
+MAX_HEADER_BYTES = 1024 * 1024
+
+TAGS = {0x010f: 'Make', 0x0110: 'Model', 0x0131: 'Software', 0x0132: 'DateTime'}
+EXIF_TAGS = {0x9003: 'DateTimeOriginal', 0x9004: 'DateTimeDigitized'}
+GPS_TAGS = {0: 'GPSVersionID', 1: 'GPSLatitudeRef', 2: 'GPSLatitude', 3: 'GPSLongitudeRef', 4: 'GPSLongitude',
+            5: 'GPSAltitudeRef', 6: 'GPSAltitude', 7: 'GPSTimeStamp', 29: 'GPSDateStamp'}
+EXIF_IFD, GPS_IFD = 0x8769, 0x8825
+# TIFF field type -> (struct code, bytes)
+TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('LL', 8), 7: ('B', 1), 9: ('l', 4), 10: ('ll', 8)}
+
+
+class ExifError(Exception):
+    pass
+
+
+def _read(stream, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ExifError('Truncated image header')
+        data += chunk
+    return data
+
+
+class _Recorder:
+    """Keeps what was read, so a probed stream can still be copied."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.data = bytearray()
+
+    def read(self, size: int) -> bytes:
+        chunk = self.stream.read(size)
+        self.data += chunk
+        return chunk
+
+
+def read_exif_header(stream, max_bytes: int = MAX_HEADER_BYTES) -> Optional[bytes]:
+    """
+    The TIFF block of the EXIF of an image stream, None if the image has none.
+    Raises ExifError for what is not a well-formed JPEG or PNG head.
+    """
+    head = _read(stream, 8)
+    if head.startswith(JPEG_MAGIC):
+        pos = 2
+        while len(head) <= max_bytes:
+            if pos + 2 > len(head):
+                head += _read(stream, pos + 2 - len(head))
+            if head[pos] != 0xff:
+                raise ExifError('Bad JPEG marker')
+            marker = head[pos + 1]
+            if marker == 0xff:  # Fill byte
+                pos += 1
+                continue
+            pos += 2
+            if marker in (0xda, 0xd9):  # Start of scan, end of image
+                return None
+            if marker == 0x01 or 0xd0 <= marker <= 0xd7:  # No length
+                continue
+            if pos + 2 > len(head):
+                head += _read(stream, pos + 2 - len(head))
+            length, = struct.unpack('>H', head[pos:pos + 2])
+            if length < 2:
+                raise ExifError('Bad JPEG segment length')
+            if pos + length > len(head):
+                head += _read(stream, pos + length - len(head))
+            segment = head[pos + 2:pos + length]
+            pos += length
+            if marker == 0xe1 and segment.startswith(b'Exif\0\0'):
+                return segment[6:]
+        raise ExifError('JPEG header too long')
+    if head == PNG_MAGIC:
+        while len(head) <= max_bytes:
+            chunk = _read(stream, 8)
+            head += chunk
+            length, kind = struct.unpack('>L4s', chunk)
+            if kind in (b'IDAT', b'IEND'):
+                return None
+            data = _read(stream, length + 4)  # With the CRC
+            head += data
+            if kind == b'eXIf':
+                return data[:length]
+            if kind in (b'tEXt', b'zTXt', b'iTXt') and data.startswith(RAW_PROFILE_KEYWORD):
+                return _raw_profile(kind, data[:length])
+        raise ExifError('PNG header too long')
+    raise ExifError('Not a JPEG or PNG image')
+
+
+def _raw_profile(kind: bytes, data: bytes) -> bytes:
+    """
+    The TIFF block of an ImageMagick "Raw profile type exif" text chunk:
+    `\nexif\n<length>\n` and the profile in hex lines.
+    """
+    keyword, _, text = data.partition(b'\0')
+    try:
+        if kind == b'zTXt':
+            text = zlib.decompress(text[1:])
+        elif kind == b'iTXt':
+            compressed, text = text[0], text[2:]
+            text = text.split(b'\0', 2)[2]  # After the language tag and translated keyword
+            if compressed:
+                text = zlib.decompress(text)
+        profile = bytes.fromhex(''.join(text.decode('ascii').split('\n')[3:]))
+    except (IndexError, ValueError, UnicodeDecodeError, zlib.error) as e:
+        raise ExifError(f'Malformed raw EXIF profile: {e}')
+    return profile[6:] if profile.startswith(b'Exif\0\0') else profile
+
+
+def _value(tiff: bytes, order: str, kind: int, count: int, field: bytes):
+    code, size = TYPES[kind]
+    if size * count > 4:
+        offset, = struct.unpack(order + 'L', field)
+        field = tiff[offset:offset + size * count]
+        if len(field) < size * count:
+            raise ExifError('EXIF value out of bounds')
+    if kind == 2:
+        return field[:count].split(b'\0', 1)[0].decode('utf-8', errors='replace').strip()
+    values = struct.unpack(order + code * count, field[:size * count])
+    if kind in (5, 10):
+        values = tuple(num / den if den else float('nan') for num, den in zip(values[::2], values[1::2]))
+    return values[0] if count == 1 else tuple(values)
+
+def _ifd(tiff: bytes, order: str, offset: int, names: dict) -> tuple[dict, dict]:
+    """Named tags of the IFD at `offset`, and the raw values of the sub-IFD pointers."""
+    count, = struct.unpack(order + 'H', tiff[offset:offset + 2])
+    tags, pointers = {}, {}
+    for i in range(count):
+        entry = tiff[offset + 2 + 12 * i:offset + 14 + 12 * i]
+        if len(entry) < 12:
+            raise ExifError('Truncated IFD')
+        tag, kind, n = struct.unpack(order + 'HHL', entry[:8])
+        if tag in (EXIF_IFD, GPS_IFD):
+            pointers[tag], = struct.unpack(order + 'L', entry[8:])
+        elif tag in names and kind in TYPES:
+            tags[names[tag]] = _value(tiff, order, kind, n, entry[8:])
+    return tags, pointers
+
+def parse_exif(tiff: bytes) -> dict:
+    """The tags of TAGS, EXIF_TAGS and GPS_TAGS in an EXIF TIFF block. Raises ExifError if malformed."""
+    try:
+        order = {b'II': '<', b'MM': '>'}[tiff[:2]]
+        magic, offset = struct.unpack(order + 'HL', tiff[2:8])
+        if magic != 42:
+            raise ExifError('Bad TIFF magic')
+        exif, pointers = _ifd(tiff, order, offset, TAGS)
+        if EXIF_IFD in pointers:
+            exif.update(_ifd(tiff, order, pointers[EXIF_IFD], EXIF_TAGS)[0])
+        if GPS_IFD in pointers:
+            exif['GPSInfo'] = _ifd(tiff, order, pointers[GPS_IFD], GPS_TAGS)[0]
+    except (KeyError, IndexError, struct.error) as e:
+        raise ExifError(f'Malformed EXIF: {e}')
+    return exif
+
+def probe_exif(stream) -> tuple[bytes, Optional[dict]]:
+    """The bytes read and the EXIF of an image stream ({} without EXIF), None if the probe cannot read it."""
+    recorder = _Recorder(stream)
+    try:
+        tiff = read_exif_header(recorder)
+        exif = parse_exif(tiff) if tiff is not None else {}
+    except ExifError:
+        exif = None
+    return bytes(recorder.data), exif
+
+
+def pil_exif(image) -> dict:
+    """EXIF data with tag names through PIL, for a path or a seekable file."""
+    from PIL import Image
+    from PIL.ExifTags import GPSTAGS, TAGS as PIL_TAGS
+    try:
+        with Image.open(image) as img:
+            exif_data = img._getexif() if hasattr(img, '_getexif') else None
+    except Exception:
+        return {}
+    exif = {}
+    for tag_id, value in (exif_data or {}).items():
+        tag = PIL_TAGS.get(tag_id, tag_id)
+        if tag == 'GPSInfo' and isinstance(value, dict):
+            value = {GPSTAGS.get(t, t): v for t, v in value.items()}
+        exif[tag] = value
+    return exif
+
+def read_exif(path: str) -> dict:
+    """EXIF data of an image file, from the header probe or PIL for the files it cannot read."""
+    with open(path, 'rb') as f:
+        exif = probe_exif(f)[1]
+    return pil_exif(path) if exif is None else exif
+
+def gps_decimal(exif: dict) -> Optional[tuple[float, float]]:
+    """`(latitude, longitude)` in decimal degrees, None without a usable position."""
+    gps = exif.get('GPSInfo') or {}
+    try:
+        position = []
+        for axis, negative in (('Latitude', 'S'), ('Longitude', 'W')):
+            degrees, minutes, seconds = (float(v) for v in gps[f'GPS{axis}'])
+            value = degrees + minutes / 60 + seconds / 3600
+            position.append(-value if str(gps.get(f'GPS{axis}Ref', '')).upper().startswith(negative) else value)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if any(v != v for v in position):  # NaN from a zero denominator
+        return None
+    return position[0], position[1]
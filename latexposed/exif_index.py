@@ -0,0 +1,161 @@
+"""
+EXIF index of the images kept by the logical filter, built in one pass and
+queried instead of opening every image again.
+
+Every image under FILTERED_ARCHIVES_DIR is one row:
+
+    images(path, paper, size, mtime_ns, gps, latitude, longitude, make, model,
+           datetime, datetime_original, software, exif)
+
+`path` is relative to the folder and its first component is the paper,
+`latitude` and `longitude` are decimal degrees (negative south and west),
+`exif` holds every tag read as JSON. Images are read with the header probe of
+`latexposed.exif` in worker processes. A re-run only reads the images whose
+size or mtime changed and drops the rows of deleted images.
+"""
+
+import json
+import os
+import sqlite3
+from multiprocessing import Pool
+from typing import Iterable, Optional
+
+from latexposed.exif import gps_decimal, read_exif
+from latexposed.logical_filter import FILTERED_ARCHIVES_DIR, IMAGE_EXTENSIONS
+
+
+EXIF_DB = 'data/exif.sqlite'
+COLUMNS = ['path', 'paper', 'size', 'mtime_ns', 'gps', 'latitude', 'longitude', 'make', 'model',
+           'datetime', 'datetime_original', 'software', 'exif']
+# The counts of the logical filter notebook's summary
+SUMMARY_SQL = '''
+    SELECT 'Total Images' AS "Metadata Type", COUNT(*) AS "Count" FROM images
+    UNION ALL SELECT 'With GPS Location (Lat/Lon)', COUNT(*) FROM images WHERE latitude IS NOT NULL
+    UNION ALL SELECT 'With Device Info', COUNT(*) FROM images WHERE make != '' OR model != ''
+    UNION ALL SELECT 'With Time Taken', COUNT(*) FROM images WHERE datetime_original != '' OR datetime != ''
+    UNION ALL SELECT 'With Software', COUNT(*) FROM images WHERE software != ''
+'''
+
+
+def _stringify(value):
+    """EXIF values as JSON, bytes and rationals included."""
+    if isinstance(value, dict):
+        return {str(k): _stringify(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stringify(v) for v in value]
+    return value if isinstance(value, (str, int, float)) and value == value else str(value)
+
+def image_row(root: str, path: str, size: int, mtime_ns: int) -> tuple:
+    """The row of one image, `path` relative to `root`."""
+    exif = read_exif(os.path.join(root, path))
+    position = gps_decimal(exif) or (None, None)
+    text = {field: str(exif.get(tag) or '').strip() for field, tag in (
+        ('make', 'Make'), ('model', 'Model'), ('datetime', 'DateTime'),
+        ('datetime_original', 'DateTimeOriginal'), ('software', 'Software'))}
+    return (path, path.split('/', 1)[0], size, mtime_ns, 'GPSInfo' in exif, *position,
+            text['make'], text['model'], text['datetime'], text['datetime_original'], text['software'],
+            json.dumps(_stringify(exif), ensure_ascii=False))
+
+def _image_row(args: tuple[str, str, int, int]) -> tuple:
+    return image_row(*args)
+
+
+class ExifIndex:
+    def __init__(self, path: str = EXIF_DB, fresh: bool = False):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path)
+        if fresh:
+            self.db.execute('DROP TABLE IF EXISTS images')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                paper TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                gps INTEGER NOT NULL,
+                latitude REAL,
+                longitude REAL,
+                make TEXT,
+                model TEXT,
+                datetime TEXT,
+                datetime_original TEXT,
+                software TEXT,
+                exif TEXT
+            )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS images_paper ON images (paper)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """`path -> (size, mtime_ns)` of the indexed images."""
+        return {path: (size, mtime_ns) for path, size, mtime_ns in self.query('SELECT path, size, mtime_ns FROM images')}
+
+    def add_all(self, rows: Iterable[tuple]):
+        self.db.executemany(f'INSERT OR REPLACE INTO images VALUES ({", ".join("?" * len(COLUMNS))})', rows)
+
+    def remove(self, paths: Iterable[str]):
+        self.db.executemany('DELETE FROM images WHERE path=?', ((path,) for path in paths))
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        return self.db.execute(sql, params).fetchall()
+
+    def summary(self) -> dict[str, int]:
+        return dict(self.query(SUMMARY_SQL))
+
+    def located(self) -> list[dict]:
+        """Images with a decoded position, by paper."""
+        fields = ['path', 'paper', 'latitude', 'longitude', 'make', 'model', 'datetime_original', 'software']
+        rows = self.query(f'SELECT {", ".join(fields)} FROM images WHERE latitude IS NOT NULL ORDER BY paper, path')
+        return [dict(zip(fields, row)) for row in rows]
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def find_images(root: str) -> dict[str, tuple[int, int]]:
+    """`path -> (size, mtime_ns)` of the images under `root`, paths relative to it with `/`."""
+    images = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                full_path = os.path.join(dirpath, filename)
+                stat = os.stat(full_path)
+                images[os.path.relpath(full_path, root).replace(os.sep, '/')] = (stat.st_size, stat.st_mtime_ns)
+    return images
+
+def index_images(root: str = FILTERED_ARCHIVES_DIR, path: str = EXIF_DB, workers: int = 1,
+                 exif_index: Optional[ExifIndex] = None, chunksize: int = 64) -> dict[str, int]:
+    """
+    Bring the index of the images under `root` up to date. Returns the number
+    of images read, unchanged and removed.
+    """
+    own_index = exif_index is None
+    exif_index = ExifIndex(path) if own_index else exif_index
+    try:
+        images = find_images(root)
+        indexed = exif_index.stats()
+        stale = [image for image in indexed if image not in images]
+        changed = [(root, image, *stat) for image, stat in images.items() if indexed.get(image) != stat]
+        exif_index.remove(stale)
+        if workers <= 1:
+            exif_index.add_all(map(_image_row, changed))
+        else:
+            with Pool(workers) as pool:
+                exif_index.add_all(pool.imap_unordered(_image_row, changed, chunksize))
+        exif_index.commit()
+    finally:
+        if own_index:
+            exif_index.close()
+    return {'read': len(changed), 'unchanged': len(images) - len(changed), 'removed': len(stale)}
@@ -0,0 +1,115 @@
+"""
+Findings table of the pattern matching, so a match can be traced back to its
+paper without scanning the comments again.
+
+Every match of the custom patterns and of secrets-patterns-db is one row:
+
+    findings(paper, source, pattern, match, start, end, confidence)
+
+`source` is 'pattern' or 'secrets', `start` and `end` are character offsets
+into the paper's merged comments in paper_comments.jsonl, `confidence` is the
+secrets-patterns-db confidence (NULL for the custom patterns). Indexes on
+pattern and paper make the analysis lookups queries.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Iterable, Optional
+
+
+FINDINGS_DB = 'data/findings.sqlite'
+
+
+class FindingsDB:
+    def __init__(self, path: str = FINDINGS_DB, fresh: bool = False):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path)
+        if fresh:
+            self.db.execute('DROP TABLE IF EXISTS findings')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS findings (
+                paper TEXT NOT NULL,
+                source TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                match TEXT NOT NULL,
+                start INTEGER,
+                end INTEGER,
+                confidence TEXT
+            )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS findings_pattern ON findings (pattern, match)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS findings_paper ON findings (paper)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM findings').fetchone()[0]
+
+    def add(self, findings: dict):
+        """Rows of one record of the mining stage's output, committed by `commit` or `close`."""
+        paper = findings['name']
+        if 'pattern_matches' in findings:
+            rows = [(paper, 'pattern', m['name'], m['match'], m['start'], m['end'], None) for m in findings['pattern_matches']]
+        else:
+            # Written before the offsets were recorded, only the first match of each pattern
+            rows = [(paper, 'pattern', key, match, None, None, None) for key, match in findings['patterns'].items()]
+        rows += [(paper, 'secrets', m['name'], m['match'], m['start'], m['end'], m['confidence']) for m in findings['secrets']]
+        self.db.executemany('INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def add_all(self, records: Iterable[dict]) -> int:
+        count = 0
+        for findings in records:
+            self.add(findings)
+            count += 1
+        self.commit()
+        return count
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        return self.db.execute(sql, params).fetchall()
+
+    def _where(self, pattern: str, match: Optional[str], source: Optional[str]) -> tuple[str, tuple]:
+        # Both sources have an `emails` pattern, for instance
+        where, params = 'pattern=?', (pattern,)
+        if match is not None:
+            where, params = where + ' AND match=?', params + (match,)
+        if source is not None:
+            where, params = where + ' AND source=?', params + (source,)
+        return where, params
+
+    def papers_with(self, pattern: str, match: Optional[str] = None, source: Optional[str] = None) -> list[str]:
+        """Papers with a match of `pattern`, or with this exact match."""
+        where, params = self._where(pattern, match, source)
+        return [paper for paper, in self.query(f'SELECT DISTINCT paper FROM findings WHERE {where} ORDER BY paper', params)]
+
+    def matches(self, pattern: str, source: Optional[str] = None) -> list[str]:
+        """Unique values of a pattern, what data/custom_patterns/{pattern}.txt holds."""
+        where, params = self._where(pattern, None, source)
+        return [match for match, in self.query(f'SELECT DISTINCT match FROM findings WHERE {where} ORDER BY match', params)]
+
+    def paper_findings(self, paper: str) -> list[dict]:
+        rows = self.query('SELECT source, pattern, match, start, end, confidence FROM findings WHERE paper=? ORDER BY start', (paper,))
+        return [dict(zip(('source', 'pattern', 'match', 'start', 'end', 'confidence'), row)) for row in rows]
+
+    def counts(self) -> dict[tuple[str, str], tuple[int, int, int]]:
+        """`(source, pattern) -> (matches, unique values, papers)`."""
+        rows = self.query('SELECT source, pattern, COUNT(*), COUNT(DISTINCT match), COUNT(DISTINCT paper) '
+                          'FROM findings GROUP BY source, pattern ORDER BY source, pattern')
+        return {(source, pattern): (matches, values, papers) for source, pattern, matches, values, papers in rows}
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def build_findings_db(findings_file: str, path: str = FINDINGS_DB) -> int:
+    """Rebuild the table from the mining stage's JSONL output. Returns the number of papers."""
+    with open(findings_file, 'r', encoding='utf-8') as f, FindingsDB(path, fresh=True) as findings_db:
+        return findings_db.add_all(json.loads(line) for line in f if line.strip())
@@ -0,0 +1,205 @@
+"""
+Include graph of one paper: which of its files the LaTeX sources reference,
+to tell the auxiliary files that reach the PDF from those that do not.
+
+Comments are removed with the comment tokenizer (so `\\%` is not a comment),
+then every reference is resolved the way LaTeX does: `\\input`, `\\include`,
+`\\subfile` and `\\import` with `.tex` added, `\\includegraphics` and
+`\\includepdf` without an extension against the graphics extensions and
+every `\\graphicspath`, `\\bibliography` and `\\addbibresource` to `.bib`,
+local packages and classes to `.sty` and `.cls`. Paths are tried relative to
+the paper's root and to the referencing file's folder, exactly first and
+then ignoring case. Files reached through an `\\input` are parsed as well,
+whatever their extension.
+"""
+
+import os
+import posixpath
+import re
+from typing import NamedTuple, Optional
+
+from latexposed.comments import tokenize_latex_comments
+
+
+GRAPHICS_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.eps', '.ps', '.mps', '.svg', '.gif', '.tif', '.tiff', '.jbig2', '.jb2')
+# Command -> (kind, extensions tried when the reference has none that exists)
+COMMANDS = {
+    'includegraphics': ('graphics', GRAPHICS_EXTENSIONS),
+    'includepdf': ('graphics', ('.pdf',)),
+    'includesvg': ('graphics', ('.svg', '.pdf')),
+    'epsfbox': ('graphics', ('.eps', '.ps')),
+    'input': ('source', ('.tex',)),
+    'include': ('source', ('.tex',)),
+    'subfile': ('source', ('.tex',)),
+    'subfileinclude': ('source', ('.tex',)),
+    'includestandalone': ('source', ('.tex',)),
+    'lstinputlisting': ('file', ()),
+    'verbatiminput': ('file', ()),
+    'bibliography': ('file', ('.bib',)),
+    'addbibresource': ('file', ('.bib',)),
+    'addglobalbib': ('file', ('.bib',)),
+    'bibliographystyle': ('file', ('.bst',)),
+    'usepackage': ('file', ('.sty',)),
+    'RequirePackage': ('file', ('.sty',)),
+    'documentclass': ('file', ('.cls',)),
+}
+# Commands whose argument is a comma-separated list
+LIST_COMMANDS = {'bibliography', 'usepackage', 'RequirePackage'}
+SOURCE_EXTENSIONS = ('.tex',)
+# Files never sniffed for a main LaTeX source
+ASSET_EXTENSIONS = GRAPHICS_EXTENSIONS + ('.bib', '.bbl', '.bst', '.sty', '.cls', '.zip', '.gz', '.tar')
+MAIN_SOURCE_RE = re.compile(rb'\\document(?:class|style)')
+SNIFF_BYTES = 4096
+
+_ARGUMENT = r'\{((?:[^{}]|\{[^{}]*\})*)\}'
+_OPTIONS = r'(?:\s*\[[^\]]*\])*'
+REFERENCE_RE = re.compile(r'\\(' + '|'.join(sorted(COMMANDS, key=len, reverse=True)) + r')(?![a-zA-Z])\*?' + _OPTIONS + r'\s*' + _ARGUMENT)
+INPUT_BARE_RE = re.compile(r'\\input(?![a-zA-Z])\s+([^\s{}\\%]+)')
+IMPORT_RE = re.compile(r'\\(sub)?(?:import|inputfrom|includefrom)\*?\s*\{([^{}]*)\}\s*\{([^{}]*)\}')
+EPSFIG_RE = re.compile(r'\\(?:epsfig|psfig)\s*\{[^{}]*?file\s*=\s*([^,}\s]+)')
+GRAPHICSPATH_RE = re.compile(r'\\graphicspath\s*' + _ARGUMENT)
+
+
+class Reference(NamedTuple):
+    kind: str  # 'graphics', 'source' or 'file'
+    target: str
+    extensions: tuple
+    relative_to_file: bool = False  # \subimport, resolved from the referencing file's folder only
+
+
+def strip_comments(latex_code: str) -> str:
+    """The source with every comment blanked out, offsets are kept."""
+    parts, pos = [], 0
+    for token in tokenize_latex_comments(latex_code):
+        parts.append(latex_code[pos:token.start])
+        parts.append(' ' * (token.end - token.start))
+        pos = token.end
+    parts.append(latex_code[pos:])
+    return ''.join(parts)
+
+def _clean(target: str) -> str:
+    return target.strip().strip('"').replace('\\', '/')
+
+def parse_references(latex_code: str) -> tuple[list[Reference], list[str]]:
+    """The references of one LaTeX source, and the folders of its `\\graphicspath`."""
+    code = strip_comments(latex_code)
+    references = []
+    for m in REFERENCE_RE.finditer(code):
+        command, argument = m.group(1), m.group(2)
+        kind, extensions = COMMANDS[command]
+        for target in argument.split(',') if command in LIST_COMMANDS else [argument]:
+            if _clean(target):
+                references.append(Reference(kind, _clean(target), extensions))
+    for m in INPUT_BARE_RE.finditer(code):
+        references.append(Reference('source', _clean(m.group(1)), ('.tex',)))
+    for m in IMPORT_RE.finditer(code):
+        folder, target = _clean(m.group(2)), _clean(m.group(3))
+        references.append(Reference('source', posixpath.join(folder, target), ('.tex',), relative_to_file=bool(m.group(1))))
+    for m in EPSFIG_RE.finditer(code):
+        references.append(Reference('graphics', _clean(m.group(1)), ('.eps', '.ps')))
+    graphics_paths = []
+    for m in GRAPHICSPATH_RE.finditer(code):
+        graphics_paths += [_clean(folder) for folder in re.findall(r'\{([^{}]*)\}', m.group(1))]
+    return references, graphics_paths
+
+
+class IncludeGraph:
+    def __init__(self, files: list[str]):
+        self.files = set(files)  # Every file of the paper, relative posix paths
+        self.lower = {}
+        for path in sorted(self.files):
+            self.lower.setdefault(path.lower(), path)
+        self.sources = set()  # Files parsed as LaTeX
+        self.edges = {}  # source -> files it references
+        self.graphics = set()  # Files referenced as a figure or an included PDF
+        self.unresolved = {}  # source -> references that match no file, such as installed packages
+
+    def resolve(self, reference: Reference, source: str, graphics_paths: list[str]) -> Optional[str]:
+        folder = posixpath.dirname(source)
+        bases = [folder] if reference.relative_to_file else ['', folder]
+        if reference.kind == 'graphics':
+            bases += [posixpath.join(base, path) for path in graphics_paths for base in ('', folder)]
+        if reference.kind == 'source':
+            # LaTeX tries `name.tex` before `name`
+            names = [reference.target + ext for ext in reference.extensions] + [reference.target]
+        else:
+            names = [reference.target] + [reference.target + ext for ext in reference.extensions]
+        candidates = [posixpath.normpath(posixpath.join(base, name)) for base in dict.fromkeys(bases) for name in names]
+        for candidate in candidates:
+            if candidate in self.files:
+                return candidate
+        for candidate in candidates:
+            if candidate.lower() in self.lower:
+                return self.lower[candidate.lower()]
+        return None
+
+    def referenced(self) -> set[str]:
+        return set().union(*self.edges.values())
+
+    def referenced_assets(self) -> set[str]:
+        """Referenced files that are not LaTeX sources, the figures and listings of the PDF."""
+        return self.referenced() - self.sources
+
+    def referenced_graphics(self) -> set[str]:
+        """Referenced figures and included PDFs, the files whose content is rendered in the PDF."""
+        return self.graphics - self.sources
+
+    def unreferenced(self) -> set[str]:
+        """Auxiliary files no source references."""
+        return self.files - self.referenced() - self.sources
+
+
+def _is_source(root: str, path: str) -> bool:
+    """A .tex file, or a main file with another extension or none, like single-file arXiv papers."""
+    name = path.lower()
+    if name.endswith(SOURCE_EXTENSIONS):
+        return True
+    if name.endswith(ASSET_EXTENSIONS):
+        return False
+    with open(os.path.join(root, path), 'rb') as f:
+        return MAIN_SOURCE_RE.search(f.read(SNIFF_BYTES)) is not None
+
+def build_include_graph(root: str) -> IncludeGraph:
+    """Parse the LaTeX sources of a paper's extracted folder and resolve their references."""
+    files = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            files.append(os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/'))
+    graph = IncludeGraph(files)
+
+    parsed = {}  # source -> references
+    graphics_paths = []  # \graphicspath applies to the whole document
+    pending = [path for path in sorted(graph.files) if _is_source(root, path)]
+    while pending:
+        source = pending.pop()
+        if source in parsed:
+            continue
+        with open(os.path.join(root, source), 'r', encoding='utf-8', errors='ignore') as f:
+            parsed[source], source_graphics_paths = parse_references(f.read())
+        graphics_paths += source_graphics_paths
+        for reference in parsed[source]:
+            if reference.kind == 'source':
+                target = graph.resolve(reference, source, [])
+                if target is not None and target not in parsed:
+                    pending.append(target)
+    graph.sources = set(parsed)
+
+    # Graphics are resolved once every \graphicspath is known
+    for source, references in parsed.items():
+        edges, unresolved = set(), set()
+        for reference in references:
+            target = graph.resolve(reference, source, graphics_paths)
+            if target is None:
+                unresolved.add(reference.target)
+            elif target != source:
+                edges.add(target)
+                if reference.kind == 'graphics':
+                    graph.graphics.add(target)
+        if any(reference.extensions == ('.cls',) for reference in references):
+            # The bibliography generated for a main file is part of the PDF
+            bbl = posixpath.splitext(source)[0] + '.bbl'
+            if bbl in graph.files:
+                edges.add(bbl)
+        graph.edges[source] = edges
+        graph.unresolved[source] = unresolved
+    return graph
@@ -0,0 +1,188 @@
+"""
+Per-paper checkpoint ledger, so an interrupted run resumes where it stopped.
+
+The ledger is an append-only text file with one finished key per line. When a
+stage appends to a JSONL output, the output size after the record is stored
+next to the key, which lets a resumed run truncate a half-written last line.
+"""
+
+import heapq
+import json
+import operator
+import os
+import tempfile
+from typing import Optional
+
+
+CHECKPOINT_DIR = 'data/checkpoints'
+# Results sorted in memory at once by ResultLog.sorted_records
+SORT_RUN_SIZE = 50_000
+
+
+class CheckpointLedger:
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self.last_offset = None
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Torn write, the item was not finished
+                    key, _, offset = line.rstrip('\n').partition('\t')
+                    self.done.add(key)
+                    if offset:
+                        self.last_offset = int(offset)
+        else:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file_writer = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def mark(self, key: str, offset: Optional[int] = None):
+        self.file_writer.write(key if offset is None else f'{key}\t{offset}')
+        self.file_writer.write('\n')
+        self.file_writer.flush()
+        self.done.add(key)
+        if offset is not None:
+            self.last_offset = offset
+
+    def close(self):
+        self.file_writer.close()
+
+
+def stage_ledger(stage: str, checkpoint_dir: str = CHECKPOINT_DIR, fresh: bool = False) -> CheckpointLedger:
+    path = os.path.join(checkpoint_dir, f'{stage}.ledger')
+    if fresh and os.path.exists(path):
+        os.remove(path)
+    return CheckpointLedger(path)
+
+
+class ResumableJsonlWriter:
+    """Append records to a JSONL file and mark each one in the ledger once it is on disk."""
+
+    def __init__(self, path: str, ledger: CheckpointLedger):
+        self.ledger = ledger
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if len(ledger) == 0:
+            self.file_writer = open(path, 'w', encoding='utf-8')
+        else:
+            self.file_writer = open(path, 'a', encoding='utf-8')
+            # Drop anything written after the last checkpointed record
+            self.file_writer.truncate(ledger.last_offset or 0)
+            self.file_writer.seek(ledger.last_offset or 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, key: str, record: dict):
+        self.file_writer.write(json.dumps(record) + '\n')
+        self.file_writer.flush()
+        self.ledger.mark(key, self.file_writer.tell())
+
+    def close(self):
+        self.file_writer.close()
+
+
+_run_key = operator.itemgetter(0)
+
+def _spill_run(run: list, path: str) -> str:
+    """Write a run of `(key, line)` sorted by key, for ResultLog.sorted_records."""
+    run.sort(key=_run_key)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(line for _, line in run)
+    return path
+
+
+class ResultLog:
+    """
+    Append-only JSONL log of results that doubles as its own checkpoint: the
+    `key_field` of every complete line is done. A torn last line left by a
+    crash is cut off when the log is reopened with `resume`.
+    """
+
+    def __init__(self, path: str, key_field: str = 'key', resume: bool = True):
+        self.path = path
+        self.key_field = key_field
+        self.done = set()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        valid_size = 0
+        if resume and os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Torn write, the result is redone
+                    self.done.add(json.loads(line)[key_field])
+                    valid_size += len(line)
+        self.file_writer = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self.file_writer.truncate(valid_size)
+
+    def __contains__(self, key) -> bool:
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record: dict):
+        self.file_writer.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file_writer.flush()
+        self.done.add(record[self.key_field])
+
+    def records(self):
+        """Read the results back, in the order they were written."""
+        for line in self._lines():
+            yield json.loads(line)
+
+    def sorted_records(self, run_size: int = SORT_RUN_SIZE):
+        """
+        Read the results back ordered by their key, with at most `run_size`
+        of them in memory: sorted runs are spilled to temporary files and merged.
+        """
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(self.path) or '.') as tmp:
+            runs, run = [], []
+            for line in self._lines():
+                run.append((json.loads(line)[self.key_field], line))
+                if len(run) >= run_size:
+                    runs.append(_spill_run(run, os.path.join(tmp, f'{len(runs)}.jsonl')))
+                    run = []
+            if not runs:
+                run.sort(key=_run_key)
+                for _, line in run:
+                    yield json.loads(line)
+                return
+            runs.append(_spill_run(run, os.path.join(tmp, f'{len(runs)}.jsonl')))
+            files = [open(path, 'r', encoding='utf-8') for path in runs]
+            try:
+                keyed = [((json.loads(line)[self.key_field], line) for line in f) for f in files]
+                for _, line in heapq.merge(*keyed, key=_run_key):
+                    yield json.loads(line)
+            finally:
+                for f in files:
+                    f.close()
+
+    def _lines(self):
+        self.file_writer.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            yield from f
+
+    def close(self):
+        self.file_writer.close()
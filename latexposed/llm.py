@@ -0,0 +1,330 @@
+"""LLM entity extraction helpers shared by the mine stage and the LLM-SecDB benchmark."""
+
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+LLM_PROVIDER    = "https://openrouter.ai/api/v1"
+MODEL_NAME      = "google/gemini-2.5-flash"
+SYSTEM_PROMPT_FILE = "resources/system-prompt.md"
+TEMPERATURE     = 0.2
+MAX_RETRIES     = 4
+SLEEP_BACKOFF   = 2.0
+# USD per 1M tokens for MODEL_NAME, only used for the cost estimate of a run
+PRICE_INPUT        = 0.30
+PRICE_CACHED_INPUT = 0.075
+PRICE_OUTPUT       = 2.50
+
+ALLOWED_LABELS = {
+    "credentials",
+    "network_identifiers",
+    "pii",
+    "conflict",
+    "peerreview",
+    "none",
+}
+
+XML_RE = re.compile(r"<xml>.*?</xml>", re.IGNORECASE | re.DOTALL)
+ANSWER_RE = re.compile(r"<answer\s+id=[\"']?(\d+)[\"']?\s*>(.*?)</answer>", re.IGNORECASE | re.DOTALL)
+
+# Appended to the system prompt when several comments share one request, overriding its output rule.
+# It does not depend on the batch, so the system message stays a cacheable prefix.
+BATCH_INSTRUCTIONS = """
+## Batch mode
+You receive several comments instead of one, each between `--- item N ---` and `--- end N ---` lines.
+Classify every comment on its own with the rules above; the comments are unrelated to each other.
+Return exactly one line per item, in order, and nothing else:
+<answer id="1"><xml>labels</xml></answer>
+<answer id="2"><xml>labels</xml></answer>
+...
+"""
+
+
+def load_system_prompt(path: str = SYSTEM_PROMPT_FILE) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def build_prompt(comment_text: str, system_prompt: str) -> str:
+    return f"{system_prompt}\n---\n{comment_text}\n---"
+
+def build_messages(comment_text: str, system_prompt: str) -> List[Dict[str, str]]:
+    # The instructions are sent unchanged as the system message, so providers can cache them as a prefix
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"---\n{comment_text}\n---"},
+    ]
+
+def build_batch_messages(comments: List[str], system_prompt: str) -> List[Dict[str, str]]:
+    """One request for several comments, answered by `parse_batch_answers`."""
+    items = "\n".join(f"--- item {n} ---\n{comment}\n--- end {n} ---" for n, comment in enumerate(comments, 1))
+    return [
+        {"role": "system", "content": system_prompt + BATCH_INSTRUCTIONS},
+        {"role": "user", "content": items},
+    ]
+
+def parse_batch_answers(text: Optional[str], count: int) -> List[Optional[str]]:
+    """
+    `<xml>` answer of every item of a batched prompt, in item order. Items
+    that are missing, answered twice with different labels, or not valid
+    XML come back as None, so the caller can ask for them one by one.
+    """
+    answers: Dict[int, Optional[str]] = {}
+    for m in ANSWER_RE.finditer(text or ""):
+        n = int(m.group(1))
+        xml = sanitize_xml(extract_xml_answer(m.group(2)))
+        if n in answers and answers[n] != xml:
+            xml = None
+        answers[n] = xml
+    return [answers.get(n) for n in range(1, count + 1)]
+
+def extract_xml_answer(text: str) -> Optional[str]:
+    if not text:
+        return None
+    m = XML_RE.search(text)
+    return m.group(0).strip() if m else None
+
+def sanitize_xml(xml_text: Optional[str]) -> Optional[str]:
+    if not xml_text:
+        return None
+    xml_text = xml_text.strip()
+    if xml_text.lower().startswith("<xml>") and xml_text.lower().endswith("</xml>"):
+        return xml_text
+    # salvage if wrapper missing
+    inner = re.sub(r"^`+|`+$", "", xml_text).strip()
+    inner = re.sub(r"[^a-zA-Z0-9_,\-\s]", "", inner).strip()
+    if inner:
+        return f"<xml>{inner}</xml>"
+    return None
+
+def _normalize_labels(parts: List[str], stop_at_none: bool) -> List[str]:
+    labels = []
+    for p in parts:
+        p = p.replace("network_identifiers:", "network_identifiers")
+        p = re.sub(r"[^a-z_]", "", p)
+        if not p:
+            continue
+        if p == "none" and stop_at_none:
+            return []
+        if p in ALLOWED_LABELS and p != "none":
+            labels.append(p)
+    # de-dup, preserve order
+    seen, out = set(), []
+    for l in labels:
+        if l not in seen:
+            seen.add(l)
+            out.append(l)
+    return out
+
+def parse_labels_from_xml(xml_text: str) -> List[str]:
+    # from <xml>a,b</xml> -> ["a", "b"] (normalized)
+    content = xml_text.strip()[5:-6].strip()
+    if not content:
+        return []
+    return _normalize_labels([p.strip().lower() for p in content.split(",")], stop_at_none=True)
+
+def parse_ground_truth_labels(rec: Dict[str, Any]) -> List[str]:
+    raw = rec.get("classification", "")
+    if not isinstance(raw, str) or not raw.strip():
+        return []
+    return _normalize_labels([p.strip().lower() for p in raw.split(",")], stop_at_none=False)
+
+JSON_CHUNK_CHARS = 1 << 20
+
+def iter_json_array(path: str) -> Iterator[Any]:
+    # The elements of a top-level JSON array one by one, only the current element is held in memory
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof, chunk = "", 0, False, JSON_CHUNK_CHARS
+        while True:
+            # Skip whitespace and the separators ("[" before the first element, "," between elements)
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n[,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = f.read(chunk), 0
+                eof = not buf
+            if pos >= len(buf) or buf[pos] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element continues past the buffer, read more (twice as much each time for huge elements)
+                more = f.read(chunk)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                chunk *= 2
+                continue
+            if end == len(buf) and not eof:
+                # A number may continue in the next chunk
+                more = f.read(chunk)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield element
+            pos, chunk = end, JSON_CHUNK_CHARS
+
+def iter_input_any(path: str) -> Iterator[Dict[str, Any]]:
+    # Same formats as read_input_any, JSON arrays and NDJSON are streamed instead of loaded at once
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+    if first == "[":
+        yield from iter_json_array(path)
+        return
+    found = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            found = True
+            yield record
+    if not found:  # e.g. a single pretty-printed JSON object
+        yield from read_input_any(path)
+
+def read_input_any(path: str) -> List[Dict[str, Any]]:
+    # supports JSON array, single JSON object, or NDJSON
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+        if not text:
+            return []
+        try:
+            data = json.loads(text)
+            if isinstance(data, list):
+                return data
+            if isinstance(data, dict):
+                return [data]
+        except json.JSONDecodeError:
+            pass
+    # NDJSON fallback
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+                out.append(obj)
+            except json.JSONDecodeError:
+                continue
+    return out
+
+
+class TokenUsage:
+    """Token counts from the `usage` field of the responses, shared by the worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, usage) -> None:
+        if usage is None:
+            return
+        # OpenAI and OpenRouter report prompt_tokens_details.cached_tokens, DeepSeek prompt_cache_hit_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or getattr(usage, "prompt_cache_hit_tokens", None) or 0
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.cached_tokens += cached
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def cost(self, price_input: float = PRICE_INPUT, price_cached: float = PRICE_CACHED_INPUT,
+             price_output: float = PRICE_OUTPUT) -> float:
+        """USD, from prices per 1M tokens."""
+        uncached = self.prompt_tokens - self.cached_tokens
+        return (uncached * price_input + self.cached_tokens * price_cached + self.completion_tokens * price_output) / 1e6
+
+    def stats(self, items: Optional[int] = None, prices: Optional[Tuple[float, float, float]] = None) -> Dict[str, Any]:
+        """Totals and the prompt cache hit rate; with `items` and `prices` also the cost per 1k items."""
+        out = {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_rate": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+        }
+        if prices is not None and None not in prices:
+            out["cost_usd"] = round(self.cost(*prices), 4)
+            if items:
+                out["usd_per_1k"] = round(1000 * out["cost_usd"] / items, 4)
+        return out
+
+
+# Thread-local OpenAI client (safe for multithreading with the SDK)
+_tls = threading.local()
+def get_client(base_url: str = LLM_PROVIDER, api_key: Optional[str] = None):
+    from openai import OpenAI
+    cli = getattr(_tls, "client", None)
+    if cli is None:
+        cli = OpenAI(base_url=base_url, api_key=api_key)
+        _tls.client = cli
+    return cli
+
+def ask_llm(
+    comment_text: str,
+    system_prompt: str,
+    model: str = MODEL_NAME,
+    base_url: str = LLM_PROVIDER,
+    api_key: Optional[str] = None,
+    temperature: float = TEMPERATURE,
+    max_retries: int = MAX_RETRIES,
+    backoff: float = SLEEP_BACKOFF,
+    cache=None,
+    comment_sha256: Optional[str] = None,
+    usage: Optional[TokenUsage] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    from openai import APIError, RateLimitError, InternalServerError, BadRequestError
+    if cache is not None:
+        cache_key = cache.key(model, temperature, system_prompt, comment_text, comment_sha256)
+        xml = cache.get(cache_key)
+        if xml is not None:
+            return xml, None
+    messages = build_messages(comment_text, system_prompt)
+    for attempt in range(1, max_retries + 1):
+        try:
+            resp = get_client(base_url, api_key).chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+            )
+            if usage is not None:
+                usage.add(resp.usage)
+            content = resp.choices[0].message.content if resp.choices else ""
+            xml = extract_xml_answer(content)
+            xml = sanitize_xml(xml) or sanitize_xml(content)
+            if not xml:
+                return None, "No valid <xml>...</xml> returned."
+            if cache is not None:
+                cache.put(cache_key, xml)
+            return xml, None
+        except (RateLimitError, InternalServerError) as e:
+            if attempt == max_retries:
+                return None, f"{type(e).__name__}: {e}"
+            time.sleep(backoff); backoff *= 1.7
+        except (APIError, BadRequestError) as e:
+            return None, f"{type(e).__name__}: {e}"
+        except Exception as e:
+            if attempt == max_retries:
+                return None, f"UnexpectedError: {e}"
+            time.sleep(backoff); backoff *= 1.7
+    return None, "Max retries exceeded"
@@ -0,0 +1,356 @@
+"""
+Asyncio engine for the LLM entity extraction.
+
+Requests are issued from a single event loop under an adaptive concurrency
+limit instead of a fixed pool of threads. The limit grows by about one
+request per round trip while responses are fast and successful, and is
+halved on a 429 (AIMD, at most once per round trip so a burst of 429s from
+the same window counts once). Latency well above the fastest observed
+request of the same shape (number of comments, prompt size within a factor
+of two) also shrinks it, which catches provider-side queueing before the
+429s start. A Retry-After header pauses every request, not only the one
+that got it, so the retries do not arrive as a thundering herd.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import json
+import random
+import time
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from latexposed.llm import (
+    LLM_PROVIDER, MAX_RETRIES, MODEL_NAME, SLEEP_BACKOFF, TEMPERATURE,
+    BATCH_INSTRUCTIONS, TokenUsage, build_batch_messages, build_messages, extract_xml_answer, parse_batch_answers,
+    sanitize_xml,
+)
+
+
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 128
+# A request slower than this multiple of the fastest one counts as congestion
+LATENCY_TOLERANCE = 3.0
+# Longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 120.0
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = INITIAL_CONCURRENCY,
+        minimum: int = MIN_CONCURRENCY,
+        maximum: int = MAX_CONCURRENCY,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        usage: Optional[TokenUsage] = None,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.min_latency = {}  # Request shape -> fastest latency seen, a batch is only compared to batches
+        self.last_decrease = 0.0
+        self.paused_until = 0.0
+        self.condition = asyncio.Condition()
+        # Statistics
+        self.started = time.monotonic()
+        self.completed = 0
+        self.rate_limited = 0
+        self.usage = usage or TokenUsage()
+        self.fallbacks = 0  # Items of a batched request asked again on their own
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            # Spread the resumed requests a little instead of firing them at once
+            await asyncio.sleep(delay + random.uniform(0, min(delay, 1.0)))
+
+    def _decrease(self, factor: float, window: float):
+        now = time.monotonic()
+        if now - self.last_decrease > window:
+            self.limit = max(self.minimum, self.limit * factor)
+            self.last_decrease = now
+
+    async def release(self, latency: Optional[float] = None, rate_limited: bool = False, usage=None, shape: tuple = ()):
+        async with self.condition:
+            self.in_flight -= 1
+            min_latency = self.min_latency.get(shape)
+            window = latency or min_latency or 1.0
+            if rate_limited:
+                self.rate_limited += 1
+                self._decrease(0.5, window)
+            elif latency is not None:
+                self.completed += 1
+                self.usage.add(usage)
+                min_latency = self.min_latency[shape] = latency if min_latency is None else min(min_latency, latency)
+                if latency > self.latency_tolerance * min_latency:
+                    self._decrease(0.9, window)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rate_limited": self.rate_limited,
+            "fallbacks": self.fallbacks,
+            "tok/s": round(self.usage.total_tokens / elapsed),
+        }
+
+
+def request_shape(messages: list[dict], items: int = 1) -> tuple[int, int]:
+    """Requests whose latencies are comparable: the same number of comments, prompt sizes within a factor of two."""
+    return items, sum(len(message["content"]) for message in messages).bit_length()
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Delay requested by the provider, from `retry-after-ms` or `retry-after`
+    (seconds or HTTP date), at most MAX_RETRY_AFTER. None if neither parses.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    delay = None
+    if headers.get("retry-after-ms"):
+        try:
+            delay = float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if delay is None and value:
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(value)
+                if date.tzinfo is None:
+                    date = date.replace(tzinfo=datetime.timezone.utc)  # HTTP dates are GMT
+                delay = date.timestamp() - time.time()
+            except (TypeError, ValueError, IndexError):
+                pass
+    # A malformed header falls back to the jittered backoff, an absurd one is capped
+    if delay is None or delay != delay:
+        return None
+    return min(max(0.0, delay), MAX_RETRY_AFTER)
+
+
+async def _complete(
+    client,
+    limiter: AdaptiveLimiter,
+    messages: list[dict],
+    model: str,
+    temperature: float,
+    max_retries: int,
+    backoff: float,
+    items: int = 1,
+) -> Tuple[Optional[str], Optional[str]]:
+    """One chat completion under the limiter for `items` comments, returns `(content, error)`."""
+    from openai import APIError, RateLimitError, InternalServerError, BadRequestError
+    shape = request_shape(messages, items)
+    for attempt in range(1, max_retries + 1):
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            resp = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+            )
+        except RateLimitError as e:
+            await limiter.release(time.monotonic() - start, rate_limited=True, shape=shape)
+            if attempt == max_retries:
+                return None, f"{type(e).__name__}: {e}"
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = random.uniform(0, backoff)  # Full jitter
+            else:
+                limiter.pause(delay)
+            await asyncio.sleep(delay); backoff *= 1.7
+            continue
+        except InternalServerError as e:
+            await limiter.release()
+            if attempt == max_retries:
+                return None, f"{type(e).__name__}: {e}"
+            await asyncio.sleep(random.uniform(0, backoff)); backoff *= 1.7
+            continue
+        except (APIError, BadRequestError) as e:
+            await limiter.release()
+            return None, f"{type(e).__name__}: {e}"
+        except Exception as e:
+            await limiter.release()
+            if attempt == max_retries:
+                return None, f"UnexpectedError: {e}"
+            await asyncio.sleep(random.uniform(0, backoff)); backoff *= 1.7
+            continue
+
+        await limiter.release(time.monotonic() - start, usage=getattr(resp, "usage", None), shape=shape)
+        return (resp.choices[0].message.content if resp.choices else ""), None
+    return None, "Max retries exceeded"
+
+
+async def ask_llm_async(
+    client,
+    limiter: AdaptiveLimiter,
+    comment_text: str,
+    system_prompt: str,
+    model: str = MODEL_NAME,
+    temperature: float = TEMPERATURE,
+    max_retries: int = MAX_RETRIES,
+    backoff: float = SLEEP_BACKOFF,
+    cache=None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """Async counterpart of `llm.ask_llm`, returns `(xml, error)`."""
+    if cache is not None:
+        # Cache hits do not take a slot from the limiter
+        cache_key = cache.key(model, temperature, system_prompt, comment_text)
+        xml = cache.get(cache_key)
+        if xml is not None:
+            return xml, None
+    content, err = await _complete(client, limiter, build_messages(comment_text, system_prompt), model, temperature, max_retries, backoff)
+    if err:
+        return None, err
+    xml = extract_xml_answer(content)
+    xml = sanitize_xml(xml) or sanitize_xml(content)
+    if not xml:
+        return None, "No valid <xml>...</xml> returned."
+    if cache is not None:
+        cache.put(cache_key, xml)
+    return xml, None
+
+
+async def ask_llm_batch_async(
+    client,
+    limiter: AdaptiveLimiter,
+    comments: list[str],
+    system_prompt: str,
+    model: str = MODEL_NAME,
+    temperature: float = TEMPERATURE,
+    max_retries: int = MAX_RETRIES,
+    backoff: float = SLEEP_BACKOFF,
+    cache=None,
+) -> list[Tuple[Optional[str], Optional[str]]]:
+    """
+    Classify several comments with one request, returns `(xml, error)` per
+    comment. Items the answer does not cover cleanly are asked again one by
+    one, so a confused batch costs extra requests but never a wrong match.
+    """
+    results: list[Optional[Tuple[Optional[str], Optional[str]]]] = [None] * len(comments)
+    # Batched answers are cached apart from single ones, the model saw a different prompt
+    batch_prompt_id = system_prompt + BATCH_INSTRUCTIONS
+    keys = [cache.key(model, temperature, batch_prompt_id, comment) for comment in comments] if cache is not None else None
+    todo = []
+    for n in range(len(comments)):
+        xml = None
+        if cache is not None:
+            # An item that once fell back has its answer under the single-comment prompt
+            xml = cache.get(keys[n]) or cache.get(cache.key(model, temperature, system_prompt, comments[n]))
+        if xml is not None:
+            results[n] = (xml, None)
+        else:
+            todo.append(n)
+
+    if len(todo) > 1:
+        messages = build_batch_messages([comments[n] for n in todo], system_prompt)
+        content, err = await _complete(client, limiter, messages, model, temperature, max_retries, backoff, items=len(todo))
+        for n, xml in zip(todo, parse_batch_answers(content, len(todo))):
+            if xml:
+                results[n] = (xml, None)
+                if cache is not None:
+                    cache.put(keys[n], xml)
+        todo = [n for n in todo if results[n] is None]
+        limiter.fallbacks += len(todo)
+
+    singles = await asyncio.gather(*(
+        ask_llm_async(client, limiter, comments[n], system_prompt, model, temperature, max_retries, backoff, cache)
+        for n in todo
+    ))
+    for n, result in zip(todo, singles):
+        results[n] = result
+    return results
+
+
+async def classify_comments_async(
+    items: Iterable[Tuple[Any, str]],
+    system_prompt: str,
+    model: str = MODEL_NAME,
+    base_url: str = LLM_PROVIDER,
+    api_key: Optional[str] = None,
+    temperature: float = TEMPERATURE,
+    max_retries: int = MAX_RETRIES,
+    backoff: float = SLEEP_BACKOFF,
+    limiter: Optional[AdaptiveLimiter] = None,
+    cache=None,
+    output_path: Optional[str] = None,
+    on_result: Optional[Callable[[Any, Optional[str], Optional[str]], None]] = None,
+    batch_size: int = 1,
+) -> dict[Any, Tuple[Optional[str], Optional[str]]]:
+    """
+    Classify `(key, comment)` items and return `{key: (xml, error)}`.
+    Every result is appended to `output_path` as a JSON line and passed to
+    `on_result` as soon as it completes, in completion order. With an
+    `on_result` callback the results are not collected, and `items` is
+    consumed lazily, so memory stays flat on large corpora. With
+    `batch_size` above 1, that many comments share each request.
+    """
+    from openai import AsyncOpenAI
+    limiter = limiter or AdaptiveLimiter()
+    # Retries are handled here, with the limiter in the loop
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+    pending = iter(items)
+
+    def batches():
+        batch = []
+        for item in pending:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    results = {}
+    out_file = open(output_path, "a", encoding="utf-8") if output_path else None
+
+    def finish(key, xml, err):
+        if on_result is None:
+            results[key] = (xml, err)
+        if out_file:
+            out_file.write(json.dumps({"key": key, "xml": xml, "error": err}, ensure_ascii=False) + "\n")
+            out_file.flush()
+        if on_result:
+            on_result(key, xml, err)
+
+    async def worker(work):
+        # Workers only wait on the limiter, the limit decides how many requests are in flight
+        for batch in work:
+            if len(batch) == 1:
+                key, comment = batch[0]
+                finish(key, *await ask_llm_async(client, limiter, comment, system_prompt, model, temperature, max_retries, backoff, cache))
+                continue
+            answers = await ask_llm_batch_async(
+                client, limiter, [comment for _, comment in batch], system_prompt, model, temperature, max_retries, backoff, cache)
+            for (key, _), (xml, err) in zip(batch, answers):
+                finish(key, xml, err)
+
+    work = batches()
+    try:
+        await asyncio.gather(*(worker(work) for _ in range(limiter.maximum)))
+    finally:
+        if out_file:
+            out_file.close()
+        await client.close()
+    return results
+
+def classify_comments(items: Iterable[Tuple[Any, str]], system_prompt: str, **kwargs) -> dict[Any, Tuple[Optional[str], Optional[str]]]:
+    """Blocking wrapper, in a notebook `await classify_comments_async(...)` instead."""
+    return asyncio.run(classify_comments_async(items, system_prompt, **kwargs))
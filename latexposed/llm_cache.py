@@ -0,0 +1,186 @@
+"""
+Persistent cache of LLM answers, so re-running a benchmark or a crashed
+extraction does not pay for the same request twice.
+
+Answers are keyed by (model, temperature, prompt hash, comment sha256). The
+comment hash is the `sha_256` field of LLM-SecDB.json, so a record's cache
+entry is found for every model and prompt it was classified with. Only
+successful answers are stored, errors are retried on the next run.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+LLM_CACHE_DB = 'data/llm_cache.sqlite'
+# Share of max_bytes left after an eviction, so a full cache does not evict on every put
+EVICT_LOW_WATER = 0.9
+
+
+def sha256_hex(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed answer cache, bounded to `max_bytes` of answers by evicting the least recently used."""
+
+    def __init__(self, path: str = LLM_CACHE_DB, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Shared by the worker threads of the benchmark, guarded by the lock
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS answers (
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                prompt_sha256 TEXT NOT NULL,
+                comment_sha256 TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, temperature, prompt_sha256, comment_sha256)
+            )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)')
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._prompt_hashes = {}
+        self._bytes = None  # Running total for the size bound, guarded by the lock, recomputed by evict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+
+    def key(self, model: str, temperature: float, system_prompt: str, comment_text: str,
+            comment_sha256: Optional[str] = None) -> tuple:
+        # The system prompt is the same for every call, hash it once
+        if system_prompt not in self._prompt_hashes:
+            self._prompt_hashes[system_prompt] = sha256_hex(system_prompt)
+        return (model, float(temperature), self._prompt_hashes[system_prompt], comment_sha256 or sha256_hex(comment_text))
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute(
+                'SELECT answer FROM answers WHERE model=? AND temperature=? AND prompt_sha256=? AND comment_sha256=?', key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute(
+                'UPDATE answers SET last_used=? WHERE model=? AND temperature=? AND prompt_sha256=? AND comment_sha256=?',
+                (time.time(), *key))
+            return row[0]
+
+    def put(self, key: tuple, answer: str):
+        now = time.time()
+        size = len(answer.encode('utf-8'))
+        with self.lock:
+            if self.max_bytes is not None:
+                if self._bytes is None:
+                    self._bytes = self._total()
+                # A replaced answer no longer counts
+                replaced = self.db.execute(
+                    'SELECT size FROM answers WHERE model=? AND temperature=? AND prompt_sha256=? AND comment_sha256=?', key
+                ).fetchone()
+                self._bytes += size - (replaced[0] if replaced else 0)
+            self.db.execute('INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (*key, answer, size, now, now))
+            if self.max_bytes is not None and self._bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_LOW_WATER))
+
+    def _total(self) -> int:
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM answers').fetchone()[0]
+
+    def size(self) -> int:
+        with self.lock:
+            return self._total()
+
+    def _evict(self, max_bytes: int) -> int:
+        # Called with the lock held, `_bytes` is up to date
+        total = self._bytes
+        if total <= max_bytes:
+            return 0
+        dropped = []
+        # Walks the last_used index from the oldest answer and stops as soon as enough is dropped
+        for rowid, size in self.db.execute('SELECT rowid, size FROM answers ORDER BY last_used'):
+            if total <= max_bytes:
+                break
+            dropped.append((rowid,))
+            total -= size
+        self.db.execute('BEGIN')
+        self.db.executemany('DELETE FROM answers WHERE rowid=?', dropped)
+        self.db.execute('COMMIT')
+        self._bytes = total
+        return len(dropped)
+
+    def evict(self, max_bytes: int) -> int:
+        """Drop the least recently used answers until at most `max_bytes` remain. Returns the number dropped."""
+        with self.lock:
+            self._bytes = self._total()
+            return self._evict(max_bytes)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self.lock:
+            entries, size = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers').fetchone()
+            models = self.db.execute('SELECT model, COUNT(*) FROM answers GROUP BY model ORDER BY model').fetchall()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+            'models': dict(models),
+        }
+
+    def export_jsonl(self, path: str, model: Optional[str] = None) -> int:
+        """Write the answers as JSON lines, e.g. to share the results of a benchmark run."""
+        query = 'SELECT model, temperature, prompt_sha256, comment_sha256, answer, created FROM answers'
+        with self.lock:
+            rows = self.db.execute(query + ' WHERE model=?', (model,)).fetchall() if model else self.db.execute(query).fetchall()
+        with open(path, 'w', encoding='utf-8') as f:
+            for model_name, temperature, prompt_sha256, comment_sha256, answer, created in rows:
+                f.write(json.dumps({
+                    'model': model_name, 'temperature': temperature, 'prompt_sha256': prompt_sha256,
+                    'comment_sha256': comment_sha256, 'answer': answer, 'created': created,
+                }, ensure_ascii=False) + '\n')
+        return len(rows)
+
+    def import_jsonl(self, path: str) -> int:
+        """Merge an export into the cache, existing answers are kept. Returns the number of new answers."""
+        now = time.time()
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                rows.append((item['model'], float(item['temperature']), item['prompt_sha256'], item['comment_sha256'],
+                             item['answer'], len(item['answer'].encode('utf-8')), item.get('created', now), now))
+        with self.lock:
+            before = self.db.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+            self.db.execute('BEGIN')
+            self.db.executemany('INSERT OR IGNORE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.db.execute('COMMIT')
+            added = self.db.execute('SELECT COUNT(*) FROM answers').fetchone()[0] - before
+        if self.max_bytes is not None:
+            self.evict(int(self.max_bytes * EVICT_LOW_WATER))
+        return added
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,179 @@
+"""
+Local inference backends for scripts/local_llm.py.
+
+A backend answers one `(system prompt, user prompt)` chat with
+`(content, prompt_tokens, completion_tokens)`. `generate_ordered` keeps a
+fixed number of them in flight and yields the answers in input order, so
+the server can batch the requests while the output file stays in the order
+of paper_comments.jsonl.
+
+- `ollama`: the ollama server, which only runs requests side by side when
+  started with OLLAMA_NUM_PARALLEL >= the concurrency.
+- `openai`: any OpenAI-compatible endpoint, e.g. `llama-server --parallel N
+  --cont-batching` (llama.cpp) or `vllm serve`, both batch the in-flight
+  requests continuously.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterable, Optional, Tuple
+
+
+CONCURRENCY = 4
+# Answers buffered ahead of a slow request, per concurrent request
+WINDOW_PER_REQUEST = 4
+
+
+class OllamaBackend:
+    def __init__(self, model: str, host: Optional[str] = None, options: Optional[dict] = None):
+        import ollama
+        self.model = model
+        self.options = options
+        self.client = ollama.AsyncClient(host=host)
+
+    async def chat(self, system_prompt: str, prompt: str) -> Tuple[str, int, int]:
+        response = await self.client.chat(
+            model=self.model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            options=self.options,
+        )
+        return response["message"]["content"], response.get("prompt_eval_count") or 0, response.get("eval_count") or 0
+
+    async def close(self):
+        pass
+
+
+class OpenAIBackend:
+    def __init__(self, model: str, base_url: str, api_key: str = "local", temperature: Optional[float] = None):
+        from openai import AsyncOpenAI
+        self.model = model
+        self.temperature = temperature
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+
+    async def chat(self, system_prompt: str, prompt: str) -> Tuple[str, int, int]:
+        kwargs = {"temperature": self.temperature} if self.temperature is not None else {}
+        resp = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            **kwargs,
+        )
+        usage = resp.usage
+        content = resp.choices[0].message.content if resp.choices else ""
+        return content or "", getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+    async def close(self):
+        await self.client.close()
+
+
+BACKENDS = {"ollama": OllamaBackend, "openai": OpenAIBackend}
+
+def make_backend(name: str, model: str, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model, **kwargs)
+
+
+class GenerationStats:
+    """Throughput and queue depth of a `generate_ordered` run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.buffered = 0  # Answers waiting for an earlier, slower one
+        self._depth_sum = 0
+
+    def start(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self, prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+        self._depth_sum += self.in_flight
+        self.in_flight -= 1
+        self.requests += 1
+        self.errors += error
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "tok/s": round(self.completion_tokens / elapsed, 1),
+            "prompt tok/s": round(self.prompt_tokens / elapsed, 1),
+            "queue": self.in_flight,
+            "mean_queue": round(self._depth_sum / self.requests, 1) if self.requests else 0.0,
+            "max_queue": self.max_in_flight,
+            "buffered": self.buffered,
+        }
+
+
+async def generate_ordered(
+    backend,
+    items: Iterable[Tuple[Any, Optional[str]]],
+    system_prompt: str,
+    concurrency: int = CONCURRENCY,
+    stats: Optional[GenerationStats] = None,
+    window: Optional[int] = None,
+) -> AsyncIterator[Tuple[Any, Optional[str], Optional[str]]]:
+    """
+    Run `(payload, prompt)` items with `concurrency` requests in flight and
+    yield `(payload, response, error)` in input order. A None prompt is
+    passed through without a request, e.g. for papers without comments.
+    At most `window` answers are held back behind a slow request.
+    """
+    stats = stats or GenerationStats()
+    window = window or WINDOW_PER_REQUEST * concurrency
+    pending = enumerate(items)
+    results = {}  # index -> (payload, response, error)
+    next_out = 0
+    active = concurrency
+    condition = asyncio.Condition()
+
+    async def worker():
+        nonlocal active
+        try:
+            for i, (payload, prompt) in pending:
+                async with condition:
+                    await condition.wait_for(lambda: i < next_out + window)
+                response, error = None, None
+                if prompt is not None:
+                    stats.start()
+                    try:
+                        response, prompt_tokens, completion_tokens = await backend.chat(system_prompt, prompt)
+                        stats.finish(prompt_tokens, completion_tokens)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                        stats.finish(error=True)
+                async with condition:
+                    results[i] = (payload, response, error)
+                    stats.buffered = len(results)
+                    condition.notify_all()
+        finally:
+            async with condition:
+                active -= 1
+                condition.notify_all()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: next_out in results or not active)
+                if next_out not in results:
+                    break
+                result = results.pop(next_out)
+                next_out += 1
+                stats.buffered = len(results)
+                condition.notify_all()
+            yield result
+        for w in workers:
+            await w  # Surface a failure of the input iterator
+    finally:
+        for w in workers:
+            w.cancel()
+        await backend.close()
@@ -0,0 +1,323 @@
+"""
+Logical filtering stage: keep the files of the downloaded arXiv_src tars
+that may hold information, without extracting the archives to disk.
+
+The outer tar is read sequentially and every paper's .gz is decompressed as
+a stream. The paper's files (the members of its inner tar or zip, or its
+single .tex) are decided one by one on their name and header: images
+are only kept with GPS EXIF data, everything else is written to
+FILTERED_ARCHIVES_DIR/<paper>/, and the PDFs and other members of the outer
+tar are dropped. Images are decided on their EXIF header (`exif.probe_exif`)
+and only read further when kept, or through PIL when the probe cannot read
+them. At most one member is held at a time, in memory or spooled to a
+temporary file past SPOOL_BYTES; a zip is spooled whole since its index is at
+the end.
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterator, Optional
+
+from latexposed.exif import probe_exif
+from latexposed.ledger import ResultLog
+
+
+ARCHIVES_DIR = 'data/archives'
+FILTERED_ARCHIVES_DIR = 'data/filtered_archives'
+# One JSON record per filtered archive, also the checkpoint of the stage
+FILTER_RESULTS = 'data/logical_filter.jsonl'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Bytes read ahead to recognize a stream, one tar header
+HEAD_BYTES = tarfile.BLOCKSIZE
+SPOOL_BYTES = 16 * 1024 * 1024
+CHUNK_BYTES = 1024 * 1024
+
+log = logging.getLogger(__name__)
+
+
+class _HeadStream:
+    """A stream whose first bytes were already read to sniff it."""
+
+    def __init__(self, head: bytes, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b''
+        else:
+            data, self.head = self.head[:size], self.head[size:]
+        return data
+
+
+def read_head(stream, size: int = HEAD_BYTES) -> bytes:
+    head = b''
+    while len(head) < size:
+        data = stream.read(size - len(head))
+        if not data:
+            break
+        head += data
+    return head
+
+def sniff_archive(head: bytes) -> Optional[str]:
+    """'zip', 'tar' or None from the first HEAD_BYTES of a stream."""
+    if head.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+        return 'zip'
+    try:
+        tarfile.TarInfo.frombuf(head, tarfile.ENCODING, 'surrogateescape')
+        return 'tar'
+    except tarfile.HeaderError:
+        return None
+
+def has_gps_exif(image) -> bool:
+    """Check if an image, a path or a seekable file, has GPS/location EXIF data."""
+    from PIL import Image
+    try:
+        with Image.open(image) as img:
+            return 0x8825 in img.getexif()  # GPSInfo
+    except Exception:
+        return False
+
+
+def _safe_path(root: str, name: str) -> Optional[str]:
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return os.path.join(root, *parts)
+
+def _write(stream, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(stream, f, CHUNK_BYTES)
+
+def _filter_file(name: str, stream, path: Optional[str], stats: Counter):
+    if path is None:
+        log.warning(f'Skipped file outside the paper folder: {name}')
+        return
+    if not name.lower().endswith(IMAGE_EXTENSIONS):
+        _write(stream, path)
+        stats['files_kept'] += 1
+        return
+    head, exif = probe_exif(stream)
+    if exif is None:
+        # Odd file, e.g. another format under an image extension, PIL needs all of it
+        stats['images_pil'] += 1
+        with tempfile.SpooledTemporaryFile(SPOOL_BYTES) as image:
+            image.write(head)
+            shutil.copyfileobj(stream, image, CHUNK_BYTES)
+            image.seek(0)
+            gps = has_gps_exif(image)
+            image.seek(0)
+            if gps:
+                _write(image, path)
+    else:
+        gps = 'GPSInfo' in exif
+        if gps:
+            _write(_HeadStream(head, stream), path)
+    if gps:
+        log.info(f'GPS data found in image: {name}')
+        stats['images_kept'] += 1
+    else:
+        log.info(f'Deleted image without GPS: {name}')
+        stats['images_dropped'] += 1
+
+def _filter_tar(stream, root: str, stats: Counter):
+    with tarfile.open(fileobj=stream, mode='r|') as tar:
+        for member in tar:
+            if member.isfile():
+                _filter_file(member.name, tar.extractfile(member), _safe_path(root, member.name), stats)
+
+def _filter_zip(stream, root: str, stats: Counter):
+    with tempfile.SpooledTemporaryFile(SPOOL_BYTES) as spool:
+        shutil.copyfileobj(stream, spool, CHUNK_BYTES)
+        with zipfile.ZipFile(spool) as zf:
+            for member in zf.infolist():
+                if member.is_dir():
+                    continue
+                with zf.open(member) as f:
+                    # The files of a zip are written flat
+                    _filter_file(member.filename, f, _safe_path(root, os.path.basename(member.filename)), stats)
+
+def _publish(staging: str, dest: str) -> bool:
+    if not os.path.isdir(staging):
+        log.info(f'Skipped empty folder: {os.path.basename(dest)}')
+        return False
+    if os.path.exists(dest):
+        shutil.copytree(staging, dest, dirs_exist_ok=True)
+        shutil.rmtree(staging)
+    else:
+        os.replace(staging, dest)
+    log.info(f'Copied folder to output: {dest}')
+    return True
+
+
+def filter_paper(gz_stream, paper: str, dest_dir: str = FILTERED_ARCHIVES_DIR, stats: Optional[Counter] = None) -> Counter:
+    """
+    Write the kept files of one paper's .gz, read from `gz_stream`, to
+    `dest_dir/<paper>/`. The files are staged in a hidden folder next to it,
+    so a paper that fails halfway leaves nothing behind.
+    """
+    stats = Counter() if stats is None else stats
+    staging = os.path.join(dest_dir, f'.{paper}.partial')
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        with gzip.GzipFile(fileobj=gz_stream) as gz:
+            head = read_head(gz)
+            kind = sniff_archive(head)
+            stream = _HeadStream(head, gz)
+            if kind == 'zip':
+                log.info(f'{paper} contains a zip archive.')
+                _filter_zip(stream, staging, stats)
+            elif kind == 'tar':
+                log.info(f'{paper} contains a tar archive.')
+                _filter_tar(stream, staging, stats)
+            else:
+                name = paper if Path(paper).suffix else paper + '.tex'
+                _write(stream, os.path.join(staging, name))
+                stats['files_kept'] += 1
+                log.info(f'Extracted single file from {paper} as {name}')
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    stats['folders_copied'] += _publish(staging, os.path.join(dest_dir, paper))
+    return stats
+
+def process_tar_file(tar_path: str, dest_dir: str = FILTERED_ARCHIVES_DIR, failures: Optional[list] = None) -> Counter:
+    """
+    Filter every paper of one arXiv_src tar, read as a stream. Returns the
+    counts of kept and dropped files, the papers that failed are appended to
+    `failures`.
+    """
+    stats = Counter()
+    os.makedirs(dest_dir, exist_ok=True)
+    with tarfile.open(tar_path, 'r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = os.path.basename(member.name)
+            suffix = Path(name).suffix.lower()
+            if suffix == '.pdf':
+                log.info(f'Deleting PDF: {name}')
+                stats['pdfs_dropped'] += 1
+            elif suffix == '.gz':
+                stats['papers'] += 1
+                try:
+                    filter_paper(tar.extractfile(member), Path(name).stem, dest_dir, stats)
+                except Exception as e:
+                    log.error(f'Failed to process .gz file {name}: {e}')
+                    stats['errors'] += 1
+                    if failures is not None:
+                        failures.append({'paper': Path(name).stem, 'error': str(e)})
+    log.info(f'Finished processing {tar_path}')
+    return stats
+
+def filter_archive(tar_path: str, dest_dir: str = FILTERED_ARCHIVES_DIR, delete: bool = True) -> dict:
+    """Filter one tar and delete it afterwards. Returns the archive's record for the results log."""
+    start = time.perf_counter()
+    record = {'archive': os.path.basename(tar_path), 'status': 'done'}
+    failures = []
+    try:
+        record.update(process_tar_file(tar_path, dest_dir, failures))
+        if delete:
+            os.remove(tar_path)
+            log.info(f'Deleted tar file after processing: {record["archive"]}')
+    except Exception as e:
+        log.error(f'Error processing {record["archive"]}: {e}')
+        record.update(status='failed', error=str(e))
+    record['failed_papers'] = failures
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+# ---------------------------------------------------------------------------
+# Archive mode: every tar of a folder, one per worker process, resumable
+# ---------------------------------------------------------------------------
+
+_worker_dest_dir = FILTERED_ARCHIVES_DIR
+_worker_delete = True
+
+def _init_filter_worker(dest_dir: str, delete: bool, tmp_root: Optional[str]):
+    global _worker_dest_dir, _worker_delete
+    _worker_dest_dir, _worker_delete = dest_dir, delete
+    if tmp_root is not None:
+        # Spooled zips and images of this worker, e.g. on a tmpfs
+        tempfile.tempdir = os.path.join(tmp_root, f'worker-{os.getpid()}')
+        os.makedirs(tempfile.tempdir, exist_ok=True)
+
+def _filter_archive(tar_path: str) -> dict:
+    return filter_archive(tar_path, _worker_dest_dir, _worker_delete)
+
+def _clear_staging(dest_dir: str):
+    """Remove the staged papers of an interrupted run, they are filtered again."""
+    for name in os.listdir(dest_dir):
+        if name.startswith('.') and name.endswith('.partial'):
+            shutil.rmtree(os.path.join(dest_dir, name), ignore_errors=True)
+
+def iter_filtered_archives(
+    tar_dir: str = ARCHIVES_DIR,
+    dest_dir: str = FILTERED_ARCHIVES_DIR,
+    workers: int = 1,
+    results_path: str = FILTER_RESULTS,
+    tmp_root: Optional[str] = None,
+    delete: bool = True,
+) -> Iterator[dict]:
+    """
+    Filter every tar of `tar_dir` with `workers` processes and yield one
+    record per archive: the counts of `process_tar_file`, the failed papers,
+    the status and the seconds taken. Records are appended to `results_path`
+    as they finish, and the archives with a 'done' record are skipped, so an
+    interrupted run resumes by archive name. Papers of an archive that was
+    cut short are filtered again and overwrite their first copy.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    _clear_staging(dest_dir)
+    with ResultLog(results_path, key_field='archive') as results:
+        done = {record['archive'] for record in results.records() if record['status'] == 'done'}
+        tar_paths = [os.path.join(tar_dir, name) for name in sorted(os.listdir(tar_dir))
+                     if name.endswith('.tar') and name not in done]
+        initargs = (dest_dir, delete, tmp_root)
+        previous_tempdir = tempfile.tempdir
+        try:
+            if workers <= 1:
+                _init_filter_worker(*initargs)
+                for record in map(_filter_archive, tar_paths):
+                    results.write(record)
+                    yield record
+            else:
+                with Pool(workers, initializer=_init_filter_worker, initargs=initargs) as pool:
+                    for record in pool.imap_unordered(_filter_archive, tar_paths):
+                        results.write(record)
+                        yield record
+        finally:
+            tempfile.tempdir = previous_tempdir  # Set by the serial mode
+            if tmp_root is not None:
+                for name in os.listdir(tmp_root):
+                    if name.startswith('worker-'):
+                        shutil.rmtree(os.path.join(tmp_root, name), ignore_errors=True)
+
+def extract_and_process_tar_files(
+    tar_dir: str = ARCHIVES_DIR,
+    dest_dir: str = FILTERED_ARCHIVES_DIR,
+    workers: int = 1,
+    results_path: str = FILTER_RESULTS,
+    tmp_root: Optional[str] = None,
+    delete: bool = True,
+) -> Counter:
+    """Filter every tar of `tar_dir` and delete it afterwards, see `iter_filtered_archives`. Returns the total counts."""
+    totals = Counter()
+    for record in iter_filtered_archives(tar_dir, dest_dir, workers, results_path, tmp_root, delete):
+        counts = {key: value for key, value in record.items() if isinstance(value, int)}
+        totals.update(counts, archives=1, failed_archives=int(record['status'] != 'done'))
+        print(f"{record['archive']}: {record['status']} in {record['seconds']}s", counts)
+    return totals
@@ -0,0 +1,160 @@
+"""Mining stage: pattern matching and optional LLM entity extraction on every paper's comments."""
+
+import json
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterable, Iterator, Optional
+
+from latexposed.chunking import CommentChunker, merge_chunk_answers
+from latexposed.comment_index import CommentIndex, iter_byte_range
+from latexposed.llm import ask_llm, parse_labels_from_xml
+from latexposed.patterns import all_search_patterns, finditer_patterns
+from latexposed.pattern_profile import PatternProfile
+from latexposed.regex_engine import RegexBudget
+from latexposed.secrets_db import SecretsScanner
+from latexposed.triage import TriageScorer
+
+
+MINED_JSONL = 'data/paper_findings.jsonl'
+# Bytes of comments per task of the parallel mode, what a worker holds in memory at once
+RANGE_BYTES = 8 * 1024 * 1024
+
+
+class PaperMiner:
+    """Run every extractor of the mining stage on one paper's merged comments."""
+
+    def __init__(self, scanner: SecretsScanner, llm_config: Optional[dict] = None,
+                 chunker: Optional[CommentChunker] = None, triage: Optional[TriageScorer] = None,
+                 patterns: Optional[dict] = None, budget: Optional[RegexBudget] = None, profile: Optional[PatternProfile] = None):
+        self.scanner = scanner
+        # `patterns.compile_search_patterns` for another regex engine, the budget bounds every custom pattern
+        self.patterns = patterns or all_search_patterns
+        self.budget = budget
+        self.profile = profile
+        if profile is not None:
+            scanner.profile = profile
+        self.llm_config = llm_config
+        self.chunker = chunker
+        self.triage = triage
+        try:
+            from urlextract import URLExtract
+            self.url_extractor = URLExtract()
+        except ImportError:
+            self.url_extractor = None
+
+    def mine(self, record: dict) -> dict:
+        text = record['comments']
+        pattern_matches = list(finditer_patterns(text, self.patterns, self.budget, self.profile))
+        patterns = {}
+        for match in pattern_matches:
+            patterns.setdefault(match.name, match.match)  # The first match, as `search_patterns` finds it
+        findings = {
+            "name": record['name'],
+            "urls": self.url_extractor.find_urls(text) if self.url_extractor else [],
+            "patterns": patterns,
+            "pattern_matches": [match._asdict() for match in pattern_matches],
+            "secrets": [match._asdict() for match in self.scanner.finditer(text)],
+        }
+        if self.llm_config is not None and text.strip():
+            send, score = self.triage.check(text, findings["patterns"], findings["secrets"]) if self.triage else (True, None)
+            if not send:
+                # No local signal, recorded as `none` without a request
+                findings["llm"] = {"xml": "", "pred_labels": [], "error": None, "triage_score": score, "triage_skipped": True}
+                return findings
+            # Papers over the context budget are classified chunk by chunk, the labels are merged
+            chunks = self.chunker.split(text) if self.chunker is not None else [text]
+            answers = [ask_llm(chunk, **self.llm_config) for chunk in chunks]
+            xml, err = merge_chunk_answers(answers)
+            findings["llm"] = {
+                "xml": xml or "",
+                "pred_labels": parse_labels_from_xml(xml) if xml else [],
+                "error": err,
+            }
+            if score is not None:
+                findings["llm"]["triage_score"] = score
+            if len(chunks) > 1:
+                findings["llm"]["chunks"] = [{"xml": chunk_xml or "", "error": chunk_err} for chunk_xml, chunk_err in answers]
+        return findings
+
+
+def iter_comment_records(comments_file: str, skip=()) -> Iterator[dict]:
+    with open(comments_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['name'] not in skip:
+                yield record
+
+def iter_findings(records: Iterable[dict], miner: PaperMiner, ledger) -> Iterator[dict]:
+    for record in records:
+        if record['name'] in ledger:
+            continue
+        yield miner.mine(record)
+
+
+# ---------------------------------------------------------------------------
+# Parallel mode: byte ranges of the comments file are mined in worker processes
+# ---------------------------------------------------------------------------
+
+_worker_miner = None
+_worker_skip = set()
+
+def _init_mine_worker(scanner: SecretsScanner, skip: set[str], patterns: Optional[dict], budget: Optional[RegexBudget],
+                      profile: Optional[PatternProfile]):
+    global _worker_miner, _worker_skip
+    scanner.budget = budget
+    _worker_miner = PaperMiner(scanner, patterns=patterns, budget=budget, profile=profile)
+    _worker_skip = skip
+
+def _mine_range(args: tuple[str, int, int]) -> tuple[list[dict], dict, Optional[PatternProfile]]:
+    comments_file, start, end = args
+    budget, profile = _worker_miner.budget, _worker_miner.profile
+    if budget is not None:
+        budget.timeouts.clear()
+    if profile is not None:
+        profile.clear()
+    # The range comes as byte offsets, so the worker does not load the sidecar index for every range
+    records = [_worker_miner.mine(record) for record in iter_byte_range(comments_file, start, end)
+               if record['name'] not in _worker_skip]
+    # The timeouts and timings of this range, added up in the parent
+    return records, dict(budget.timeouts) if budget is not None else {}, profile
+
+def iter_findings_parallel(
+    comments_file: str,
+    workers: int,
+    scanner: SecretsScanner,
+    skip: Optional[set[str]] = None,
+    range_bytes: int = RANGE_BYTES,
+    patterns: Optional[dict] = None,
+    budget: Optional[RegexBudget] = None,
+    profile: Optional[PatternProfile] = None,
+) -> Iterator[dict]:
+    """
+    Same findings as `iter_findings` without the LLM: URLs, custom patterns and
+    secrets-patterns-db matches in one pass per record. The offset index is
+    read once here to cut the file into byte ranges, every worker reads its
+    own range sequentially, and at most two ranges per worker are in flight,
+    so memory does not grow with the file.
+    Ranges are yielded in file order. The scanner is compiled once here and
+    inherited by the workers, the timeouts of their regex budgets and their
+    pattern timings are added to `budget` and `profile`.
+    """
+    with CommentIndex(comments_file) as index:
+        size = index.offsets[-1]
+        ranges = index.byte_shards(max(workers, -(-size // range_bytes)))
+    with Pool(workers, initializer=_init_mine_worker, initargs=(scanner, skip or set(), patterns, budget, profile)) as pool:
+
+        def collect(result) -> list[dict]:
+            records, timeouts, range_profile = result.get()
+            if budget is not None:
+                budget.timeouts.update(timeouts)
+            if profile is not None:
+                profile.merge(range_profile)
+            return records
+
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.apply_async(_mine_range, ((comments_file, start, end),)))
+            if len(pending) >= 2 * workers:
+                yield from collect(pending.popleft())
+        while pending:
+            yield from collect(pending.popleft())
@@ -0,0 +1,161 @@
+"""Parsing stage: merge the filtered LaTeX comments of every paper into one JSONL file."""
+
+import json
+import os
+from collections import Counter
+from multiprocessing import Pool
+from typing import Iterable, Iterator, Optional
+
+from latexposed.comments import cleanup_comments, extract_latex_comments, filter_boilerplate, normalize_comments
+from latexposed.store import is_paper_store, open_paper_store
+
+
+PAPERS_FOLDER = 'data/final'
+COMMON_COMMENTS_TXT = 'tmp/common_comments.txt'
+COMMENTS_JSONL = 'data/paper_comments.jsonl'
+# Comments appearing more often than this are treated as boilerplate
+BOILERPLATE_MIN_COUNT = 10
+# Papers handed to a worker process at once in parallel mode
+SHARD_SIZE = 64
+
+
+def list_paper_files(papers_folder: str) -> list[str]:
+    """Paper files in a deterministic order. `papers_folder` may also be a paper store."""
+    if is_paper_store(papers_folder):
+        return sorted(open_paper_store(papers_folder).names())
+    return sorted(f for f in os.listdir(papers_folder) if f.endswith('.json'))
+
+def read_paper(papers_folder: str, paper_file: str) -> Optional[dict[str, str]]:
+    if is_paper_store(papers_folder):
+        return open_paper_store(papers_folder).get(paper_file)
+    with open(os.path.join(papers_folder, paper_file), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Iterator class for more convenient iteration of the dataset
+class PaperContentIterator():
+    def __init__(self, papers_folder: str, skip: Optional[set[str]] = None):
+        self.papers_folder = papers_folder
+        self.paper_files = list_paper_files(papers_folder)
+        if skip:
+            self.paper_files = [f for f in self.paper_files if f not in skip]
+        self.iteration_count = len(self.paper_files)
+        self.current_paper_index = 0
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        return self.iteration_count
+
+    def __next__(self) -> tuple[str, dict[str, str]]:
+        if self.current_paper_index >= self.iteration_count:
+            raise StopIteration
+        current_paper = self.paper_files[self.current_paper_index]
+        content = (current_paper, read_paper(self.papers_folder, current_paper))
+        self.current_paper_index += 1
+        return content
+
+
+def count_common_comments(papers: Iterable[tuple[str, Optional[dict]]]) -> Counter:
+    comment_counter = Counter()
+    for name, files in papers:
+        if files is None:
+            continue
+        for file in files:
+            comments = extract_latex_comments(files[file])
+            comment_counter.update(normalize_comments(comments))
+    return comment_counter
+
+def save_boilerplate(comment_counter: Counter, path: str = COMMON_COMMENTS_TXT, min_count: int = BOILERPLATE_MIN_COUNT):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for comment, count in comment_counter.items():
+            if count > min_count:
+                f.write(f"{comment}\n")
+
+def load_boilerplate(path: str = COMMON_COMMENTS_TXT) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return set(line.strip() for line in f if line.strip())
+
+
+def merge_paper_comments(files: dict[str, str], boilerplate: set[str]) -> str:
+    merged_comments = ''
+    for file in files:
+        comments = extract_latex_comments(files[file])
+        cleaned_comments = filter_boilerplate(comments, boilerplate)
+        cleaned_comments = cleanup_comments(cleaned_comments)
+        merged_comments += '\n'.join(cleaned_comments)
+    return merged_comments
+
+def iter_paper_comments(papers: Iterable[tuple[str, Optional[dict]]], boilerplate: set[str], ledger) -> Iterator[dict]:
+    """
+    Turn `(paper_name, tex_data)` records into `{"name", "comments"}` records.
+    Papers without sources are dropped, papers already in the ledger are skipped.
+    """
+    for name, files in papers:
+        if files is None or name in ledger:
+            continue
+        yield {"name": name, "comments": merge_paper_comments(files, boilerplate)}
+
+
+# ---------------------------------------------------------------------------
+# Parallel mode: shards of paper files are read and parsed in worker processes
+# ---------------------------------------------------------------------------
+
+def _shards(paper_files: list[str], shard_size: int) -> list[list[str]]:
+    return [paper_files[i:i + shard_size] for i in range(0, len(paper_files), shard_size)]
+
+def _count_shard(args: tuple[str, list[str]]) -> tuple[int, Counter]:
+    papers_folder, paper_files = args
+    return len(paper_files), count_common_comments((f, read_paper(papers_folder, f)) for f in paper_files)
+
+def count_common_comments_parallel(papers_folder: str, workers: int, shard_size: int = SHARD_SIZE, progress=None) -> Counter:
+    """Count comments on all cores, the per-worker Counters are merged as they arrive."""
+    comment_counter = Counter()
+    shards = _shards(list_paper_files(papers_folder), shard_size)
+    with Pool(workers) as pool:
+        for shard_papers, shard_counter in pool.imap_unordered(_count_shard, [(papers_folder, shard) for shard in shards]):
+            comment_counter.update(shard_counter)
+            if progress is not None:
+                progress.update(shard_papers)  # The last shard is shorter
+    return comment_counter
+
+
+_worker_boilerplate = set()
+
+def _init_parse_worker(boilerplate: set[str]):
+    global _worker_boilerplate
+    _worker_boilerplate = boilerplate
+
+def _parse_shard(args: tuple[str, list[str]]) -> list[dict]:
+    papers_folder, paper_files = args
+    records = []
+    for paper_file in paper_files:
+        files = read_paper(papers_folder, paper_file)
+        if files is None:
+            continue
+        records.append({"name": paper_file, "comments": merge_paper_comments(files, _worker_boilerplate)})
+    return records
+
+def iter_paper_comments_parallel(
+    papers_folder: str,
+    boilerplate: set[str],
+    workers: int,
+    skip: Optional[set[str]] = None,
+    shard_size: int = SHARD_SIZE,
+) -> Iterator[dict]:
+    """
+    Same records as `iter_paper_comments`, but the papers are read and parsed
+    by a pool of worker processes. Shards are yielded in file name order, so
+    the output is identical regardless of the number of workers.
+    """
+    paper_files = list_paper_files(papers_folder)
+    if skip:
+        paper_files = [f for f in paper_files if f not in skip]
+    shards = _shards(paper_files, shard_size)
+    with Pool(workers, initializer=_init_parse_worker, initargs=(boilerplate,)) as pool:
+        for records in pool.imap(_parse_shard, [(papers_folder, shard) for shard in shards]):
+            yield from records
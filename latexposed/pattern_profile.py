@@ -0,0 +1,114 @@
+"""
+Per-pattern cost profile of the pattern matching.
+
+For every pattern it records the invocations (comments the pattern ran on,
+after the secrets prefilter), the total time, the matches and the comments
+with a match, and a log-scale histogram of the time per comment for the p99,
+so memory does not grow with the corpus. The result is written as a CSV
+sorted by total time, and as folded stacks (`mine;secrets;high;AWS API Key
+1234`, microseconds) for flamegraph.pl or speedscope.
+"""
+
+import csv
+import math
+from collections import Counter
+from typing import Optional
+
+
+# Histogram buckets per doubling of the time, the p99 is exact to about 19%
+BUCKETS_PER_OCTAVE = 4
+FIELDS = ['source', 'confidence', 'pattern', 'invocations', 'matches', 'comments_matched',
+          'total_seconds', 'mean_us', 'p99_us', 'share']
+
+
+class _PatternStats:
+    __slots__ = ('invocations', 'matches', 'comments_matched', 'seconds', 'histogram')
+
+    def __init__(self):
+        self.invocations = 0
+        self.matches = 0
+        self.comments_matched = 0
+        self.seconds = 0.0
+        self.histogram = Counter()
+
+    def p99(self) -> float:
+        """Upper bound of the bucket holding the 99th percentile, in seconds."""
+        rank = math.ceil(0.99 * self.invocations)
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                return 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE) / 1e9
+        return 0.0
+
+
+class PatternProfile:
+    def __init__(self):
+        self.stats = {}  # (source, confidence, pattern) -> _PatternStats
+
+    def record(self, key: tuple[str, str, str], seconds: float, matches: int):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = _PatternStats()
+        stats.invocations += 1
+        stats.matches += matches
+        stats.comments_matched += matches > 0
+        stats.seconds += seconds
+        stats.histogram[int(BUCKETS_PER_OCTAVE * math.log2(max(seconds * 1e9, 1)))] += 1
+
+    def merge(self, other: 'PatternProfile'):
+        """Add the profile of another process."""
+        for key, theirs in other.stats.items():
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = _PatternStats()
+            stats.invocations += theirs.invocations
+            stats.matches += theirs.matches
+            stats.comments_matched += theirs.comments_matched
+            stats.seconds += theirs.seconds
+            stats.histogram.update(theirs.histogram)
+
+    def clear(self):
+        self.stats = {}
+
+    def total_seconds(self) -> float:
+        return sum(stats.seconds for stats in self.stats.values())
+
+    def rows(self, limit: Optional[int] = None) -> list[dict]:
+        """One row per pattern, the most expensive first."""
+        total = self.total_seconds() or 1.0
+        rows = []
+        for (source, confidence, pattern), stats in sorted(self.stats.items(), key=lambda item: -item[1].seconds)[:limit]:
+            rows.append({
+                'source': source,
+                'confidence': confidence,
+                'pattern': pattern,
+                'invocations': stats.invocations,
+                'matches': stats.matches,
+                'comments_matched': stats.comments_matched,
+                'total_seconds': round(stats.seconds, 6),
+                'mean_us': round(stats.seconds / stats.invocations * 1e6, 2),
+                'p99_us': round(stats.p99() * 1e6, 2),
+                'share': round(stats.seconds / total, 4),
+            })
+        return rows
+
+    def write_csv(self, path: str, extra: Optional[dict] = None):
+        """`extra` maps a pattern key to more columns, e.g. counts against ground truth."""
+        rows = self.rows()
+        fields = list(FIELDS)
+        if extra:
+            for row in rows:
+                row.update(extra.get((row['source'], row['confidence'], row['pattern']), {}))
+            fields += sorted({field for columns in extra.values() for field in columns})
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fields, restval='')
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def write_folded(self, path: str):
+        """Folded stacks in microseconds, `;` in pattern names is replaced since it separates frames."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for (source, confidence, pattern), stats in sorted(self.stats.items()):
+                frames = ['mine', source] + ([confidence] if confidence else []) + [pattern.replace(';', ',')]
+                f.write(f"{';'.join(frames)} {max(1, round(stats.seconds * 1e6))}\n")
@@ -0,0 +1,71 @@
+"""Custom search patterns of the pattern matching substep."""
+
+import re
+from typing import Iterator, NamedTuple, Optional
+
+from latexposed.regex_engine import RegexBudget, iter_regex, recompile
+
+
+all_search_patterns = {
+    # IBAN (International Bank Account Number)
+    'ibans': re.compile(r'\b([A-Z]{2}\d{2}[A-Z0-9]{11,30})\b'),
+    # Generic bank account numbers (e.g., numeric sequences, 8–20 digits)
+    'bank_accounts': re.compile(r'\b(\d{8}-\d{8}-?\d{0,8})\b'),
+    # SSH private key headers
+    'ssh_private_keys': re.compile(r'(-----BEGIN (?:RSA|DSA|EC|OPENSSH) PRIVATE KEY-----.*?-----END (?:RSA|DSA|EC|OPENSSH) PRIVATE KEY-----)', re.DOTALL),
+    # Generic API keys or secrets (alphanumeric tokens with length)
+    'api_keys': re.compile(r'\b([A-Za-z0-9_\-]{32,64})\b'),
+    # Email addresses
+    'emails': re.compile(r'\b([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,})\b'),
+    # AWS access keys
+    'aws_access_keys': re.compile(r'\b(AKIA[0-9A-Z]{16})\b'),
+    # AWS secret keys
+    'aws_secret_keys': re.compile(r'\b([0-9a-zA-Z/+]{40})\b'),
+    # Credit card numbers (Visa, MasterCard, American Express)
+    'credit_cards': re.compile(r'\b(?:4[0-9]{12}(?:[0-9]{3})?|5[1-5][0-9]{14}|3[47][0-9]{13}|3(?:0[0-5]|[68][0-9])[0-9]{11}|6(?:011|5[0-9]{2})[0-9]{12}|(?:2131|1800|35\d{3})\d{11})\b'),
+    # Social Security Numbers (SSNs) - US format
+    'us_ssns': re.compile(r'\b(\d{3}-\d{2}-\d{4})\b'),
+    # JWT tokens
+    'jwt_tokens': re.compile(r'\b(eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+)\b'),
+    # Google API keys
+    'google_api_keys': re.compile(r'\b(AIza[0-9A-Za-z\-_]{35})\b'),
+    # Github tokens
+    'github_tokens': re.compile(r'\b(ghp_[A-Za-z0-9]{36})\b'),
+    # Slack tokens
+    'slack_tokens': re.compile(r'\b(xox[baprs]-[A-Za-z0-9]{10,48})\b'),
+    # Phone numbers (various formats)
+    'phone_numbers': re.compile(r'\b(\+?\d{1,3}?[-.\s]??\(?\d{1,4}?\)?[-.\s]??\d{1,4}[-.\s]??\d{1,9})\b'),
+}
+
+ip_pattern = re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
+internal_ip_pattern = re.compile(r'\b(10\.(?:[0-9]{1,3}\.){2}[0-9]{1,3}|172\.(1[6-9]|2[0-9]|3[0-1])\.(?:[0-9]{1,3}\.)[0-9]{1,3}|192\.168\.(?:[0-9]{1,3}\.)[0-9]{1,3})\b')
+
+
+def search_patterns(comment: str, patterns: dict[str, re.Pattern] = all_search_patterns) -> dict[str, str]:
+    """First match of every pattern that occurs in the comment."""
+    findings = {}
+    for key, pattern in patterns.items():
+        if res := pattern.search(comment):
+            findings[key] = res.group()
+    return findings
+
+
+class PatternMatch(NamedTuple):
+    name: str
+    match: str
+    start: int  # Character offsets into the comment
+    end: int
+
+
+def compile_search_patterns(engine: str = 're', patterns: dict[str, re.Pattern] = all_search_patterns) -> dict:
+    """The patterns for another regex engine, see `regex_engine.compile_regex`."""
+    return {key: recompile(pattern, engine) for key, pattern in patterns.items()}
+
+
+def finditer_patterns(comment: str, patterns: dict = all_search_patterns, budget: Optional[RegexBudget] = None,
+                      profile=None) -> Iterator[PatternMatch]:
+    """Every non-overlapping match of every pattern, pattern by pattern."""
+    for key, pattern in patterns.items():
+        for m in iter_regex(key, pattern, comment, budget, profile, ('pattern', '', key)):
+            if m.end() > m.start():
+                yield PatternMatch(key, m.group(), m.start(), m.end())
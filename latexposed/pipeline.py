@@ -0,0 +1,63 @@
+"""
+Bounded-queue plumbing between streaming stages.
+
+Every stage is a generator that consumes the previous stage's iterator.
+`threaded` runs a stage in a background thread and hands its records over
+through a bounded queue, so a slow consumer applies backpressure instead of
+letting the producer buffer the whole corpus in memory.
+"""
+
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+
+T = TypeVar('T')
+
+QUEUE_SIZE = 64
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def threaded(iterable: Iterable[T], maxsize: int = QUEUE_SIZE) -> Iterator[T]:
+    """Iterate `iterable` in a background thread, buffering at most `maxsize` records."""
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        producer.join(timeout=1)
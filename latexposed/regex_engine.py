@@ -0,0 +1,120 @@
+"""
+Regex engines and time budgets for the mining patterns.
+
+Python's `re` backtracks, so a pattern with nested or overlapping quantifiers
+(`phone_numbers`, the 1.7k third-party secrets-patterns-db rules) can take
+seconds on one long run of digits and stall a worker. With the `re2` engine
+(`pip install google-re2`) patterns run in linear time instead; the patterns
+RE2 cannot express, such as backreferences and lookarounds, stay on `re`.
+RE2's `\\d`, `\\w` and `\\b` are ASCII-only, which is what the patterns mean.
+
+`RegexBudget` stops a single pattern on a single text after `timeout` seconds
+with SIGALRM, which interrupts `re` mid-match, and counts which patterns hit
+the budget. It only works in the main thread of a process on Unix, elsewhere
+patterns run unbounded. scripts/bench_regex_engines.py compares the engines.
+"""
+
+import os
+import re
+import signal
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+try:
+    import re2  # google-re2, optional
+except ImportError:
+    re2 = None
+
+
+ENGINES = ('re', 're2')
+INLINE_FLAGS = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's'}
+
+
+def compile_regex(pattern: str, flags: int = 0, engine: str = 're'):
+    """Compile with `engine`, falling back to `re` for what RE2 does not support."""
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown regex engine {engine!r}, expected one of {ENGINES}')
+    if engine == 're2':
+        if re2 is None:
+            raise RuntimeError('The re2 engine needs google-re2, install it with `pip install google-re2`.')
+        inline = ''.join(letter for flag, letter in INLINE_FLAGS.items() if flags & flag)
+        options = re2.Options()
+        options.log_errors = False  # Unsupported patterns are expected
+        if not flags & re.VERBOSE:
+            try:
+                return re2.compile(f'(?{inline}){pattern}' if inline else pattern, options)
+            except re2.error:
+                pass
+    return re.compile(pattern, flags)
+
+def recompile(regex: re.Pattern, engine: str = 're'):
+    return regex if engine == 're' else compile_regex(regex.pattern, regex.flags, engine)
+
+def is_fallback(regex, engine: str) -> bool:
+    """True if `regex` was meant for `engine` but runs on `re`."""
+    return engine != 're' and isinstance(regex, re.Pattern)
+
+
+class RegexTimeout(Exception):
+    pass
+
+
+class RegexBudget:
+    """Per pattern and text time budget, with the number of texts each pattern was stopped on."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.timeouts = Counter()
+        self._pid = None
+        self._armed = False
+
+    def __getstate__(self):
+        # Worker processes install their own signal handler
+        return {**self.__dict__, '_pid': None, '_armed': False}
+
+    def _alarm(self, signum, frame):
+        if self._armed:
+            raise RegexTimeout()
+
+    def _ready(self) -> bool:
+        if self._pid == os.getpid():
+            return True
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGALRM, self._alarm)
+        self._pid = os.getpid()
+        return True
+
+    def finditer(self, name: str, regex, text: str) -> list:
+        """The matches of `regex` in `text`, only those found before the timeout if it hit the budget."""
+        if not self._ready():
+            return list(regex.finditer(text))
+        matches = []
+        try:
+            self._armed = True
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
+            for m in regex.finditer(text):
+                matches.append(m)
+            self._armed = False
+        except RegexTimeout:
+            self.timeouts[name] += 1
+        finally:
+            self._armed = False
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        return matches
+
+    def report(self) -> dict[str, int]:
+        """Patterns that hit the budget, most often stopped first."""
+        return dict(self.timeouts.most_common())
+
+
+def iter_regex(name: str, regex, text: str, budget: Optional[RegexBudget] = None, profile=None, key: Optional[tuple] = None):
+    """Matches of `regex`, within the budget, timed into a `pattern_profile.PatternProfile` under `key`."""
+    if profile is None:
+        return regex.finditer(text) if budget is None else budget.finditer(name, regex, text)
+    start = time.perf_counter()
+    matches = list(regex.finditer(text)) if budget is None else budget.finditer(name, regex, text)
+    profile.record(key or ('', '', name), time.perf_counter() - start, len(matches))
+    return matches
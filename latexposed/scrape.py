@@ -0,0 +1,356 @@
+"""Scraping stage: download arXiv source archives from S3 and keep the LaTeX files of each paper."""
+
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import tarfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+
+# Manifest files
+ARXIV_MANIFEST_JSON = 'data/arXiv_src_manifest.json'
+ARXIV_MANIFEST_XML = 'data/arXiv_src_manifest.xml'
+# Number of papers to download. The actual number will be slightly higher due to the batching of achives.
+TARGET_COUNT = 100_000
+# Directory where the downloaded tar.gz files are stored.
+ARCHIVES_DIR = 'data/archives'
+# Temporary directory where the files will be extracted when not streaming in memory. It's best to mount a memory disk here.
+TMP_DIR = 'tmp'
+# Final directory where the selected files will be stored. One JSON for each paper.
+TARGET_DIR = 'data/final'
+
+
+_s3_client = None
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def s3_download_requester_pays(bucket, key, download_path):
+    from boto3.s3.transfer import S3Transfer, TransferConfig
+    transfer = S3Transfer(get_s3_client(), config=TransferConfig(use_threads=True))
+    transfer.download_file(
+        bucket, key, download_path,
+        extra_args={'RequestPayer': 'requester'}
+    )
+
+def extract_latex_from_archive(archive_path):
+    # Either a path or a seekable file object of the paper's .gz
+    fileobj = archive_path if hasattr(archive_path, 'read') else None
+    tex_data = {}
+    try: # Try extracting tar.gz content
+        with tarfile.open(None if fileobj else archive_path, "r:gz", fileobj=fileobj) as tar:
+            for member in tar.getmembers():
+                if member.isfile() and member.name.lower().endswith('.tex'):
+                    data = tar.extractfile(member)
+                    if data is not None:
+                        tex_data[member.name] = data.read().decode('utf-8', errors='ignore')
+    except Exception as e: # If it fails, try extracting gzip content
+        try:
+            if fileobj:
+                fileobj.seek(0)
+            with gzip.open(archive_path, 'rt', encoding='utf-8', errors='ignore') as f:
+                tex_data['____main.tex'] = f.read()
+        except Exception as e2:
+            print(f"Failed to extract {getattr(archive_path, 'name', archive_path)}: {e}, {e2}")
+        return None
+    return tex_data
+
+
+def build_manifest(xml_path: str = ARXIV_MANIFEST_XML, json_path: str = ARXIV_MANIFEST_JSON):
+    """Convert the arXiv XML manifest to JSON, ordered randomly for anonymity."""
+    tree = ET.parse(xml_path)
+    root = tree.getroot()
+    files = []
+    for file_elem in root.findall('file'):
+        entry = {}
+        for child in file_elem:
+            entry[child.tag] = child.text
+        entry['num_items'] = int(entry['num_items'])
+        files.append(entry)
+
+    random.shuffle(files)
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(files, f, indent=2, ensure_ascii=False)
+
+def select_archives(manifest_path: str = ARXIV_MANIFEST_JSON, target_count: int = TARGET_COUNT) -> list[dict]:
+    """Select archives from the manifest until the cumulative paper count reaches the target."""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        files = json.load(f)
+
+    selected_files = []
+    cumulative_items = 0
+    for fileinfo in files:
+        num_items = int(fileinfo['num_items'])
+        selected_files.append(fileinfo)
+        cumulative_items += num_items
+        if cumulative_items >= target_count:
+            break
+    return selected_files
+
+
+def clear_tmp_dir(tmp_dir: str = TMP_DIR):
+    if os.path.exists(tmp_dir):
+        for filename in os.listdir(tmp_dir):
+            file_path = os.path.join(tmp_dir, filename)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+def iter_archive_papers(download_path: str, tmp_dir: str = TMP_DIR) -> Iterator[tuple[str, Optional[dict]]]:
+    """Unpack one downloaded arXiv_src tar and yield `(paper_id, tex_data)` for every paper in it."""
+    # Extract main archive
+    with tarfile.open(download_path, 'r') as tar:
+        for member in tar.getmembers():
+            # Adjust the path to remove the top-level folder
+            member.name = os.path.basename(member.name)
+            tar.extract(member, path=tmp_dir)
+    os.remove(download_path)
+
+    # Delete all folders and non-zip archives in the directory and keep files
+    for item in os.listdir(tmp_dir):
+        item_path = os.path.join(tmp_dir, item)
+        if os.path.isdir(item_path):
+            os.rmdir(item_path)
+        elif not item.endswith('.gz'):
+            os.remove(item_path)
+
+    for item in sorted(os.listdir(tmp_dir)):
+        paper_id = item.removesuffix('.gz')
+        item_path = os.path.join(tmp_dir, item)
+        tex_data = extract_latex_from_archive(item_path)
+        os.remove(item_path)
+        yield paper_id, tex_data
+
+def stream_archive_papers(download_path: str) -> Iterator[tuple[str, Optional[dict]]]:
+    """
+    Same as `iter_archive_papers`, but the tar is read sequentially and every
+    paper's .gz is parsed from memory. Members that are not .gz files are
+    skipped without reading their bodies and nothing is written to disk.
+    Papers come in archive order instead of file name order.
+    """
+    with tarfile.open(download_path, 'r|') as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith('.gz'):
+                continue
+            paper_id = os.path.basename(member.name).removesuffix('.gz')
+            archive = io.BytesIO(tar.extractfile(member).read())
+            archive.name = member.name
+            yield paper_id, extract_latex_from_archive(archive)
+    os.remove(download_path)
+
+def write_paper(paper_id: str, tex_data: Optional[dict], target_dir: Optional[str] = TARGET_DIR):
+    if target_dir is None:
+        return  # The caller keeps the paper, e.g. in a paper store
+    with open(os.path.join(target_dir, f'{paper_id}.json'), 'w', encoding='utf-8') as f:
+        json.dump(tex_data, f)
+
+
+def iter_scraped_papers(
+    selected_files: list[dict],
+    ledger,
+    archives_dir: str = ARCHIVES_DIR,
+    tmp_dir: str = TMP_DIR,
+    target_dir: Optional[str] = TARGET_DIR,
+    download: Callable[[str, str, str], None] = s3_download_requester_pays,
+    in_memory: bool = True,
+) -> Iterator[tuple[str, Optional[dict]]]:
+    """
+    Download the selected archives one by one and yield `(paper_name, tex_data)`.
+    Every paper is saved to `target_dir`, if given, before it is yielded. Archives recorded
+    in the ledger are skipped, so a resumed run only downloads what is missing.
+    With `in_memory=False` the archives are unpacked to `tmp_dir` like in the notebook.
+    """
+    if not in_memory:
+        clear_tmp_dir(tmp_dir)
+        os.makedirs(tmp_dir, exist_ok=True)
+    os.makedirs(archives_dir, exist_ok=True)
+    if target_dir is not None:
+        os.makedirs(target_dir, exist_ok=True)
+
+    for fileinfo in selected_files:
+        key = fileinfo['filename']  # "src/arXiv_src_2505_191.tar"
+        if key in ledger:
+            continue
+        filename = os.path.basename(key)
+        download_path = os.path.join(archives_dir, filename)
+
+        download('arxiv', key, download_path)
+        papers = stream_archive_papers(download_path) if in_memory else iter_archive_papers(download_path, tmp_dir)
+        for paper_id, tex_data in papers:
+            write_paper(paper_id, tex_data, target_dir)
+            yield f'{paper_id}.json', tex_data
+        ledger.mark(key)
+
+
+# ---------------------------------------------------------------------------
+# Pipelined mode: concurrent downloads overlapped with extraction
+# ---------------------------------------------------------------------------
+
+class LocalMirrorDownloader:
+    """Stand-in for S3 that serves `bucket/key` from a local directory, for tests and offline runs."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def __call__(self, bucket, key, download_path):
+        shutil.copyfile(os.path.join(self.root, key), download_path)
+
+
+class StageCounter:
+    """Thread-safe throughput counter of one pipeline stage."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, items: int = 1, nbytes: int = 0, busy: float = 0.0):
+        with self.lock:
+            self.items += items
+            self.bytes += nbytes
+            self.busy += busy
+
+    def summary(self) -> str:
+        wall = max(time.perf_counter() - self.started, 1e-9)
+        # Share of the stage's worker time spent working, the saturated stage is the bottleneck
+        utilization = self.busy / (wall * self.workers)
+        return (f'{self.name}: {self.items} items {self.bytes / 1e6:.1f}MB '
+                f'{self.bytes / 1e6 / wall:.1f}MB/s {self.items / wall:.2f}/s utilization={utilization:.0%}')
+
+
+def _download_archive(download, key: str, download_path: str) -> tuple[int, float]:
+    start = time.perf_counter()
+    download('arxiv', key, download_path)
+    return os.path.getsize(download_path), time.perf_counter() - start
+
+def _extract_archive(download_path: str, tmp_dir: str, target_dir: Optional[str], in_memory: bool) -> tuple[list[str], Optional[str], float]:
+    """
+    Extraction worker, every archive gets its own temporary directory. The
+    papers are not sent back to the parent process: they are saved to
+    `target_dir`, or spooled to a JSONL file in `tmp_dir` without one, and
+    only their ids and the spool's path are returned.
+    """
+    start = time.perf_counter()
+    name = os.path.basename(download_path).removesuffix('.tar')
+    spool_path = os.path.join(tmp_dir, f'{name}.papers.jsonl') if target_dir is None else None
+    paper_ids = []
+    spool = open(spool_path, 'w', encoding='utf-8') if spool_path else None
+    archive_tmp_dir = os.path.join(tmp_dir, name)
+    try:
+        if in_memory:
+            papers = stream_archive_papers(download_path)
+        else:
+            os.makedirs(archive_tmp_dir, exist_ok=True)
+            papers = iter_archive_papers(download_path, archive_tmp_dir)
+        for paper_id, tex_data in papers:
+            if spool:
+                spool.write(json.dumps([paper_id, tex_data]) + '\n')
+            else:
+                write_paper(paper_id, tex_data, target_dir)
+            paper_ids.append(paper_id)
+    finally:
+        if spool:
+            spool.close()
+        if not in_memory:
+            shutil.rmtree(archive_tmp_dir, ignore_errors=True)
+    return paper_ids, spool_path, time.perf_counter() - start
+
+def _read_back(paper_ids: list[str], spool_path: Optional[str], target_dir: Optional[str]) -> Iterator[tuple[str, Optional[dict]]]:
+    """The papers of one extracted archive, read one by one from the spool or `target_dir`."""
+    if spool_path is None:
+        for paper_id in paper_ids:
+            with open(os.path.join(target_dir, f'{paper_id}.json'), 'r', encoding='utf-8') as f:
+                yield f'{paper_id}.json', json.load(f)
+        return
+    try:
+        with open(spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                paper_id, tex_data = json.loads(line)
+                yield f'{paper_id}.json', tex_data
+    finally:
+        os.remove(spool_path)
+
+def iter_scraped_papers_concurrent(
+    selected_files: list[dict],
+    ledger,
+    archives_dir: str = ARCHIVES_DIR,
+    tmp_dir: str = TMP_DIR,
+    target_dir: Optional[str] = TARGET_DIR,
+    download: Callable[[str, str, str], None] = s3_download_requester_pays,
+    download_workers: int = 4,
+    extract_workers: int = 2,
+    queue_size: int = 2,
+    counters: Optional[dict[str, StageCounter]] = None,
+    in_memory: bool = True,
+) -> Iterator[tuple[str, Optional[dict]]]:
+    """
+    Like `iter_scraped_papers`, but up to `download_workers` archives are
+    downloaded at once while a process pool extracts the ones already on disk.
+    At most `download_workers + queue_size` archives are in flight, which
+    bounds the disk space used by downloaded archives. Papers are still
+    yielded archive by archive in manifest order. The workers hand over
+    paper ids only, the papers are read back one at a time from
+    `target_dir` or, without one, from a spool file in `tmp_dir`.
+
+    The spool trades memory for disk: without a `target_dir` (e.g. with a
+    paper store) every paper is written and read once more than by
+    `iter_scraped_papers`, even with `in_memory`, and `tmp_dir` needs room
+    for the LaTeX sources of up to `download_workers + queue_size` archives
+    as JSON. It keeps the parent's memory to one paper at a time instead of
+    several whole archives. A bounded queue per archive would avoid the
+    disk, but as papers are yielded in manifest order, later archives
+    waiting on their full queues could hold every extract worker and
+    starve the archive being yielded.
+    """
+    if not in_memory or target_dir is None:
+        clear_tmp_dir(tmp_dir)
+        os.makedirs(tmp_dir, exist_ok=True)
+    os.makedirs(archives_dir, exist_ok=True)
+    if target_dir is not None:
+        os.makedirs(target_dir, exist_ok=True)
+
+    if counters is None:
+        counters = {}
+    counters.setdefault('download', StageCounter('download', download_workers))
+    counters.setdefault('extract', StageCounter('extract', extract_workers))
+
+    pending_files = deque(fileinfo for fileinfo in selected_files if fileinfo['filename'] not in ledger)
+    in_flight = deque()
+
+    with ThreadPoolExecutor(download_workers) as download_pool, ProcessPoolExecutor(extract_workers) as extract_pool:
+
+        def fetch_and_extract(key: str, download_path: str):
+            size, elapsed = _download_archive(download, key, download_path)
+            counters['download'].add(1, size, elapsed)
+            return extract_pool.submit(_extract_archive, download_path, tmp_dir, target_dir, in_memory)
+
+        def fill():
+            while pending_files and len(in_flight) < download_workers + queue_size:
+                key = pending_files.popleft()['filename']
+                download_path = os.path.join(archives_dir, os.path.basename(key))
+                in_flight.append((key, download_pool.submit(fetch_and_extract, key, download_path)))
+
+        fill()
+        while in_flight:
+            key, fetched = in_flight.popleft()
+            paper_ids, spool_path, elapsed = fetched.result().result()
+            counters['extract'].add(1, 0, elapsed)
+            fill()
+            yield from _read_back(paper_ids, spool_path, target_dir)
+            ledger.mark(key)
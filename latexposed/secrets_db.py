@@ -0,0 +1,284 @@
+"""
+Compiled scanner for the secrets-patterns-db rules.
+
+The YAML database is loaded and compiled once. Every pattern is analyzed for
+literal anchors (e.g. `AKIA`, `ghp_`, `xox`) that any match must contain. A
+single multi-literal pass over the lowercased comment then selects the
+candidate patterns, and only those regexes are executed. Patterns without a
+usable anchor are always executed.
+"""
+
+import re
+import time
+from collections import defaultdict
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import yaml
+
+try:
+    import ahocorasick  # pyahocorasick, optional
+except ImportError:
+    ahocorasick = None
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse, sre_constants
+
+from latexposed.regex_engine import RegexBudget, is_fallback, iter_regex, recompile
+
+
+SECRETS_DB = 'resources/secrets-patterns-db-merged.yaml'
+# Confidence levels scanned by default, the notebook skipped 'low'
+DEFAULT_CONFIDENCES = ('high',)
+# Anchors shorter than this select too many patterns to be worth it
+MIN_ANCHOR_LENGTH = 2
+# Upper bound on the number of alternatives tracked per anchor
+MAX_ANCHOR_ALTERNATIVES = 64
+
+
+class SecretPattern(NamedTuple):
+    name: str
+    regex: re.Pattern
+    confidence: str
+
+
+class SecretMatch(NamedTuple):
+    name: str
+    confidence: str
+    match: str
+    start: int
+    end: int
+
+
+def load_secret_patterns(path: str = SECRETS_DB) -> list[SecretPattern]:
+    with open(path, 'r', encoding='utf-8') as f:
+        patterns = yaml.safe_load(f)['patterns']
+    return [
+        SecretPattern(p['pattern']['name'], re.compile(p['pattern']['regex']), p['pattern']['confidence'])
+        for p in patterns
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Literal anchor extraction
+# ---------------------------------------------------------------------------
+
+def _product(left: set[str], right: set[str]) -> Optional[set[str]]:
+    if len(left) * len(right) > MAX_ANCHOR_ALTERNATIVES:
+        return None
+    return {a + b for a in left for b in right}
+
+
+def _expand(items) -> Optional[set[str]]:
+    """Return every string the parsed items can match, or None if not small and finite."""
+    result = {''}
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            options = {chr(av)}
+        elif op is sre_constants.AT:
+            options = {''}  # zero-width, e.g. \b
+        elif op is sre_constants.IN:
+            if not all(sub_op is sre_constants.LITERAL for sub_op, _ in av):
+                return None
+            options = {chr(c) for _, c in av}
+        elif op is sre_constants.SUBPATTERN:
+            options = _expand(av[-1])
+        elif op is sre_constants.BRANCH:
+            options = set()
+            for alternative in av[1]:
+                expanded = _expand(alternative)
+                if expanded is None:
+                    return None
+                options |= expanded
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[1] <= 1:
+            options = _expand(av[2])
+            if options is not None and av[0] == 0:
+                options = options | {''}
+        else:
+            return None
+        if options is None or len(options) > MAX_ANCHOR_ALTERNATIVES:
+            return None
+        result = _product(result, options)
+        if result is None:
+            return None
+    return result
+
+
+def _anchor_score(anchor: set[str]) -> tuple[int, int]:
+    return min(len(a) for a in anchor), -len(anchor)
+
+
+def _best(candidates: list[set[str]]) -> Optional[set[str]]:
+    candidates = [c for c in candidates if c]
+    return max(candidates, key=_anchor_score) if candidates else None
+
+
+def _anchors(items) -> Optional[set[str]]:
+    """
+    Find a set of literals of which at least one must appear in every match.
+    Consecutive finite items are concatenated, everything else splits the run.
+    """
+    candidates = []
+    current = {''}
+    for item in items:
+        op, av = item
+        options = _expand([item])
+        if options is not None:
+            joined = _product(current, options)
+            if joined is None:
+                candidates.append(current)
+                current = options
+            else:
+                current = joined
+            continue
+
+        candidates.append(current)
+        current = {''}
+        if op is sre_constants.SUBPATTERN:
+            candidates.append(_anchors(av[-1]))
+        elif op is sre_constants.BRANCH:
+            alternatives = [_anchors(alternative) for alternative in av[1]]
+            if all(alternatives):
+                candidates.append(set().union(*alternatives))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            candidates.append(_anchors(av[2]))
+    candidates.append(current)
+    return _best(candidates)
+
+
+def extract_anchors(regex: str) -> Optional[set[str]]:
+    """Lowercased literals of which at least one appears in any match, None if there is no usable anchor."""
+    try:
+        anchor = _anchors(sre_parse.parse(regex))
+    except Exception:
+        return None
+    if anchor is None or min(len(a) for a in anchor) < MIN_ANCHOR_LENGTH:
+        return None
+    return {a.lower() for a in anchor}
+
+
+# ---------------------------------------------------------------------------
+# Multi-literal prefilter
+# ---------------------------------------------------------------------------
+
+def _trie_regex(words: Iterable[str]) -> str:
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Prefer the longest literal, shorter prefixes are added back by the caller
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class LiteralPrefilter:
+    """
+    Report which of a fixed set of literals occur in a text. Uses an
+    Aho-Corasick automaton if pyahocorasick is installed, otherwise a
+    trie-shaped regex evaluated at every position.
+    """
+
+    def __init__(self, literals: Iterable[str]):
+        self.literals = sorted(set(literals))
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal in self.literals:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+            self.regex = None
+        else:
+            self.automaton = None
+            self.regex = re.compile('(?=(' + _trie_regex(self.literals) + '))') if self.literals else None
+            # The regex reports the longest literal at each position, every
+            # other literal starting there is one of its prefixes.
+            literal_set = set(self.literals)
+            self.prefixes = {
+                literal: [literal[:i] for i in range(1, len(literal) + 1) if literal[:i] in literal_set]
+                for literal in self.literals
+            }
+
+    def find(self, text: str) -> set[str]:
+        if self.automaton is not None:
+            return {literal for _, literal in self.automaton.iter(text)}
+        found = set()
+        if self.regex is None:
+            return found
+        for longest in set(self.regex.findall(text)):
+            found.update(self.prefixes[longest])
+        return found
+
+
+# ---------------------------------------------------------------------------
+# Scanner
+# ---------------------------------------------------------------------------
+
+class SecretsScanner:
+    """Run a set of secret patterns against comments, only evaluating patterns whose anchors occur."""
+
+    def __init__(self, patterns: list[SecretPattern], confidences: Optional[Iterable[str]] = DEFAULT_CONFIDENCES,
+                 engine: str = 're', budget: Optional[RegexBudget] = None):
+        if confidences is not None:
+            confidences = set(confidences)
+            patterns = [p for p in patterns if p.confidence in confidences]
+        self.patterns = patterns
+        # The anchors are extracted from the `re` patterns, the matching runs on `engine`
+        self.engine = engine
+        self.regexes = [recompile(p.regex, engine) for p in patterns]
+        self.fallbacks = sum(is_fallback(regex, engine) for regex in self.regexes)
+        self.budget = budget
+        self.profile = None  # A `pattern_profile.PatternProfile` to time every pattern
+
+        self.by_confidence = defaultdict(list)
+        for index, pattern in enumerate(patterns):
+            self.by_confidence[pattern.confidence].append(index)
+
+        self.unanchored = []
+        self.literal_patterns = defaultdict(list)
+        for index, pattern in enumerate(patterns):
+            anchors = extract_anchors(pattern.regex.pattern)
+            if anchors is None:
+                self.unanchored.append(index)
+                continue
+            for anchor in anchors:
+                self.literal_patterns[anchor].append(index)
+        self.prefilter = LiteralPrefilter(self.literal_patterns)
+
+    @classmethod
+    def from_yaml(cls, path: str = SECRETS_DB, confidences: Optional[Iterable[str]] = DEFAULT_CONFIDENCES,
+                  engine: str = 're', budget: Optional[RegexBudget] = None) -> 'SecretsScanner':
+        return cls(load_secret_patterns(path), confidences, engine, budget)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def candidates(self, text: str) -> list[int]:
+        """Indices of the patterns that may match the text, in database order."""
+        selected = set(self.unanchored)
+        for literal in self.prefilter.find(text.lower()):
+            selected.update(self.literal_patterns[literal])
+        return sorted(selected)
+
+    def finditer(self, text: str) -> Iterator[SecretMatch]:
+        start = time.perf_counter()
+        candidates = self.candidates(text)
+        if self.profile is not None:
+            self.profile.record(('secrets', '', '(prefilter)'), time.perf_counter() - start, 0)
+        for index in candidates:
+            pattern = self.patterns[index]
+            key = ('secrets', pattern.confidence, pattern.name)
+            for m in iter_regex(pattern.name, self.regexes[index], text, self.budget, self.profile, key):
+                if m.end() > m.start():
+                    yield SecretMatch(pattern.name, pattern.confidence, m.group(), m.start(), m.end())
+
+    def scan(self, text: str) -> list[SecretMatch]:
+        return list(self.finditer(text))
@@ -0,0 +1,198 @@
+"""
+Sharded paper store, replacing the one-JSON-file-per-paper layout of data/final.
+
+Papers are appended to a few large shard files, each paper as its own
+compressed frame holding one JSON line. Concatenated zstd frames (or gzip
+members without zstandard) are still a valid compressed JSONL file, so a
+shard can be scanned sequentially with any decompressor, while the index
+`paper_id -> (shard, offset, length)` gives random access to single papers.
+
+    store/
+      index.tsv                  # paper_id \t shard \t offset \t length
+      papers-00000.jsonl.zst     # {"id": ..., "files": {...}} per frame
+"""
+
+import gzip
+import json
+import os
+from typing import Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+STORE_DIR = 'data/store'
+INDEX_FILE = 'index.tsv'
+# Papers per shard file, about 1GB of LaTeX sources before compression
+PAPERS_PER_SHARD = 10_000
+
+
+def _paper_id(name: str) -> str:
+    return name.removesuffix('.json')
+
+def is_paper_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data)
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def _codec(shard: str) -> str:
+    codec = shard.rsplit('.', 1)[1]
+    if codec == 'zst' and zstandard is None:
+        raise RuntimeError(f'{shard} is zstd compressed, install zstandard to read it.')
+    return codec
+
+
+class PaperStore:
+    """Read-only view of a paper store: random access by paper id and sequential scans."""
+
+    def __init__(self, store_dir: str = STORE_DIR):
+        self.store_dir = store_dir
+        self.index = {}  # paper_id -> (shard, offset, length)
+        with open(os.path.join(store_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # Torn write, the paper was not finished
+                paper_id, shard, offset, length = line.rstrip('\n').split('\t')
+                # A paper written twice, e.g. by a resumed scrape, keeps its last copy
+                self.index[paper_id] = (shard, int(offset), int(length))
+        self.shard_files = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name: str) -> bool:
+        return _paper_id(name) in self.index
+
+    def __iter__(self) -> Iterator[tuple[str, Optional[dict]]]:
+        return self.scan()
+
+    def names(self) -> list[str]:
+        """Paper file names, as used by the rest of the pipeline."""
+        return [f'{paper_id}.json' for paper_id in self.index]
+
+    def shards(self) -> list[str]:
+        return sorted(set(shard for shard, _, _ in self.index.values()))
+
+    def _read_frame(self, shard: str, offset: int, length: int) -> dict:
+        if shard not in self.shard_files:
+            self.shard_files[shard] = open(os.path.join(self.store_dir, shard), 'rb')
+        f = self.shard_files[shard]
+        f.seek(offset)
+        return json.loads(_decompress(f.read(length), _codec(shard)))
+
+    def get(self, name: str) -> Optional[dict]:
+        """LaTeX sources of one paper, by id or by `{paper_id}.json` name."""
+        shard, offset, length = self.index[_paper_id(name)]
+        return self._read_frame(shard, offset, length)['files']
+
+    def scan_shard(self, shard: str) -> Iterator[tuple[str, Optional[dict]]]:
+        """Read one shard front to back, in the order the papers were written."""
+        codec = _codec(shard)
+        frames = sorted((offset, length, paper_id) for paper_id, (s, offset, length) in self.index.items() if s == shard)
+        with open(os.path.join(self.store_dir, shard), 'rb') as f:
+            position = 0
+            for offset, length, paper_id in frames:
+                if offset != position:
+                    f.seek(offset)  # Skip overwritten copies and torn frames
+                record = json.loads(_decompress(f.read(length), codec))
+                position = offset + length
+                yield f'{paper_id}.json', record['files']
+
+    def scan(self) -> Iterator[tuple[str, Optional[dict]]]:
+        """Every paper as `(paper_name, tex_data)`, shard by shard."""
+        for shard in self.shards():
+            yield from self.scan_shard(shard)
+
+    def close(self):
+        for f in self.shard_files.values():
+            f.close()
+        self.shard_files = {}
+
+
+class PaperStoreWriter:
+    """
+    Append papers to a store. Every paper is flushed to its shard before its
+    index line is written, so a crash loses at most the paper being written.
+    Reopening a store starts a new shard instead of touching the old ones.
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR, papers_per_shard: int = PAPERS_PER_SHARD, codec: Optional[str] = None):
+        self.store_dir = store_dir
+        self.papers_per_shard = papers_per_shard
+        self.codec = codec or ('zst' if zstandard is not None else 'gz')
+        os.makedirs(store_dir, exist_ok=True)
+        existing = [f for f in os.listdir(store_dir) if f.startswith('papers-')]
+        self.shard_number = len(existing)
+        self.shard_file = None
+        self.shard_count = 0
+        self.index_writer = open(os.path.join(store_dir, INDEX_FILE), 'a', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _next_shard(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+        self.shard = f'papers-{self.shard_number:05d}.jsonl.{self.codec}'
+        self.shard_number += 1
+        self.shard_file = open(os.path.join(self.store_dir, self.shard), 'ab')
+        self.shard_count = 0
+
+    def add(self, name: str, tex_data: Optional[dict]):
+        if self.shard_file is None or self.shard_count >= self.papers_per_shard:
+            self._next_shard()
+        paper_id = _paper_id(name)
+        line = json.dumps({"id": paper_id, "files": tex_data}, ensure_ascii=False) + '\n'
+        frame = _compress(line.encode('utf-8'), self.codec)
+        offset = self.shard_file.tell()
+        self.shard_file.write(frame)
+        self.shard_file.flush()
+        self.index_writer.write(f'{paper_id}\t{self.shard}\t{offset}\t{len(frame)}\n')
+        self.index_writer.flush()
+        self.shard_count += 1
+
+    def close(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+        self.index_writer.close()
+
+
+_open_stores = {}
+
+def open_paper_store(store_dir: str) -> PaperStore:
+    """Cached reader, so per-paper lookups do not reload the index."""
+    # Keyed by process too, forked workers must not share the seek position of open shards
+    key = (os.getpid(), store_dir)
+    if key not in _open_stores:
+        _open_stores[key] = PaperStore(store_dir)
+    return _open_stores[key]
+
+
+def migrate_papers_folder(papers_folder: str, store_dir: str = STORE_DIR, papers_per_shard: int = PAPERS_PER_SHARD,
+                          progress=None) -> int:
+    """Copy a data/final style folder into a store, skipping papers already in it. Returns the number of papers added."""
+    done = set(PaperStore(store_dir).index) if is_paper_store(store_dir) else set()
+    added = 0
+    with PaperStoreWriter(store_dir, papers_per_shard) as writer:
+        for filename in sorted(f for f in os.listdir(papers_folder) if f.endswith('.json')):
+            if _paper_id(filename) not in done:
+                with open(os.path.join(papers_folder, filename), 'r', encoding='utf-8') as f:
+                    writer.add(filename, json.load(f))
+                added += 1
+            if progress is not None:
+                progress.update(1)
+    return added
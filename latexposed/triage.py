@@ -0,0 +1,135 @@
+"""
+Cheap triage in front of the LLM entity extraction.
+
+Most papers end up `none`, so only papers that look suspicious to local
+signals are worth a request. Each signal present in the text adds its weight
+to the paper's score, whatever its number of matches:
+
+- the custom regexes of `patterns.all_search_patterns` and the IP patterns,
+- any hit of the secrets-patterns-db scanner (high confidence by default),
+- keyword lexicons for the five LLM labels, e.g. reviewer and rebuttal
+  language for `peerreview` or disagreement for `conflict`.
+
+Papers scoring at least the threshold go to the LLM, the others are recorded
+as `none` without a request. scripts/bench_triage.py measures the recall and
+the share of requests saved per threshold on LLM-SecDB.json.
+"""
+
+import re
+from typing import Iterable, Optional
+
+from latexposed.patterns import internal_ip_pattern, ip_pattern, search_patterns
+
+
+# Default cut-off, a single lexicon or strong pattern hit is enough
+TRIAGE_THRESHOLD = 1.0
+
+# Weights of the pattern signals, the generic ones also match hashes, numbers and identifiers
+PATTERN_WEIGHTS = {
+    'ibans': 1.0,
+    'bank_accounts': 0.5,
+    'ssh_private_keys': 2.0,
+    'api_keys': 0.5,
+    'emails': 1.5,
+    'aws_access_keys': 2.0,
+    'aws_secret_keys': 0.5,
+    'credit_cards': 1.5,
+    'us_ssns': 1.0,
+    'jwt_tokens': 2.0,
+    'google_api_keys': 2.0,
+    'github_tokens': 2.0,
+    'slack_tokens': 2.0,
+    'phone_numbers': 0.25,
+}
+IP_WEIGHT = 1.0
+INTERNAL_IP_WEIGHT = 0.5  # On top of IP_WEIGHT
+SECRETS_WEIGHT = 2.0
+
+# Generic vocabulary of each label. No phrase is taken from LLM-SecDB.json, the
+# recall of scripts/bench_triage.py is measured on it
+LEXICONS = {
+    'credentials': (1.5, [
+        r'pass(?:word|wd|phrase)?\s*[:=]', r'passwords?', r'pwd', r'secret', r'tokens?', r'api[ _-]?keys?',
+        r'private[ _-]?key', r'credentials?', r'cvv', r'cvc', r'card[ -]?(?:number|holder|not[ -]present)',
+        r'expiry', r'connection string', r'jdbc:', r'bearer', r'sk_live_\w*', r'\w+://[^\s/:@]+:[^\s/@]+@',
+    ]),
+    'network_identifiers': (1.0, [
+        r'user(?:name|[ _-]?id)?\s*[:=]', r'usernames?', r'user\s+[\'"]?[\w.-]+[\'"]?\s+from', r'hostnames?',
+        r'host\s*[:=]', r'server\s*[:=]', r'ssh', r'log(?:on|in)', r'account(?: name)?\s*[:=]', r'port\s*[:=]?\s*\d+',
+        r'mac address', r'workstation', r'vpn', r'localhost', r'gateway',
+    ]),
+    'pii': (1.0, [
+        r'e-?mail', r'phone', r'tel\s*[:.]', r'mobile', r'home address', r'address\s*:', r'date of birth', r'dob',
+        r'passport', r'social security', r'ssn', r'from:\s*"?[A-Z][a-z]+',
+    ]),
+    'peerreview': (1.5, [
+        r'reviewers?(?:\s*#?\s*\d)?', r're-?review', r'rebuttal', r'meta-?review', r'camera[ -]?ready', r'area chair',
+        r'\bAC\b', r'\bR[1-4]\b', r'referees?', r'response to (?:the )?reviewers', r'(?:major|minor) revision',
+        r'reject(?:ed|ion)?', r'accept(?:ed|ance)? (?:the )?paper',
+    ]),
+    'conflict': (1.0, [
+        r'disagree(?:ment)?', r'(?:do not|don\'t|don’t|doesn\'t|doesn’t) (?:agree|match)', r'argues?', r'prefers?',
+        r'objections?', r'not convinced', r'frustrat(?:ed|ing)', r'why (?:did|do|is) (?:you|it|this)', r'wrong',
+        r'not acceptable', r'unacceptable', r'@[A-Z][a-z]+', r'!{2,}', r'\?{2,}', r'fix (?:this|it)',
+        r'(?:cut|delete) (?:it|this)', r'makes? no sense', r'a (?:mess|disaster)', r'contradicts?',
+        r'inconsisten(?:cy|t)', r'needs? correction',
+    ]),
+}
+
+
+def _lexicon_regex(words: list[str]) -> re.Pattern:
+    # Merged comments are often glued to the text before them ("ItReviewer 2"), so only
+    # the short keywords, which also occur inside ordinary words, need a left boundary
+    return re.compile('|'.join(f'(?<![A-Za-z]){word}' if len(word) <= 4 and word[0].isalnum() else word
+                               for word in words), re.IGNORECASE)
+
+LEXICON_PATTERNS = {label: (weight, _lexicon_regex(words)) for label, (weight, words) in LEXICONS.items()}
+
+
+class TriageScorer:
+    """Scores a paper's comments from the local signals, `scanner` is an optional `SecretsScanner`."""
+
+    def __init__(self, scanner=None, threshold: float = TRIAGE_THRESHOLD):
+        self.scanner = scanner
+        self.threshold = threshold
+        self.scored = 0
+        self.passed = 0
+
+    def signals(self, text: str, patterns: Optional[dict] = None, secrets: Optional[Iterable] = None) -> dict[str, float]:
+        """Weight of every signal present. The `patterns` and `secrets` found by the miner are reused when given."""
+        found = {}
+        if patterns is None:
+            patterns = search_patterns(text)
+        for key in patterns:
+            found[f'pattern:{key}'] = PATTERN_WEIGHTS.get(key, 1.0)
+        if ip_pattern.search(text):
+            found['ip'] = IP_WEIGHT
+            if internal_ip_pattern.search(text):
+                found['internal_ip'] = INTERNAL_IP_WEIGHT
+        if secrets is None and self.scanner is not None:
+            secrets = self.scanner.finditer(text)
+        if secrets is not None and any(True for _ in secrets):
+            found['secrets'] = SECRETS_WEIGHT
+        for label, (weight, regex) in LEXICON_PATTERNS.items():
+            if regex.search(text):
+                found[f'lexicon:{label}'] = weight
+        return found
+
+    def score(self, text: str, patterns: Optional[dict] = None, secrets: Optional[Iterable] = None) -> float:
+        return sum(self.signals(text, patterns, secrets).values())
+
+    def check(self, text: str, patterns: Optional[dict] = None, secrets: Optional[Iterable] = None) -> tuple[bool, float]:
+        """`(send to the LLM, score)`, counted in the pass rate."""
+        score = self.score(text, patterns, secrets)
+        self.scored += 1
+        if score >= self.threshold:
+            self.passed += 1
+            return True, score
+        return False, score
+
+    def stats(self) -> dict:
+        return {
+            'scored': self.scored,
+            'passed': self.passed,
+            'pass_rate': round(self.passed / self.scored, 3) if self.scored else 0.0,
+        }
@@ -0,0 +1,153 @@
+"""
+Check the single-pass LaTeX comment tokenizer against golden outputs and
+benchmark it against the per-character line scanner of 2_parse.ipynb.
+
+Usage (from the repository root):
+  python scripts/bench_comment_tokenizer.py --files 2000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.comments import extract_latex_comments, tokenize_latex_comments  # noqa: E402
+
+
+def legacy_extract_latex_comment_lines(latex_code: str) -> list:
+    """The original implementation from 2_parse.ipynb."""
+    lines = latex_code.splitlines()
+    in_verbatim = False
+    comments = []
+
+    verbatim_start = re.compile(r'\\begin\{(verbatim|lstlisting|Verbatim)\}')
+    verbatim_end = re.compile(r'\\end\{(verbatim|lstlisting|Verbatim)\}')
+
+    for line in lines:
+        stripped_line = line.strip()
+        if verbatim_start.search(stripped_line):
+            in_verbatim = True
+        if verbatim_end.search(stripped_line):
+            in_verbatim = False
+            continue
+        if in_verbatim:
+            continue
+        i = 0
+        while i < len(line):
+            if line[i] == '%':
+                if i > 0 and line[i - 1] == '\\':
+                    i += 1
+                    continue
+                comments.append(line[i+1:].strip())
+                break
+            i += 1
+
+    return comments
+
+def legacy_extract_latex_comments(latex_code: str) -> list:
+    matches = re.findall(r'\\begin\{comment\}(.*?)\\end\{comment\}', latex_code, re.DOTALL | re.IGNORECASE)
+    blocks = [match.strip() for match in matches if match.strip()]
+    comments = legacy_extract_latex_comment_lines(latex_code) + blocks
+    return [comment for comment in comments if comment.strip()]
+
+
+# (source, expected extract_latex_comments output)
+GOLDEN = [
+    ('no comments here', []),
+    ('% whole line', ['whole line']),
+    ('text % trailing\nnext', ['trailing']),
+    ('50\\% done', []),
+    ('50\\% done % but this is', ['but this is']),
+    ('line break \\\\% real comment', ['real comment']),
+    ('\\\\\\% escaped again', []),
+    ('%%%% separator %%%%', ['%%% separator %%%%']),
+    ('a %first % second', ['first % second']),
+    ('\\verb|50%| of it % note', ['note']),
+    ('\\verb*+%+ and \\lstinline!%! % after', ['after']),
+    ('\\begin{verbatim}\n% not a comment\n\\end{verbatim} % after end', ['after end']),
+    ('\\begin{lstlisting}[language=Python]\nx = 5 % 3\n\\end{lstlisting}', []),
+    ('\\begin{minted}{matlab}\n% matlab comment\n\\end{minted}\n% real', ['real']),
+    ('\\begin{Verbatim*}\n%\n\\end{Verbatim*}', []),
+    ('% \\begin{verbatim}\n% still a comment\n% \\end{verbatim}', ['\\begin{verbatim}', 'still a comment', '\\end{verbatim}']),
+    ('before\n\\begin{comment}\nhidden text\n% inner\n\\end{comment}\n% after', ['after', 'hidden text\n% inner']),
+    ('\\begin{comment}\n\n\\end{comment}', []),
+    ('\\begin{comment} never closed', ['never closed']),
+    ('\\begin{Comment}\nsecret\n\\end{Comment}\n% after', ['after', 'secret']),
+    ('\\begin{COMMENT} mixed \\end{comment} % after', ['after', 'mixed']),
+    ('% café ünïcode\r\n% second', ['café ünïcode', 'second']),
+    ('%\n%   \n', []),
+]
+
+TOKEN_GOLDEN = [
+    # (source, [(kind, text, line, start, end, byte_start, byte_end)])
+    ('a\n% x\n\\begin{comment}y\\end{comment}', [
+        ('line', ' x', 2, 2, 5, 2, 5),
+        ('block', 'y', 3, 21, 22, 21, 22),
+    ]),
+    ('é % ü', [('line', ' ü', 1, 2, 5, 3, 7)]),
+]
+
+
+def check_golden():
+    for source, expected in GOLDEN:
+        actual = extract_latex_comments(source)
+        assert actual == expected, f'{source!r}: expected {expected!r}, got {actual!r}'
+    for source, expected in TOKEN_GOLDEN:
+        actual = [tuple(token) for token in tokenize_latex_comments(source)]
+        assert actual == expected, f'{source!r}: expected {expected!r}, got {actual!r}'
+        encoded = source.encode('utf-8')
+        for token in tokenize_latex_comments(source):
+            assert encoded[token.byte_start:token.byte_end].decode('utf-8') == source[token.start:token.end]
+    print(f'Golden outputs: {len(GOLDEN) + len(TOKEN_GOLDEN)} cases passed')
+
+
+def synthetic_file(lines: int) -> str:
+    body = []
+    for _ in range(lines):
+        r = random.random()
+        if r < 0.15:
+            body.append('% ' + 'commented out text ' * random.randint(1, 5))
+        elif r < 0.25:
+            body.append('We reach 95\\% accuracy \\cite{x} % TODO check the number')
+        elif r < 0.27:
+            body.append('\\begin{verbatim}\nx = 5 % 2\n\\end{verbatim}')
+        elif r < 0.28:
+            body.append('\\begin{comment}\nold paragraph\n\\end{comment}')
+        else:
+            body.append('Lorem ipsum dolor sit amet, $x^2 + y^2 = z^2$, consectetur adipiscing elit \\textbf{bold}.')
+    return '\n'.join(body)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark the LaTeX comment tokenizer.')
+    ap.add_argument('--files', type=int, default=2000, help='Number of synthetic .tex files.')
+    ap.add_argument('--lines', type=int, default=300, help='Lines per file.')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    check_golden()
+
+    random.seed(args.seed)
+    corpus = [synthetic_file(args.lines) for _ in range(args.files)]
+    size_mb = sum(len(f) for f in corpus) / 1e6
+
+    start = time.perf_counter()
+    for latex_code in corpus:
+        legacy_extract_latex_comments(latex_code)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for latex_code in corpus:
+        extract_latex_comments(latex_code)
+    tokenizer_time = time.perf_counter() - start
+
+    print(f'line scanner: {args.files / legacy_time:9.1f} files/s {size_mb / legacy_time:6.1f} MB/s')
+    print(f'tokenizer:    {args.files / tokenizer_time:9.1f} files/s {size_mb / tokenizer_time:6.1f} MB/s '
+          f'({legacy_time / tokenizer_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
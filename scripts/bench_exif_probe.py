@@ -0,0 +1,178 @@
+"""
+Compare the header-only EXIF probe of `latexposed.exif` with PIL on a folder
+of images: time per image, the images the probe hands over to PIL, and the
+images on which both disagree about GPS, device, time taken or software.
+
+Without a folder of real images, `--synthetic N` writes N mixed JPEGs and PNGs
+(with and without EXIF and GPS, some large) to a temporary folder first.
+
+Usage (from the repository root, needs `pip install pillow`):
+  python scripts/bench_exif_probe.py [--images data/filtered_archives] [--synthetic 300] [--repeat 3]
+"""
+
+import argparse
+import gzip
+import io
+import math
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import time
+
+from PIL import Image, PngImagePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.exif import gps_decimal, pil_exif, probe_exif  # noqa: E402
+from latexposed.logical_filter import FILTERED_ARCHIVES_DIR, IMAGE_EXTENSIONS, filter_paper  # noqa: E402
+
+
+FIELDS = ['Make', 'Model', 'DateTime', 'DateTimeOriginal', 'Software']
+GPS = {1: 'S', 2: (33.0, 52.0, 4.5), 3: 'E', 4: (151.0, 12.0, 36.0)}
+
+
+def make_image(fmt: str, size: tuple[int, int], exif: bool, gps: bool, make: str = 'Canon') -> bytes:
+    img = Image.effect_noise(size, 64).convert('RGB')
+    info = Image.Exif()
+    if exif:
+        info[0x010f], info[0x0110], info[0x0131], info[0x0132] = make, 'EOS 5D', 'GIMP 2.10', '2021:03:04 05:06:07'
+        info.get_ifd(0x8769)[0x9003] = '2021:03:04 05:06:07'
+    if gps:
+        info[0x8825] = GPS
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, exif=info.tobytes() if exif or gps else b'')
+    return buffer.getvalue()
+
+def make_raw_profile_png(compressed: bool) -> bytes:
+    """A PNG with its EXIF in a "Raw profile type exif" text chunk, as ImageMagick writes it."""
+    info = Image.Exif()
+    info[0x8825] = GPS
+    profile = info.tobytes().hex()
+    text = f'\nexif\n{len(profile) // 2:8d}\n' + '\n'.join(profile[i:i + 72] for i in range(0, len(profile), 72)) + '\n'
+    png_info = PngImagePlugin.PngInfo()
+    png_info.add_text('Raw profile type exif', text, zip=compressed)
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32)).save(buffer, 'PNG', pnginfo=png_info)
+    return buffer.getvalue()
+
+GOLDEN = [
+    # (format, exif, gps, expected decimal position)
+    ('JPEG', True, True, (-33.867917, 151.21)),
+    ('JPEG', True, False, None),
+    ('JPEG', False, False, None),
+    ('PNG', True, True, (-33.867917, 151.21)),
+    ('PNG', False, False, None),
+]
+
+
+def check_golden():
+    for fmt, exif, gps, position in GOLDEN:
+        head, probed = probe_exif(io.BytesIO(make_image(fmt, (32, 32), exif, gps)))
+        assert probed is not None, f'{fmt} exif={exif} gps={gps}: probe failed'
+        assert ('GPSInfo' in probed) == gps, f'{fmt} exif={exif} gps={gps}: {probed}'
+        found = gps_decimal(probed)
+        assert (found is None) == (position is None) and (found is None or all(
+            math.isclose(a, b, abs_tol=1e-5) for a, b in zip(found, position))), f'{fmt} position {found} != {position}'
+        if exif:
+            assert probed['Make'] == 'Canon' and probed['DateTimeOriginal'] == '2021:03:04 05:06:07', probed
+    _, probed = probe_exif(io.BytesIO(make_image('JPEG', (32, 32), True, True)[:40]))
+    assert probed is None, 'a truncated header must go to PIL'
+    for compressed in (False, True):
+        image = make_raw_profile_png(compressed)
+        _, probed = probe_exif(io.BytesIO(image))
+        assert probed is not None and 'GPSInfo' in probed, f'raw profile PNG (compressed={compressed}): {probed}'
+        assert 'GPSInfo' in pil_exif(io.BytesIO(image)), 'PIL reads the raw profile too'
+    webp = make_image('WEBP', (32, 32), True, True)
+    assert probe_exif(io.BytesIO(webp))[1] is None, 'a WebP must go to PIL'
+    assert 'GPSInfo' in pil_exif(io.BytesIO(webp))
+
+
+def check_filter():
+    """The logical filter keeps the images with GPS the probe cannot read, or finds in a text chunk."""
+    files = {'webp.jpg': make_image('WEBP', (32, 32), True, True), 'raw.png': make_raw_profile_png(True),
+             'plain.jpg': make_image('JPEG', (32, 32), True, False), 'junk.jpg': b'not an image'}
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, data in files.items():
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+    with tempfile.TemporaryDirectory() as dest:
+        filter_paper(io.BytesIO(gzip.compress(buffer.getvalue())), 'paper', dest)
+        kept = sorted(os.listdir(os.path.join(dest, 'paper')))
+    assert kept == ['raw.png', 'webp.jpg'], kept
+
+
+def write_synthetic(folder: str, count: int):
+    rng = random.Random(0)
+    for i in range(count):
+        fmt = rng.choice(['JPEG', 'JPEG', 'PNG'])
+        size = rng.choice([(64, 64), (640, 480), (2000, 1500)])
+        exif = rng.random() < 0.6
+        gps = exif and rng.random() < 0.2
+        with open(os.path.join(folder, f'{i:04d}.{"jpg" if fmt == "JPEG" else "png"}'), 'wb') as f:
+            f.write(make_image(fmt, size, exif, gps))
+
+
+def find_images(folder: str) -> list[str]:
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(folder)
+                  for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def summary(exif: dict) -> tuple:
+    position = gps_decimal(exif)
+    return ('GPSInfo' in exif, position and tuple(round(v, 5) for v in position),
+            *(str(exif.get(field) or '').strip() for field in FIELDS))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Header-only EXIF probe against PIL.')
+    ap.add_argument('--images', default=FILTERED_ARCHIVES_DIR)
+    ap.add_argument('--synthetic', type=int, default=0, help='Benchmark this many generated images instead.')
+    ap.add_argument('--repeat', type=int, default=1)
+    args = ap.parse_args()
+
+    check_golden()
+    check_filter()
+    print('golden cases passed')
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            write_synthetic(tmp, args.synthetic)
+            args.images = tmp
+        images = find_images(args.images)
+        if not images:
+            sys.exit(f'No images in {args.images}, use --synthetic')
+        size = sum(os.path.getsize(path) for path in images) / 1e6
+        print(f'{len(images)} images ({size:.1f} MB) in {args.images}')
+
+        probed, fallbacks, bytes_read = {}, 0, 0
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for path in images:
+                with open(path, 'rb') as f:
+                    head, exif = probe_exif(f)
+                bytes_read += len(head)
+                if exif is None:
+                    fallbacks += 1
+                    exif = pil_exif(path)
+                probed[path] = exif
+        probe_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pil = {path: pil_exif(path) for path in images}
+        pil_seconds = time.perf_counter() - start
+
+    runs = len(images) * args.repeat
+    print(f'  probe: {probe_seconds / runs * 1e6:8.1f} us/image, {bytes_read / runs / 1024:.1f} KB read/image, '
+          f'{fallbacks // args.repeat} images on PIL')
+    print(f'    PIL: {pil_seconds / runs * 1e6:8.1f} us/image   speedup {pil_seconds / probe_seconds:.1f}x')
+    differ = [path for path in images if summary(probed[path]) != summary(pil[path])]
+    print(f'  images with GPS: {sum("GPSInfo" in exif for exif in pil.values())}, differing from PIL: {len(differ)}')
+    for path in differ[:5]:
+        print(f'    {path}: probe {summary(probed[path])} PIL {summary(pil[path])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare batch sizes for the LLM entity extraction on LLM-SecDB.json: how many
+input tokens packing K comments per request saves, and what it costs in
+accuracy against the ground truth and agreement with the one-comment run.
+Run it once per model to pick its BATCH_SIZE.
+
+Usage (from the repository root):
+  python scripts/bench_llm_batching.py --model openai/gpt-oss-20b --api-key $KEY --sizes 1 5 10 20
+  # or offline, against `python scripts/mock_llm_server.py --port 8008 --rps 0 --latency 0.05`
+  python scripts/bench_llm_batching.py --base-url http://127.0.0.1:8008/v1 --api-key mock --limit 100
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.llm import (  # noqa: E402
+    LLM_PROVIDER, MODEL_NAME, SYSTEM_PROMPT_FILE, TEMPERATURE,
+    iter_input_any, load_system_prompt, parse_ground_truth_labels, parse_labels_from_xml,
+)
+from latexposed.llm_async import AdaptiveLimiter, classify_comments  # noqa: E402
+
+
+def run(records: list[dict], system_prompt: str, batch_size: int, args) -> dict:
+    limiter = AdaptiveLimiter(initial=args.concurrency)
+    start = time.perf_counter()
+    answers = classify_comments(
+        ((i, rec['comments']) for i, rec in enumerate(records)), system_prompt,
+        model=args.model, base_url=args.base_url, api_key=args.api_key, temperature=args.temperature,
+        limiter=limiter, batch_size=batch_size,
+    )
+    predictions = {i: set(parse_labels_from_xml(xml)) if xml else None for i, (xml, _) in answers.items()}
+    truth = [set(parse_ground_truth_labels(rec)) for rec in records]
+    exact = sum(predictions[i] == truth[i] for i in range(len(records)))
+    hit = sum(bool(predictions[i] & truth[i]) or (predictions[i] == truth[i] == set())
+              for i in range(len(records)) if predictions[i] is not None)
+    return {
+        'batch_size': batch_size,
+        'seconds': time.perf_counter() - start,
+        'requests': limiter.completed,
+        'prompt_tokens': limiter.usage.prompt_tokens,
+        'cached_tokens': limiter.usage.cached_tokens,
+        'completion_tokens': limiter.usage.completion_tokens,
+        'fallbacks': limiter.fallbacks,
+        'errors': sum(1 for p in predictions.values() if p is None),
+        'exact': exact / len(records),
+        'hit': hit / len(records),
+        'predictions': predictions,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Token savings and accuracy of batched LLM classification.')
+    ap.add_argument('--input', default='LLM-SecDB.json')
+    ap.add_argument('--system-prompt', default=SYSTEM_PROMPT_FILE)
+    ap.add_argument('--base-url', default=LLM_PROVIDER)
+    ap.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY'))
+    ap.add_argument('--model', default=MODEL_NAME)
+    ap.add_argument('--temperature', type=float, default=TEMPERATURE)
+    ap.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 10, 20], help='Batch sizes, 1 is the baseline.')
+    ap.add_argument('--limit', type=int, default=None, help='Only the first N records.')
+    ap.add_argument('--concurrency', type=int, default=8, help='Initial concurrency of the async engine.')
+    args = ap.parse_args()
+
+    records = [rec for rec in itertools.islice(iter_input_any(args.input), args.limit)
+               if isinstance(rec.get('comments'), str) and rec['comments'].strip()]
+    system_prompt = load_system_prompt(args.system_prompt)
+    sizes = sorted(set([1] + args.sizes))
+    print(f'{len(records)} comments, model {args.model}, batch sizes {sizes}')
+
+    runs = [run(records, system_prompt, k, args) for k in sizes]
+    baseline = runs[0]
+    print(f"{'K':>4} {'requests':>9} {'prompt tok':>11} {'cached':>9} {'compl tok':>10} {'tok/item':>9} {'saved':>7} "
+          f"{'fallback':>9} {'errors':>7} {'exact':>7} {'d exact':>8} {'hit':>7} {'agree':>7} {'sec':>7}")
+    for r in runs:
+        tokens = r['prompt_tokens'] + r['completion_tokens']
+        base_tokens = baseline['prompt_tokens'] + baseline['completion_tokens']
+        agree = sum(r['predictions'][i] == baseline['predictions'][i] for i in range(len(records))) / len(records)
+        print(f"{r['batch_size']:>4} {r['requests']:>9} {r['prompt_tokens']:>11} {r['cached_tokens']:>9} {r['completion_tokens']:>10} "
+              f"{tokens / len(records):>9.1f} {1 - tokens / max(base_tokens, 1):>7.1%} "
+              f"{r['fallbacks']:>9} {r['errors']:>7} {r['exact']:>7.3f} {r['exact'] - baseline['exact']:>+8.3f} "
+              f"{r['hit']:>7.3f} {agree:>7.1%} {r['seconds']:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
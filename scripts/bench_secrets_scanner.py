@@ -0,0 +1,120 @@
+"""
+Benchmark the compiled secrets-patterns-db scanner against the sequential
+`re.search` loop of 3_mine_pattern-matching.ipynb on a synthetic corpus.
+
+Usage (from the repository root):
+  python scripts/bench_secrets_scanner.py --papers 300
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.secrets_db import SECRETS_DB, SecretsScanner  # noqa: E402
+
+
+FILLER = [
+    'TODO: rewrite this paragraph before the camera ready',
+    '\\includegraphics[width=0.5\\textwidth]{figures/results.pdf}',
+    'This is file `sample-acmsmall.tex\', generated with the docstrip utility.',
+    'we should cite the follow-up work here, see \\cite{smith2020}',
+    '\\usepackage{amsmath,amssymb} % math',
+    'Old version of the proof, kept for reference: $\\sum_{i=1}^n x_i \\leq C$',
+    '\\begin{table}[t] \\centering \\caption{Ablation results on the validation set}',
+    'Reviewer 2 asked for more baselines, add them in the appendix',
+    'see https://github.com/example/project for the code',
+    '--- end of section ---',
+]
+
+
+def random_token(alphabet: str, length: int) -> str:
+    return ''.join(random.choice(alphabet) for _ in range(length))
+
+
+SECRETS = [
+    lambda: 'AKIA' + random_token(string.ascii_uppercase + string.digits, 16),
+    lambda: 'ghp_' + random_token(string.ascii_letters + string.digits, 36),
+    lambda: 'xoxb-' + random_token(string.digits, 12) + '-' + random_token(string.ascii_letters, 24),
+    lambda: 'mysql_password=' + random_token(string.ascii_letters, 12),
+    lambda: 'AIza' + random_token(string.ascii_letters + string.digits + '-_', 35),
+    lambda: 'sk_live_' + random_token(string.ascii_letters + string.digits, 24),
+]
+
+
+def synthetic_corpus(papers: int, comments_per_paper: int, secret_rate: float) -> list[str]:
+    corpus = []
+    for _ in range(papers):
+        lines = [random.choice(FILLER) for _ in range(comments_per_paper)]
+        if random.random() < secret_rate:
+            lines.insert(random.randrange(len(lines)), f'key: {random.choice(SECRETS)()}')
+        corpus.append('\n'.join(lines))
+    return corpus
+
+
+def scan_sequential(corpus: list[str], sdb_patterns: list[dict]) -> set[tuple[int, str]]:
+    """The original notebook loop, first match of every non-low pattern."""
+    hits = set()
+    for i, comment in enumerate(corpus):
+        for pattern in sdb_patterns:
+            p = pattern['pattern']
+            if p['confidence'] != 'low':
+                if re.search(p['regex'], comment):
+                    hits.add((i, p['name']))
+    return hits
+
+
+def scan_compiled(corpus: list[str], scanner: SecretsScanner) -> set[tuple[int, str]]:
+    hits = set()
+    for i, comment in enumerate(corpus):
+        for match in scanner.finditer(comment):
+            hits.add((i, match.name))
+    return hits
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark the compiled secrets-patterns-db scanner.')
+    ap.add_argument('--papers', type=int, default=300, help='Number of synthetic papers.')
+    ap.add_argument('--comments', type=int, default=40, help='Comment lines per paper.')
+    ap.add_argument('--secret-rate', type=float, default=0.2, help='Fraction of papers with an injected secret.')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    corpus = synthetic_corpus(args.papers, args.comments, args.secret_rate)
+
+    with open(SECRETS_DB, 'r', encoding='utf-8') as f:
+        sdb_patterns = yaml.safe_load(f)['patterns']
+
+    start = time.perf_counter()
+    scanner = SecretsScanner.from_yaml(SECRETS_DB)
+    build_time = time.perf_counter() - start
+    print(f'Compiled {len(scanner)} patterns in {build_time:.2f}s '
+          f'({len(scanner.unanchored)} without a literal anchor)')
+
+    start = time.perf_counter()
+    before = scan_sequential(corpus, sdb_patterns)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    after = scan_compiled(corpus, scanner)
+    compiled_time = time.perf_counter() - start
+
+    print(f'sequential re.search: {args.papers / sequential_time:10.1f} papers/s')
+    print(f'compiled scanner:     {args.papers / compiled_time:10.1f} papers/s '
+          f'({sequential_time / compiled_time:.1f}x)')
+
+    missing = before - after
+    print(f'(paper, pattern) hits: sequential={len(before)} compiled={len(after)} missing={len(missing)}')
+    if missing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
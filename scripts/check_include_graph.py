@@ -0,0 +1,112 @@
+"""
+Check the include graph of `latexposed.include_graph` on golden papers, next
+to the basename matching it replaces in 3_mine_logical-filter.ipynb, and time
+it on a folder of extracted papers (one sub-folder per paper) if given.
+
+Usage (from the repository root):
+  python scripts/check_include_graph.py [--papers data/extracted_papers]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.include_graph import build_include_graph  # noqa: E402
+
+
+GOLDEN = [
+    # (files, unreferenced files, referenced graphics)
+    ({'main.tex': '\\documentclass{article}\\graphicspath{{figs/}}\\begin{document}\\includegraphics[width=3cm]{plot}\\end{document}',
+      'figs/plot.pdf': '', 'figs/unused.png': ''},
+     {'figs/unused.png'}, {'figs/plot.pdf'}),
+    ({'main.tex': '\\documentclass{article}\n50\\% of \\includegraphics{a.png} % \\includegraphics{b.png}\n',
+      'a.png': '', 'b.png': ''},
+     {'b.png'}, {'a.png'}),
+    ({'main.tex': '\\documentclass{article}\\input{sections/intro}\\include{appendix}\\bibliography{refs,extra}',
+      'sections/intro.tex': '\\includegraphics{img/fig1}\\lstinputlisting{code/run.py}', 'appendix.tex': '',
+      'img/fig1.JPG': '', 'code/run.py': '', 'code/secret.py': '', 'refs.bib': '', 'extra.bib': '', 'main.bbl': '',
+      'notes.txt': ''},
+     {'code/secret.py', 'notes.txt'}, {'img/fig1.JPG'}),
+    ({'main.tex': '\\documentclass{mystyle}\\usepackage{local,amsmath}\\subimport{chap/}{one}',
+      'mystyle.cls': '', 'local.sty': '', 'chap/one.tex': '\\includegraphics{pic}', 'chap/pic.png': '', 'other.eps': ''},
+     {'other.eps'}, {'chap/pic.png'}),
+    ({'paper': '\\documentclass{article}\\input body.inc \\epsfig{file=old.eps,width=2in}',
+      'body.inc': '\\includepdf[pages=-]{supp}', 'supp.pdf': '', 'old.eps': '', 'draft.pdf': ''},
+     {'draft.pdf'}, {'supp.pdf', 'old.eps'}),
+]
+
+INCLUDEGRAPHICS_PATTERN = re.compile(r'\\includegraphics(?:\[[^\]]*\])?\{([^}]+)\}')
+INCLUDEPDF_PATTERN = re.compile(r'\\includepdf(?:\[[^\]]*\])?\{([^}]+)\}')
+LEGACY_EXTENSIONS = ['.pdf', '.png', '.jpg', '.jpeg', '.gif']
+
+
+def legacy_referenced(root: str) -> set[str]:
+    """The referenced images and PDFs as process_gz_file removed them before."""
+    referenced, files = set(), []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            files.append(os.path.relpath(path, root))
+            if filename.endswith('.tex'):
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    for line in f.read().splitlines():
+                        line = line.strip()
+                        if line.startswith('%'):
+                            continue
+                        line = line.split('%')[0]
+                        referenced.update(INCLUDEGRAPHICS_PATTERN.findall(line))
+                        referenced.update(INCLUDEPDF_PATTERN.findall(line))
+    names = {os.path.splitext(os.path.basename(m))[0].lower() for m in referenced}
+    return {path for path in files if os.path.splitext(path)[1].lower() in LEGACY_EXTENSIONS
+            and os.path.splitext(os.path.basename(path))[0].lower() in names}
+
+
+def write_paper(root: str, files: dict[str, str]):
+    for path, content in files.items():
+        os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(root, path), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Golden checks and timing of the include graph.')
+    ap.add_argument('--papers', help='Folder with one extracted paper per sub-folder.')
+    args = ap.parse_args()
+
+    for i, (files, expected, graphics) in enumerate(GOLDEN):
+        with tempfile.TemporaryDirectory() as root:
+            write_paper(root, files)
+            graph = build_include_graph(root)
+            found = graph.unreferenced()
+            assert found == expected, f'golden paper {i}: {sorted(found)} != {sorted(expected)}'
+            found = graph.referenced_graphics()
+            assert found == graphics, f'golden paper {i} graphics: {sorted(found)} != {sorted(graphics)}'
+            legacy = legacy_referenced(root)
+            print(f'paper {i}: {len(graph.referenced_graphics())} referenced graphics, basename matching found {len(legacy)}')
+    print('golden cases passed')
+
+    if args.papers:
+        papers = sorted(os.listdir(args.papers))
+        counts = {'referenced': 0, 'unreferenced': 0, 'unresolved': 0, 'legacy': 0}
+        graph_seconds = legacy_seconds = 0.0
+        for paper in papers:
+            root = os.path.join(args.papers, paper)
+            start = time.perf_counter()
+            graph = build_include_graph(root)
+            graph_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            counts['legacy'] += len(legacy_referenced(root))
+            legacy_seconds += time.perf_counter() - start
+            counts['referenced'] += len(graph.referenced_graphics())
+            counts['unreferenced'] += len(graph.unreferenced())
+            counts['unresolved'] += sum(len(targets) for targets in graph.unresolved.values())
+        print(f'{len(papers)} papers: include graph {graph_seconds:.2f}s, basename matching {legacy_seconds:.2f}s')
+        print(counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,69 @@
+import asyncio
 import json
+import os
+import sys
 
-import ollama
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.comment_index import CommentIndex  # noqa: E402
+from latexposed.local_llm import GenerationStats, generate_ordered, make_backend  # noqa: E402
+from latexposed.secrets_db import SECRETS_DB, SecretsScanner  # noqa: E402
+from latexposed.triage import TriageScorer  # noqa: E402
+
 
 MODEL = 'gpt-oss:20b'
+BACKEND = 'ollama'  # or 'openai' for llama.cpp's llama-server or vLLM, which batch the requests continuously
+OLLAMA_HOST = None  # default http://127.0.0.1:11434
+BASE_URL = 'http://127.0.0.1:8080/v1'  # 'openai' backend, llama-server's default port (vLLM uses 8000)
+# Requests in flight, match OLLAMA_NUM_PARALLEL or llama-server --parallel
+CONCURRENCY = 4
 COMMENTS_JSONL = 'paper_comments.jsonl'
 OUTPUT_JSONL = 'llm_classifications.jsonl'
-
-
-class PaperExtractedCommentIterator:
-    def __init__(self, comments_file: str):
-        self.comments_file = comments_file
-        # Count lines
-        with open(comments_file, 'r', encoding='utf-8') as f:
-            self.iteration_count = sum(1 for line in f)
-        self.current_paper_index = 0
-        self.file_reader = open(comments_file, 'r', encoding='utf-8')
-    
-    def __iter__(self):
-        return self
-    
-    def __len__(self):
-        return self.iteration_count
-
-    def __del__(self):
-        self.file_reader.close()
-
-    def __next__(self) -> tuple[int, dict[str, str]]:
-        if self.current_paper_index >= self.iteration_count:
-            self.file_reader.close()
-            raise StopIteration
-        content = self.current_paper_index, json.loads(self.file_reader.readline())
-        self.current_paper_index += 1
-        return content
+# e.g. 1.0 to only ask the model about papers with local signals, see scripts/bench_triage.py
+TRIAGE_THRESHOLD = None
 
 
 preprompt = None
 with open('preprompt.md', 'r', encoding='utf-8') as f:
     preprompt = f.read()
 
-def ask_local_llm(prompt : str) -> str:
-    response = ollama.chat(
-        model=MODEL,
-        messages=[
-            {
-                "role": "system",
-                "content": preprompt,
-            },
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-    )
-    return response["message"]["content"]
+triage = None
+if TRIAGE_THRESHOLD is not None:
+    secrets_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SECRETS_DB)
+    triage = TriageScorer(SecretsScanner.from_yaml(secrets_db), TRIAGE_THRESHOLD)
 
+def llm_items(paper_iterator):
+    # (record to write, prompt), papers without a prompt are passed through in order without a request
+    for index, comments in paper_iterator:
+        if comments['comments'] == '':
+            yield None, None
+        elif triage is not None and not triage.check(comments['comments'])[0]:
+            yield {"name": comments['name'], "response": "<xml>none</xml>", "triage_skipped": True}, None
+        else:
+            yield {"name": comments['name']}, comments['comments']
 
-paper_iterator = PaperExtractedCommentIterator(COMMENTS_JSONL)
-with tqdm(total=len(paper_iterator)) as pbar:
-    with open(OUTPUT_JSONL, 'w', encoding='utf-8') as out_file:
-        for index, comments in paper_iterator:
-            if comments['comments'] == '':
+async def classify_papers():
+    backend_options = {'base_url': BASE_URL} if BACKEND == 'openai' else {'host': OLLAMA_HOST}
+    backend = make_backend(BACKEND, MODEL, **backend_options)
+    stats = GenerationStats()
+    with CommentIndex(COMMENTS_JSONL) as paper_iterator, tqdm(total=len(paper_iterator)) as pbar:
+        with open(OUTPUT_JSONL, 'w', encoding='utf-8') as out_file:
+            # Answers arrive in the order of the comments file, whatever order the server finishes them in
+            async for record, response, error in generate_ordered(backend, llm_items(paper_iterator), preprompt, CONCURRENCY, stats):
+                if record is not None:
+                    if "response" not in record:
+                        record["response"] = response
+                    if error:
+                        record["error"] = error
+                    out_file.write(json.dumps(record) + "\n")
                 pbar.update(1)
-                continue
-            response = ask_local_llm(comments['comments'])
-            out_file.write(json.dumps({"name": comments['name'], "response": response}) + "\n")
-            out_file.flush()
-            pbar.update(1)
\ No newline at end of file
+                if pbar.n % 10 == 0:
+                    out_file.flush()
+                    pbar.set_postfix(stats.stats())
+    print('Local LLM:', stats.stats())
+
+asyncio.run(classify_papers())
+
+if triage is not None:
+    print('Triage:', triage.stats())
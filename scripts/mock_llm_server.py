@@ -0,0 +1,156 @@
+"""
+Local OpenAI-compatible mock server, to exercise the LLM clients without an
+inference provider. It answers /v1/chat/completions with a keyword based
+`<xml>...</xml>` classification, and enforces a requests-per-second limit
+with 429 responses carrying a Retry-After header, like a real provider.
+Batched prompts (`--- item N ---` blocks) get one `<answer id=N>` per item.
+The ollama /api/chat route is served too, for scripts/local_llm.py.
+A system message seen before is reported as cached prompt tokens, like the
+prefix caching of OpenAI, OpenRouter and vLLM.
+
+Usage (from the repository root):
+  python scripts/mock_llm_server.py --port 8008 --rps 20 --latency 0.2
+  # then point the client at base_url http://127.0.0.1:8008/v1 with any API key
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+KEYWORDS = {
+    "credentials": ("password", "api key", "apikey", "token", "secret", "ghp_"),
+    "network_identifiers": ("ssh ", "username", "hostname", "192.168.", "10.0."),
+    "pii": ("@gmail.com", "phone", "address"),
+    "peerreview": ("reviewer", "rebuttal"),
+    "conflict": ("i disagree", "we disagree"),
+}
+
+
+def classify(text: str) -> str:
+    text = text.lower()
+    labels = [label for label, words in KEYWORDS.items() if any(word in text for word in words)]
+    return f"<xml>{','.join(labels) or 'none'}</xml>"
+
+BATCH_ITEM_RE = re.compile(r"(?:^|\n)--- item (\d+) ---\n(.*?)\n--- end \1 ---", re.DOTALL)
+
+
+def answer(prompt: str, drop_rate: float) -> tuple[str, int]:
+    """Reply text and the number of classified items."""
+    items = BATCH_ITEM_RE.findall(prompt)
+    if not items:
+        # The comment is between `---` lines, after the instructions or alone; local_llm.py sends it bare
+        return classify(prompt.rpartition("---\n")[2].removesuffix("\n---")), 1
+    # Dropped items exercise the client's fallback to single requests
+    lines = [f'<answer id="{n}">{classify(comment)}</answer>' for n, comment in items if random.random() >= drop_rate]
+    return "\n".join(lines), len(items)
+
+
+class RateWindow:
+    """Fixed one-second window, like the per-second limits of hosted providers."""
+
+    def __init__(self, rps: float):
+        self.rps = rps
+        self.window = int(time.time())
+        self.count = 0
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+
+    def admit(self) -> float:
+        """0 if the request is admitted, otherwise the seconds until the next window."""
+        with self.lock:
+            now = time.time()
+            if int(now) != self.window:
+                self.window, self.count = int(now), 0
+            if self.rps and self.count >= self.rps:
+                self.rejected += 1
+                return self.window + 1 - now
+            self.count += 1
+            self.accepted += 1
+            return 0.0
+
+
+def make_handler(args, rate: RateWindow):
+    seen_prefixes = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_):
+            pass
+
+        def reply(self, status: int, body: dict, headers: Optional[dict] = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            ollama = self.path == "/api/chat"
+            if not (ollama or self.path.endswith("/chat/completions")):
+                return self.reply(404, {"error": {"message": "not found"}})
+            wait = rate.admit()
+            if wait:
+                return self.reply(429, {"error": {"message": "Rate limit exceeded", "code": 429}},
+                                  {"Retry-After": f"{wait:.3f}"} if args.retry_after else {})
+            if random.random() < args.error_rate:
+                return self.reply(500, {"error": {"message": "Internal error"}})
+            time.sleep(args.latency * random.uniform(0.5, 1.5))
+            messages = [m for m in request.get("messages", []) if isinstance(m.get("content"), str)]
+            prompt = "\n".join(m["content"] for m in messages)
+            content, count = answer(messages[-1]["content"] if messages else "", args.batch_drop_rate)
+            prompt_tokens, completion_tokens = len(prompt) // 4, 8 * count
+            system = messages[0]["content"] if messages and messages[0].get("role") == "system" else ""
+            cached_tokens = len(system) // 4 if system in seen_prefixes else 0
+            seen_prefixes.add(system)
+            if ollama:
+                return self.reply(200, {
+                    "model": request.get("model", "mock"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "message": {"role": "assistant", "content": content}, "done": True, "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens,
+                })
+            self.reply(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens,
+                          "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+            })
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8008)
+    ap.add_argument("--rps", type=float, default=20, help="Requests admitted per second, 0 for no limit.")
+    ap.add_argument("--latency", type=float, default=0.2, help="Mean response time in seconds.")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500.")
+    ap.add_argument("--batch-drop-rate", type=float, default=0.0, help="Share of batched items left unanswered.")
+    ap.add_argument("--no-retry-after", dest="retry_after", action="store_false", help="Send 429s without Retry-After.")
+    args = ap.parse_args()
+
+    rate = RateWindow(args.rps)
+    # Accept bursts of connections like a real endpoint, the default backlog of 5 refuses them
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, rate))
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"accepted={rate.accepted} rejected={rate.rejected}")
+
+
+if __name__ == "__main__":
+    main()
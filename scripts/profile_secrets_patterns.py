@@ -0,0 +1,85 @@
+"""
+Profile every secrets-patterns-db pattern on LLM-SecDB.json, to prune or
+rewrite the expensive patterns that mostly match harmless comments, and to
+choose the confidence levels of `mine --confidence` with data.
+
+Every confidence level is scanned. Next to the cost columns of
+`latexposed.pattern_profile`, the CSV counts the matched comments without a
+sensitive ground-truth label (likely false positives). The summary compares
+the cost and the false-positive share of each confidence cut-off.
+
+Usage (from the repository root):
+  python scripts/profile_secrets_patterns.py --output data/secrets_profile.csv [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from latexposed.llm import iter_input_any, parse_ground_truth_labels  # noqa: E402
+from latexposed.pattern_profile import PatternProfile  # noqa: E402
+from latexposed.secrets_db import SECRETS_DB, SecretsScanner, load_secret_patterns  # noqa: E402
+
+
+# Labels a secrets-patterns-db match can legitimately point at
+SENSITIVE_LABELS = {'credentials', 'network_identifiers', 'pii'}
+CUTOFFS = [('high',), ('high', 'low')]
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Per-pattern cost and false positives of secrets-patterns-db.')
+    ap.add_argument('--input', default='LLM-SecDB.json')
+    ap.add_argument('--secrets-db', default=SECRETS_DB)
+    ap.add_argument('--output', default='secrets_profile.csv', help='CSV, the folded stacks are written next to it.')
+    ap.add_argument('--repeat', type=int, default=1, help='Scan the corpus several times for steadier timings.')
+    args = ap.parse_args()
+
+    records = [rec for rec in iter_input_any(args.input) if isinstance(rec.get('comments'), str)]
+    sensitive = [bool(SENSITIVE_LABELS & set(parse_ground_truth_labels(rec))) for rec in records]
+    scanner = SecretsScanner(load_secret_patterns(args.secrets_db), confidences=None)
+    scanner.profile = profile = PatternProfile()
+    print(f'{len(records)} comments, {len(scanner)} patterns, {sum(sensitive)} comments with a sensitive label')
+
+    matched = {}  # pattern key -> comments matched
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for i, rec in enumerate(records):
+            for key in {('secrets', m.confidence, m.name) for m in scanner.finditer(rec['comments'])}:
+                matched.setdefault(key, set()).add(i)
+    print(f'Scanned in {time.perf_counter() - start:.2f}s')
+
+    extra = {}
+    for key in profile.stats:
+        comments = matched.get(key, set())
+        false_positives = sum(not sensitive[i] for i in comments)
+        extra[key] = {'comments_without_label': false_positives,
+                      'false_positive_share': round(false_positives / len(comments), 3) if comments else ''}
+    profile.write_csv(args.output, extra)
+    folded = os.path.splitext(args.output)[0] + '.folded'
+    profile.write_folded(folded)
+    print(f'Profile written to {args.output} and {folded}')
+
+    print(f"\n{'share':>6} {'seconds':>8} {'p99 us':>8} {'matched':>8} {'no label':>8}  pattern")
+    for row in profile.rows(limit=10):
+        key = (row['source'], row['confidence'], row['pattern'])
+        print(f"{row['share']:>6.1%} {row['total_seconds']:>8.3f} {row['p99_us']:>8.1f} "
+              f"{len(matched.get(key, ())):>8} {extra[key]['comments_without_label']:>8}  {row['confidence']} {row['pattern']}")
+
+    print(f"\n{'confidences':>12} {'seconds':>8} {'matched':>8} {'no label':>8} {'recall':>7}")
+    seconds = Counter()
+    for (_, confidence, _), stats in profile.stats.items():
+        seconds[confidence] += stats.seconds
+    for cutoff in CUTOFFS:
+        comments = set().union(*(c for (_, confidence, _), c in matched.items() if confidence in cutoff))
+        false_positives = sum(not sensitive[i] for i in comments)
+        recall = sum(sensitive[i] for i in comments) / max(sum(sensitive), 1)
+        # The prefilter has no confidence, it runs whatever the cut-off
+        cost = seconds[''] + sum(seconds[confidence] for confidence in cutoff)
+        print(f"{'+'.join(cutoff):>12} {cost:>8.3f} {len(comments):>8} {false_positives:>8} {recall:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()